@@ -0,0 +1,90 @@
+"""
+Correctness and throughput of AntiObfuscationEngine against the former whole-string translate, over the pages of
+analyze/linovelib-mobile/content_dict.txt and the rules of playground/linovelib-js-anti-v2/anti_obfuscation.json.
+
+The pages there are already readable, so they are obfuscated first with the inverse table(text nodes only).
+
+Usage: python anti_obfuscation.py [rounds]
+"""
+import ast
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from linovelib2epub.spider.linovelib_mobile_rules import AntiObfuscationEngine
+
+ROOT = Path(__file__).resolve().parents[2]
+CONTENT_DICT = ROOT / 'analyze' / 'linovelib-mobile' / 'content_dict.txt'
+RULES = ROOT / 'playground' / 'linovelib-js-anti-v2' / 'anti_obfuscation.json'
+
+MARKUP = re.compile(r'(<[^>]*>)')
+
+
+def load_rules() -> Dict[str, str]:
+    # keys are written as \\uxxxx, see write_rules()
+    escaped_rules = json.loads(RULES.read_text(encoding='utf-8'))
+    return {json.loads(f'"{k}"'): v for k, v in escaped_rules.items()}
+
+
+def load_pages() -> List[str]:
+    text = CONTENT_DICT.read_text(encoding='utf-8')
+    # the dump ends with the output of the IDE
+    volumes = ast.literal_eval(text[:text.rindex('}') + 1])
+    return [html for chapters in volumes.values() for _, html in chapters]
+
+
+def obfuscate(html: str, rules: Dict[str, str]) -> str:
+    inverse = str.maketrans({v: k for k, v in rules.items()})
+    parts = MARKUP.split(html)
+    parts[::2] = [text.translate(inverse) for text in parts[::2]]
+    return ''.join(parts)
+
+
+def legacy(pages: List[str], rules: Dict[str, str]) -> List[str]:
+    # the former _anti_js_obfuscation(): a table per page, over the whole serialized html
+    return [page.translate(str.maketrans(rules)) for page in pages]
+
+
+def measure(name: str, func: Callable[[], List[str]], size: int, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    print(f'{name:<24} median {median * 1000:8.2f}ms  {size / median / 1024 / 1024:8.1f} MB/s')
+    return median
+
+
+def main(rounds: int) -> None:
+    rules = load_rules()
+    originals = load_pages()
+    pages = [obfuscate(page, rules) for page in originals]
+    engine = AntiObfuscationEngine(rules)
+
+    # correctness
+    expected = legacy(pages, rules)
+    per_page = [engine.translate_html(page) for page in pages]
+    assert per_page == expected, 'translate_html differs from the whole-string translate'
+    assert engine.translate_pages(pages) == per_page, 'translate_pages differs from translate_html'
+    for page, translated in zip(pages, per_page):
+        assert MARKUP.findall(page) == MARKUP.findall(translated), 'markup changed'
+    restored = sum(a == b for a, b in zip(per_page, originals))
+    print(f'{len(pages)} pages, {sum(map(len, pages))} chars, {len(rules)} rules: correct. '
+          f'{restored}/{len(pages)} pages restored exactly(the others have “” in the original text).')
+
+    size = sum(len(page.encode('utf-8')) for page in pages)
+    base = measure('legacy translate', lambda: legacy(pages, rules), size, rounds)
+    per_page_time = measure('engine.translate_html', lambda: [engine.translate_html(p) for p in pages], size, rounds)
+    batch_time = measure('engine.translate_pages', lambda: engine.translate_pages(pages), size, rounds)
+    compile_time = measure('engine compile', lambda: [AntiObfuscationEngine(rules)], size, rounds)
+    print(f'speedup: per page x{base / per_page_time:.1f}, batched x{base / batch_time:.1f}, '
+          f'compile once {compile_time * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
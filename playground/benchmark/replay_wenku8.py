@@ -0,0 +1,50 @@
+"""
+Offline end-to-end benchmark of the Wenku8 spider(fetch + parse + scheduling) over recorded responses.
+
+Usage:
+    python seed_wenku8_cassettes.py cassettes
+    python replay_wenku8.py cassettes [rounds]
+"""
+import statistics
+import sys
+import time
+
+from linovelib2epub import settings
+from linovelib2epub.network import REPLAY, HttpClientManager
+from linovelib2epub.spider.wenku8_spider import Wenku8Spider
+from seed_wenku8_cassettes import BOOK_ID
+
+
+def run_once(cassette_folder: str) -> float:
+    spider_settings = {
+        'book_id': BOOK_ID,
+        'base_url': 'https://www.wenku8.net',
+        'select_volume_mode': False,
+        'has_illustration': False,
+        'image_download_folder': 'novel_images',
+        'log_filename': f'replay_{BOOK_ID}',
+        'log_level': 'WARNING',
+        'http_timeout': settings.HTTP_TIMEOUT,
+        'http_retries': 0,
+        'http_transport': REPLAY,
+        'http_cassette_folder': cassette_folder,
+    }
+    http_client = HttpClientManager(client_settings=spider_settings)
+    try:
+        spider = Wenku8Spider(spider_settings, http_client=http_client)
+        start = time.perf_counter()
+        novel = spider.fetch()
+        elapsed = time.perf_counter() - start
+    finally:
+        http_client.close()
+
+    assert novel.volumes_content_ready and novel.get_chapters_size() > 0
+    return elapsed
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'cassettes'
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    timings = [run_once(folder) for _ in range(rounds)]
+    print(f'wenku8 replay x{rounds}: median {statistics.median(timings):.3f}s, '
+          f'min {min(timings):.3f}s, max {max(timings):.3f}s')
@@ -0,0 +1,67 @@
+"""
+The former _sanitize_html(re-parse, select, serialize, regex) against HtmlSanitizer(select, serialize) on
+analyze/linovelib-mobile/chapter_sample.html.
+
+Usage: python sanitize_html.py [rounds]
+"""
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+from bs4 import BeautifulSoup
+
+from linovelib2epub.spider import LinovelibMobileSpider
+from linovelib2epub.spider.html_processing import HtmlSanitizer
+
+SAMPLE = Path(__file__).resolve().parents[2] / 'analyze' / 'linovelib-mobile' / 'chapter_sample.html'
+
+# the sample page keeps .ca1 and several scripts in div.main, its article(#ccacontent) has none
+NODES = ('div.main', '#ccacontent')
+
+
+def legacy(html) -> str:
+    html_copy = BeautifulSoup(str(html), 'lxml')
+    for anouncement in html_copy.select('.ca1'):
+        anouncement.decompose()
+    return re.sub(r'<script.+?</script>', '', str(html_copy), flags=re.DOTALL)
+
+
+def strip_wrapper(html: str) -> str:
+    # the re-parse wrapped the article in <html><body>
+    return html.removeprefix('<html><body>').removesuffix('</body></html>')
+
+
+def measure(name: str, func: Callable[[], str], rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    print(f'{name:<36} median {median * 1000:7.3f}ms')
+    return median
+
+
+def main(rounds: int) -> None:
+    page = SAMPLE.read_text(encoding='utf-8')
+    sanitizer = HtmlSanitizer(LinovelibMobileSpider.ARTICLE_REMOVE_SELECTORS)
+
+    for selector in NODES:
+        expected = strip_wrapper(legacy(BeautifulSoup(page, 'lxml').select_one(selector)))
+        actual = sanitizer.sanitize(BeautifulSoup(page, 'lxml').select_one(selector))
+        assert actual == expected, f'{selector}: the output differs from the former _sanitize_html'
+
+        # the page is parsed once per page by the spider anyway, only the sanitizing is measured
+        soups = [BeautifulSoup(page, 'lxml') for _ in range(rounds)]
+        old = measure(f'{selector} legacy', lambda: legacy(soups.pop().select_one(selector)), rounds)
+        soups = [BeautifulSoup(page, 'lxml') for _ in range(rounds)]
+        new = measure(f'{selector} HtmlSanitizer', lambda: sanitizer.sanitize(soups.pop().select_one(selector)),
+                      rounds)
+        print(f'{selector}: same output, x{old / new:.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,47 @@
+"""
+Seed a REPLAY cassette folder from the wenku8 fixtures in analyze/wenku8, so the Wenku8 spider can run end to end
+without network. Every chapter of the catalog replays chapter_sample.html(插图 chapters replay 插图.html).
+
+Usage: python seed_wenku8_cassettes.py [cassette_folder]
+"""
+import sys
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+from requests.structures import CaseInsensitiveDict
+
+from linovelib2epub.network import RecordReplayTransport, TransportResponse
+
+FIXTURES = Path(__file__).resolve().parents[2] / 'analyze' / 'wenku8'
+
+BOOK_ID = 2961
+BOOK_URL = f'https://www.wenku8.net/book/{BOOK_ID}.htm'
+CATALOG_URL = f'https://www.wenku8.net/novel/2/{BOOK_ID}/index.htm'
+
+
+def _html_response(url: str, fixture: str) -> TransportResponse:
+    return TransportResponse(url=url,
+                             status=200,
+                             headers=CaseInsensitiveDict({'Content-Type': 'text/html; charset=utf-8'}),
+                             content=(FIXTURES / fixture).read_bytes(),
+                             encoding='utf-8')
+
+
+def seed(cassette_folder: str) -> int:
+    cassette = RecordReplayTransport(cassette_folder)
+    cassette.save(_html_response(BOOK_URL, '2379.html'))
+    cassette.save(_html_response(CATALOG_URL, 'toc.html'))
+
+    catalog = BeautifulSoup((FIXTURES / 'toc.html').read_text(encoding='utf-8'), 'lxml')
+    count = 2
+    for link in catalog.select('td.ccss a[href]'):
+        chapter_url = f'{CATALOG_URL.rsplit("/", 1)[0]}/{link["href"]}'
+        fixture = '插图.html' if link.text == '插图' else 'chapter_sample.html'
+        cassette.save(_html_response(chapter_url, fixture))
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'cassettes'
+    print(f'{seed(folder)} responses saved to {folder}.')
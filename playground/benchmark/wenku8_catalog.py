@@ -0,0 +1,97 @@
+"""
+The former BeautifulSoup catalog parser of Wenku8Spider against the compiled XPath one, on
+analyze/wenku8/3500-catalog.html, analyze/wenku8/toc.html and a large catalog made of toc.html(LARGE_VOLUMES copies
+of its volumes, like a long running series).
+
+Usage: python wenku8_catalog.py [rounds]
+"""
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+
+from linovelib2epub.models import CatalogBaseChapter, CatalogBaseVolume
+from linovelib2epub.spider.wenku8_spider import Wenku8Spider
+
+ANALYZE = Path(__file__).resolve().parents[2] / 'analyze' / 'wenku8'
+# file => encoding, as the site serves them
+SAMPLES = {'3500-catalog.html': 'gbk', 'toc.html': 'utf-8'}
+CATALOG_URL = 'https://www.wenku8.net/novel/2/2961/index.htm'
+
+LARGE_VOLUMES = 40
+
+
+def legacy(catalog_html: str) -> List[CatalogBaseVolume]:
+    # the former _convert_to_catalog_list()
+    soup = BeautifulSoup(catalog_html, 'lxml')
+    catalog_items = soup.find('table').find_all('td')
+
+    catalog_list: List[CatalogBaseVolume] = []
+    _current_chapters: List[CatalogBaseChapter] = []
+    _volume_index = 0
+
+    for catalog_item in catalog_items:
+        catalog_item_text = catalog_item.text
+        item_css_class = catalog_item['class']
+
+        if 'vcss' in item_css_class:
+            _volume_index += 1
+            _current_chapters = []
+            catalog_list.append(CatalogBaseVolume(vid=_volume_index, volume_title=catalog_item_text,
+                                                  chapters=_current_chapters))
+        elif 'ccss' in item_css_class:
+            if catalog_item.find("a") and catalog_item.find("a")['href']:
+                href = catalog_item.find("a")["href"]
+                chapter_url = f'{CATALOG_URL.rsplit("/", 1)[0]}/{href}'
+                new_chapter = CatalogBaseChapter(chapter_title=catalog_item_text, chapter_url=chapter_url)
+                if catalog_item_text == '插图':
+                    _current_chapters.insert(0, new_chapter)
+                else:
+                    _current_chapters.append(new_chapter)
+
+    return catalog_list
+
+
+def large_catalog(toc: str) -> str:
+    # the rows of the catalog table, repeated
+    table = re.search(r'(<table[^>]*>)(.*?)(</table>)', toc, re.S)
+    rows = table.group(2) * LARGE_VOLUMES
+    return toc[:table.start()] + table.group(1) + rows + table.group(3) + toc[table.end():]
+
+
+def measure(name: str, func: Callable[[], object], rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    print(f'{name:<32} median {median * 1000:8.3f}ms')
+    return median
+
+
+def main(rounds: int) -> None:
+    spider = object.__new__(Wenku8Spider)
+    spider._catalog_url = CATALOG_URL
+
+    pages = {name: (ANALYZE / name).read_text(encoding=encoding) for name, encoding in SAMPLES.items()}
+    pages[f'toc.html x{LARGE_VOLUMES}'] = large_catalog(pages['toc.html'])
+
+    for name, page in pages.items():
+        expected = legacy(page)
+        actual = spider._convert_to_catalog_list(page)
+        assert actual == expected, f'{name}: the catalog differs from the former parser'
+        chapters = sum(len(volume.chapters) for volume in actual)
+        print(f'{name}: {len(actual)} volumes, {chapters} chapters, identical.')
+
+        old = measure(f'{name} legacy', lambda: legacy(page), rounds)
+        new = measure(f'{name} xpath', lambda: spider._convert_to_catalog_list(page), rounds)
+        print(f'{name}: x{old / new:.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -4,7 +4,42 @@ class LinovelibException(Exception):
     """
     pass
 
+
 class PageContentIllegalException(LinovelibException):
     def __init__(self, message="Page content is illegal."):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+
+class RetryableHttpException(LinovelibException):
+    """
+    A temporary failure that is worth retrying, e.g. 429, 5xx, a throttle page or an incomplete read.
+    """
+    pass
+
+
+class ThrottledException(RetryableHttpException):
+    """
+    The host asked to slow down, e.g. 429 or a throttle page. The rate limiter already backs off for it, so the retry
+    doesn't spend the retry budget.
+    """
+    pass
+
+
+class FatalHttpException(LinovelibException):
+    """
+    A failure that retrying won't fix, e.g. 404.
+    """
+    pass
+
+
+class CircuitOpenException(LinovelibException):
+    """
+    The host failed too many times in a row, requests to it are short-circuited for a while.
+    """
+
+    def __init__(self, message="Circuit is open.", retry_in: float = 0.0):
+        self.message = message
+        # seconds until the circuit half-opens
+        self.retry_in = retry_in
+        super().__init__(self.message)
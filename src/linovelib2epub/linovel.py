@@ -18,11 +18,12 @@ from . import settings
 from .exceptions import LinovelibException
 from .logger import Logger
 from .models import LightNovel, LightNovelVolume, LightNovelImage
+from .network import HttpClientManager
 from .spider import ASYNCIO, LinovelibMobileSpider  # type: ignore[attr-defined]
 from .spider.masiro_spider import MasiroSpider
 from .spider.wenku8_spider import Wenku8Spider
 from .utils import (create_folder_if_not_exists, random_useragent,
-                    read_pkg_resource, sanitize_pathname)
+                    read_pkg_resource, sanitize_pathname, transcoded_image_path)
 
 
 class EpubWriter:
@@ -223,17 +224,23 @@ class EpubWriter:
             if not any(image_filename.endswith(ext) for ext in image_extensions_white_list):
                 return
 
-            image_path = f'{images_folder}/{illustration.local_relative_path}'
-            try:
-                img = Image.open(image_path)
-            except (Exception,):
-                return
-
-            # why should we convert all images to jpeg format? => unify to JPEG => get better epub reader support
-            b = io.BytesIO()
-            img = img.convert('RGB')
-            img.save(b, 'jpeg')
-            data_img = b.getvalue()
+            transcoded_path = transcoded_image_path(images_folder, illustration.local_relative_path)
+            if os.path.exists(transcoded_path):
+                # already transcoded during the download(MULTIPROCESSING image download strategy)
+                with open(transcoded_path, 'rb') as f:
+                    data_img = f.read()
+            else:
+                image_path = f'{images_folder}/{illustration.local_relative_path}'
+                try:
+                    img = Image.open(image_path)
+                except (Exception,):
+                    return
+
+                # why should we convert all images to jpeg format? => unify to JPEG => get better epub reader support
+                b = io.BytesIO()
+                img = img.convert('RGB')
+                img.save(b, 'jpeg')
+                data_img = b.getvalue()
 
             new_image_relative_path = os.path.splitext(illustration.local_relative_path)[0] + ".jpg"
             img = epub.EpubItem(file_name=f'{images_folder}/{new_image_relative_path}',
@@ -319,15 +326,32 @@ class Linovelib2Epub:
                  http_timeout: int = settings.HTTP_TIMEOUT,
                  http_retries: int = settings.HTTP_RETRIES,
                  http_cookie: str = settings.HTTP_COOKIE,
+                 http_pool_size: int = settings.HTTP_POOL_SIZE,
+                 http_pool_size_per_host: int = settings.HTTP_POOL_SIZE_PER_HOST,
+                 http_transport: str = settings.HTTP_TRANSPORT,
+                 http_cassette_folder: str = settings.HTTP_CASSETTE_FOLDER,
+                 http_cache: bool = settings.HTTP_CACHE,
+                 http_cache_folder: str = settings.HTTP_CACHE_FOLDER,
+                 http_cache_ttl: int = settings.HTTP_CACHE_TTL,
+                 http_cache_max_size: int = settings.HTTP_CACHE_MAX_SIZE,
                  custom_style_cover: str | None = None,
                  custom_style_nav: str | None = None,
                  custom_style_chapter: str | None = None,
                  disable_proxy: bool = settings.DISABLE_PROXY,
                  image_download_strategy: str = ASYNCIO,
+                 image_download_workers: int = settings.IMAGE_DOWNLOAD_WORKERS,
+                 image_download_per_host: int = settings.IMAGE_DOWNLOAD_PER_HOST,
                  log_level: str = "INFO",
                  browser_path: str | None = None,
                  chapter_crawl_delay: int | None = None,
                  page_crawl_delay: int | None = None,
+                 crawl_delay_jitter: float = settings.CRAWL_DELAY_JITTER,
+                 crawl_concurrency: int = settings.CRAWL_CONCURRENCY,
+                 browser_cookie_handoff: bool = settings.BROWSER_COOKIE_HANDOFF,
+                 browser_profile_folder: str | None = settings.BROWSER_PROFILE_FOLDER,
+                 browser_debugger_address: str | None = settings.BROWSER_DEBUGGER_ADDRESS,
+                 browser_lean_mode: bool = settings.BROWSER_LEAN_MODE,
+                 browser_in_page_extraction: bool = settings.BROWSER_IN_PAGE_EXTRACTION,
                  not_headless: bool = False
                  ):
         if book_id is None:
@@ -364,9 +388,29 @@ class Linovelib2Epub:
             'log_level': log_level,
         }
 
+        # one connection pool for the whole run, shared by every crawl phase
+        self.http_client_settings = {
+            **self.common_settings,
+            'http_timeout': http_timeout,
+            'http_retries': http_retries,
+            'disable_proxy': disable_proxy,
+            'http_pool_size': http_pool_size,
+            'http_pool_size_per_host': http_pool_size_per_host,
+            'http_dns_cache_ttl': settings.HTTP_DNS_CACHE_TTL,
+            'http_transport': http_transport,
+            'http_cassette_folder': http_cassette_folder,
+            'http_cache': http_cache,
+            'http_cache_folder': http_cache_folder,
+            'http_cache_ttl': http_cache_ttl,
+            'http_cache_max_size': http_cache_max_size,
+        }
+        self._http_client = HttpClientManager(client_settings=self.http_client_settings)
+
         self.spider_settings = {
             **self.common_settings,
             'image_download_strategy': image_download_strategy,
+            'image_download_workers': image_download_workers,
+            'image_download_per_host': image_download_per_host,
             'http_timeout': http_timeout,
             'http_retries': http_retries,
             'random_useragent': random_useragent(),
@@ -375,6 +419,13 @@ class Linovelib2Epub:
             'disable_proxy': disable_proxy,
             'chapter_crawl_delay': chapter_crawl_delay,
             'page_crawl_delay': page_crawl_delay,
+            'crawl_delay_jitter': crawl_delay_jitter,
+            'crawl_concurrency': crawl_concurrency,
+            'browser_cookie_handoff': browser_cookie_handoff,
+            'browser_profile_folder': browser_profile_folder,
+            'browser_debugger_address': browser_debugger_address,
+            'browser_lean_mode': browser_lean_mode,
+            'browser_in_page_extraction': browser_in_page_extraction,
             'not_headless': not_headless,
         }
         site_to_spider = {
@@ -382,7 +433,8 @@ class Linovelib2Epub:
             TargetSite.MASIRO: MasiroSpider,
             TargetSite.WENKU8: Wenku8Spider,
         }
-        self._spider = site_to_spider[self.target_site](spider_settings=self.spider_settings)
+        self._spider = site_to_spider[self.target_site](spider_settings=self.spider_settings,
+                                                        http_client=self._http_client)
 
         self.epub_settings = {
             **self.common_settings,
@@ -399,6 +451,12 @@ class Linovelib2Epub:
                              log_filename=log_filename_str).get_logger()
 
     def run(self) -> None:
+        try:
+            self._run()
+        finally:
+            self._http_client.close()
+
+    def _run(self) -> None:
         # recover from last work. only support this format: [hostname]_3573.pickle
         # 1.solve novel pickle
         pickle_path = self.common_settings['novel_pickle_path']
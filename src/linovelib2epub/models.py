@@ -1,17 +1,36 @@
 import urllib
 from dataclasses import dataclass, field
-from typing import List, Type
+from typing import Dict, Iterable, List, Type
 from urllib.parse import urlparse
 
 
 class ImageDuplicateCheckingStrategy:
 
+    def key(self, url):
+        """
+        Images with the same key are duplicates, see VolumeImageIndex.
+        """
+        return url
+
     def is_duplicate(self, url_1, url_2):
         return url_1 == url_2
 
 
 class LinovelibMobileImageDuplicateCheckingStrategy(ImageDuplicateCheckingStrategy):
 
+    def key(self, url):
+        # urlparse(url).path without urlparse: called once per image of the volume
+        if url.startswith('//'):
+            rest = url[2:]
+        else:
+            _, sep, rest = url.partition('://')
+            if not sep:
+                rest = None
+        if rest is not None:
+            slash = rest.find('/')
+            url = rest[slash:] if slash != -1 else ''
+        return url.split('#', 1)[0].split('?', 1)[0]
+
     def is_duplicate(self, url_1, url_2):
         # https://linovelib-img.zezefans.com/3/3843/206654/227245.jpg => /3/3843/206654/227245.jpg
         # https://img3.readpai.com/3/3843/206654/227245.jpg => /3/3843/206654/227245.jpg
@@ -45,6 +64,9 @@ class ImageDuplicationChecker:
     def is_duplicate(self, url_1, url_2):
         return self.duplicate_checking_strategy.is_duplicate(url_1, url_2)
 
+    def key(self, url):
+        return self.duplicate_checking_strategy.key(url)
+
 
 # TODO add basic info model
 
@@ -141,6 +163,9 @@ class LightNovelImage:
 
     is_book_cover: bool = False
 
+    # the first illustration of a volume, used as the cover of divided volumes
+    is_volume_cover: bool = False
+
     @property
     def site_base_url(self):
         # https://w.linovelib.com/novel/3279/167340.html => https://w.linovelib.com
@@ -200,49 +225,17 @@ class LightNovelVolume:
             return illustrations[0]
         return None
 
-    def _resolve_image_duplicate_checking_strategy(self) -> Type[ImageDuplicateCheckingStrategy]:
-        if self.chapters and self.chapters[0].illustrations:
-            image_sample = self.chapters[0].illustrations[0]
-            hostname = image_sample.hostname
-            hostname_to_strategy = {
-                'w.linovelib.com': LinovelibMobileImageDuplicateCheckingStrategy,
-                'masiro.me': MasiroImageDuplicateCheckingStrategy,
-                'wenku8.net': Wenku8ImageDuplicateCheckingStrategy
-            }
-            return hostname_to_strategy.get(hostname, ImageDuplicateCheckingStrategy)
-
-        return ImageDuplicateCheckingStrategy
+    def image_index(self) -> 'VolumeImageIndex':
+        return VolumeImageIndex.from_chapters(self.chapters)
 
     def get_illustrations(self) -> List:
         """
         # 注意，不同章节的 image remote src 之间可能会存在重复。为了加速图片下载，这里需要去重。
-        由于 LightNovelImage 是一个复杂对象，因此需要自定义逻辑去重，而不能依赖简单的 set() 来去重。
+        由于 LightNovelImage 是一个复杂对象，不能依赖简单的 set() 来去重，这里按 ImageDuplicateCheckingStrategy.key() 去重，见 VolumeImageIndex。
 
         :return: unique image list
         """
-        volume_illustrations: List[LightNovelImage] = []
-        for chapter in self.chapters:
-            volume_illustrations.extend(chapter.illustrations)
-
-        Strategy = self._resolve_image_duplicate_checking_strategy()
-        duplication_checker = ImageDuplicationChecker(Strategy())
-
-        # dedupe
-        unique_image_list = []
-        # for debug
-        duplicate_image_list = []
-
-        for image_obj in volume_illustrations:
-            is_duplicate_flag = False
-            for unique_obj in unique_image_list:
-                if duplication_checker.is_duplicate(image_obj.remote_src, unique_obj.remote_src):
-                    duplicate_image_list.append(image_obj.remote_src)
-                    is_duplicate_flag = True
-                    break
-            if not is_duplicate_flag:
-                unique_image_list.append(image_obj)
-
-        return unique_image_list
+        return self.image_index().unique_images()
 
     def add_chapter(self, cid: int | str | None, title: str = '', content: str = '',
                     illustrations: List[LightNovelImage] = None) -> None:
@@ -250,6 +243,72 @@ class LightNovelVolume:
         self.chapters.append(new_chapter)
 
 
+class VolumeImageIndex:
+    """
+    The images of one volume keyed by ImageDuplicateCheckingStrategy.key(), built in one pass over the chapters. Dedupe
+    is a dict lookup instead of comparing every pair of images, and the index tells which chapters reference an image.
+    """
+
+    def __init__(self, duplicate_checking_strategy: ImageDuplicateCheckingStrategy) -> None:
+        self.duplication_checker = ImageDuplicationChecker(duplicate_checking_strategy)
+        # key => the first image, in reading order
+        self._images: Dict[str, LightNovelImage] = {}
+        # key => chapter ids, in reading order
+        self._chapters: Dict[str, List[int | str | None]] = {}
+
+    @classmethod
+    def from_chapters(cls, chapters: Iterable[LightNovelChapter]) -> 'VolumeImageIndex':
+        chapters = list(chapters)
+        index = cls(resolve_image_duplicate_checking_strategy(chapters)())
+        for chapter in chapters:
+            for image in chapter.illustrations or []:
+                index.add(chapter.chapter_id, image)
+        return index
+
+    def add(self, chapter_id: int | str | None, image: LightNovelImage) -> None:
+        key = self.duplication_checker.key(image.remote_src)
+        chapters = self._chapters.setdefault(key, [])
+        if not chapters:
+            self._images[key] = image
+        if chapter_id not in chapters[-1:]:
+            chapters.append(chapter_id)
+
+    def unique_images(self) -> List[LightNovelImage]:
+        return list(self._images.values())
+
+    def chapters_of(self, image: LightNovelImage | str) -> List[int | str | None]:
+        """
+        :param image: an image or its remote url
+        :return: ids of the chapters referencing the image(or a duplicate of it)
+        """
+        remote_src = image if isinstance(image, str) else image.remote_src
+        return list(self._chapters.get(self.duplication_checker.key(remote_src), []))
+
+    def __contains__(self, image: LightNovelImage | str) -> bool:
+        remote_src = image if isinstance(image, str) else image.remote_src
+        return self.duplication_checker.key(remote_src) in self._images
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+
+def resolve_image_duplicate_checking_strategy(chapters: List[LightNovelChapter]) -> Type[ImageDuplicateCheckingStrategy]:
+    if chapters and chapters[0].illustrations:
+        image_sample = chapters[0].illustrations[0]
+        hostname = image_sample.hostname
+        hostname_to_strategy = {
+            'w.linovelib.com': LinovelibMobileImageDuplicateCheckingStrategy,
+            # the current host of linovelib(see base_url of TargetSite.LINOVELIB_MOBILE), its images are served by the
+            # same mirrors
+            'www.bilinovel.com': LinovelibMobileImageDuplicateCheckingStrategy,
+            'masiro.me': MasiroImageDuplicateCheckingStrategy,
+            'wenku8.net': Wenku8ImageDuplicateCheckingStrategy
+        }
+        return hostname_to_strategy.get(hostname, ImageDuplicateCheckingStrategy)
+
+    return ImageDuplicateCheckingStrategy
+
+
 @dataclass
 class LightNovel:
     book_id: int | str | None = None
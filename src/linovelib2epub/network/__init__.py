@@ -0,0 +1,81 @@
+# "X as X": explicit re-exports, mypy(no_implicit_reexport) ignores __all__ of objects
+from .cache import (
+    BYPASS_HEADERS as BYPASS_HEADERS,
+    REVALIDATE_HEADERS as REVALIDATE_HEADERS,
+    CachingTransport as CachingTransport,
+    ResponseCache as ResponseCache,
+)
+from .client import HttpClientManager as HttpClientManager
+from .hedging import (
+    MirrorTracker as MirrorTracker,
+    race as race,
+)
+from .rate_limiter import (
+    HostRateLimiter as HostRateLimiter,
+    RateLimiterRegistry as RateLimiterRegistry,
+    RateLimitPolicy as RateLimitPolicy,
+    is_throttled_response as is_throttled_response,
+    parse_retry_after as parse_retry_after,
+)
+from .transport import (
+    AIOHTTP as AIOHTTP,
+    RECORD as RECORD,
+    REPLAY as REPLAY,
+    REQUESTS as REQUESTS,
+    AiohttpTransport as AiohttpTransport,
+    RecordReplayTransport as RecordReplayTransport,
+    RequestsTransport as RequestsTransport,
+    Transport as Transport,
+    TransportResponse as TransportResponse,
+    TransportStream as TransportStream,
+)
+from .scheduler import (
+    DownloadScheduler as DownloadScheduler,
+    ImagePriority as ImagePriority,
+)
+from .singleflight import SingleFlight as SingleFlight
+from .retry import (
+    CircuitBreaker as CircuitBreaker,
+    RetryBudget as RetryBudget,
+    RetryEngine as RetryEngine,
+    RetryJob as RetryJob,
+    RetryPolicy as RetryPolicy,
+    error_for_status as error_for_status,
+    is_retriable as is_retriable,
+)
+
+# explicit exports
+__all__ = [
+    HttpClientManager,
+    HostRateLimiter,
+    RateLimiterRegistry,
+    RateLimitPolicy,
+    is_throttled_response,
+    parse_retry_after,
+    CircuitBreaker,
+    RetryBudget,
+    RetryEngine,
+    RetryJob,
+    RetryPolicy,
+    error_for_status,
+    is_retriable,
+    DownloadScheduler,
+    ImagePriority,
+    AIOHTTP,
+    REQUESTS,
+    RECORD,
+    REPLAY,
+    Transport,
+    TransportResponse,
+    TransportStream,
+    AiohttpTransport,
+    RequestsTransport,
+    RecordReplayTransport,
+    ResponseCache,
+    CachingTransport,
+    REVALIDATE_HEADERS,
+    BYPASS_HEADERS,
+    MirrorTracker,
+    race,
+    SingleFlight,
+]
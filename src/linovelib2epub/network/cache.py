@@ -0,0 +1,335 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from logging import Logger as LoggerAlias
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from requests.structures import CaseInsensitiveDict
+
+from .rate_limiter import is_throttled_response
+from .transport import Transport, TransportResponse
+
+# only pages and scripts are cached, images have their own .part/resume logic
+CACHEABLE_CONTENT_TYPES = ('text/', 'javascript', 'json', 'xml')
+
+_CACHE_FILE_SUFFIX = '.cache'
+
+# request headers of a GET which must not be served from the cache without asking the server, e.g. a catalog that
+# grows or a script that changes daily. A cached copy is still revalidated(304) if it has a validator.
+REVALIDATE_HEADERS = {'Cache-Control': 'no-cache'}
+
+# request headers of a GET which must neither be served from nor stored in the cache, e.g. a page whose content
+# depends on the cookies
+BYPASS_HEADERS = {'Cache-Control': 'no-store'}
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    'private, max-age=60' => {'private': None, 'max-age': '60'}
+    """
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('" ') or None
+    return directives
+
+
+def _max_age(directives: Dict[str, Optional[str]]) -> Optional[float]:
+    try:
+        return float(directives['max-age'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ResponseCache:
+    """
+    On-disk cache of GET responses.
+
+    - one zlib compressed json file per url, holding one entry per variant(values of the request headers listed in
+      the response Vary header).
+    - an entry younger than the ttl of its host is served without any request. An older one is revalidated with
+      If-None-Match/If-Modified-Since, a 304 refreshes it.
+    - Cache-Control of the response is honored: no-store and private are never stored, no-cache is always
+      revalidated, max-age shortens the ttl. A request with no-cache(REVALIDATE_HEADERS) is always revalidated too.
+    - the folder is capped to `max_bytes`, the least recently used files are removed first(file mtime is touched on
+      every hit).
+    """
+
+    def __init__(self, cache_folder: str, default_ttl: float, max_bytes: int,
+                 logger: Optional[LoggerAlias] = None) -> None:
+        self.cache_folder = cache_folder
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.logger = logger
+
+        self._ttls: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # path -> size, loaded on first write
+        self._sizes: Optional[Dict[str, int]] = None
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def configure(self, host: str, ttl: float) -> None:
+        self._ttls[host] = ttl
+
+    def ttl_for(self, url: str) -> float:
+        return self._ttls.get(urlsplit(url).hostname or '', self.default_ttl)
+
+    def path_for(self, url: str) -> str:
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        host = urlsplit(url).hostname or 'unknown'
+        return os.path.join(self.cache_folder, host, f'{key}{_CACHE_FILE_SUFFIX}')
+
+    @staticmethod
+    def _variant_key(vary: List[str], headers: Optional[Dict[str, Any]]) -> str:
+        request_headers = CaseInsensitiveDict(headers or {})
+        return '\n'.join(f'{name.lower()}={request_headers.get(name, "")}' for name in vary)
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'rb') as f:
+                return json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except FileNotFoundError:
+            return None
+        except (Exception,) as e:
+            # a truncated or foreign file, treat it as a miss
+            if self.logger:
+                self.logger.debug(f'[ResponseCache] drop unreadable entry {path}: {e.__class__.__name__}.')
+            self._remove(path)
+            return None
+
+    def lookup(self, url: str, headers: Optional[Dict[str, Any]] = None) -> Tuple[Optional[TransportResponse], bool]:
+        """
+        :return: (cached response or None, whether it is still fresh)
+        """
+        path = self.path_for(url)
+        record = self._read(path)
+        if record is None:
+            return None, False
+
+        entry = record['variants'].get(self._variant_key(record['vary'], headers))
+        if entry is None:
+            return None, False
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        response = TransportResponse(url=url, status=entry['status'], headers=CaseInsensitiveDict(entry['headers']),
+                                     content=base64.b64decode(entry['body']), encoding=entry['encoding'])
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        ttl = self.ttl_for(url)
+        max_age = _max_age(directives)
+        if max_age is not None:
+            ttl = min(ttl, max_age)
+        fresh = 'no-cache' not in directives and time.time() - entry['stored_at'] < ttl
+        return response, fresh
+
+    @staticmethod
+    def is_cacheable(response: TransportResponse) -> bool:
+        if response.status != 200:
+            return False
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        if 'no-store' in directives or 'private' in directives:
+            return False
+        if response.headers.get('Vary', '').strip() == '*':
+            return False
+        content_type = response.headers.get('Content-Type', '').lower()
+        if not any(t in content_type for t in CACHEABLE_CONTENT_TYPES):
+            return False
+        # a "slow down" page answered with 200 must never be replayed
+        return not is_throttled_response(response.status, response.text)
+
+    def store(self, url: str, response: TransportResponse, headers: Optional[Dict[str, Any]] = None) -> None:
+        if not self.is_cacheable(response):
+            return
+
+        vary = sorted(v.strip() for v in response.headers.get('Vary', '').split(',') if v.strip())
+        path = self.path_for(url)
+        record = self._read(path)
+        if record is None or record['vary'] != vary:
+            record = {'url': url, 'vary': vary, 'variants': {}}
+        record['variants'][self._variant_key(vary, headers)] = {
+            'status': response.status,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+            'stored_at': time.time(),
+            'body': base64.b64encode(response.content).decode('ascii'),
+        }
+        self._write(path, zlib.compress(json.dumps(record, ensure_ascii=False).encode('utf-8')))
+        self.stores += 1
+
+    def refresh(self, url: str, headers: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Mark an entry fresh again after a 304.
+        """
+        path = self.path_for(url)
+        record = self._read(path)
+        if record is None:
+            return
+        entry = record['variants'].get(self._variant_key(record['vary'], headers))
+        if entry is None:
+            return
+        entry['stored_at'] = time.time()
+        self._write(path, zlib.compress(json.dumps(record, ensure_ascii=False).encode('utf-8')))
+
+    def invalidate(self, url: str) -> None:
+        """
+        Drop every variant of the url, e.g. when its content turned out to be illegal.
+        """
+        self._remove(self.path_for(url))
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = f'{path}.{threading.get_ident()}.part'
+        with open(part_path, 'wb') as f:
+            f.write(data)
+        os.replace(part_path, path)
+
+        with self._lock:
+            sizes = self._load_sizes()
+            sizes[path] = len(data)
+            if sum(sizes.values()) > self.max_bytes:
+                self._evict(sizes)
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        with self._lock:
+            if self._sizes is not None:
+                self._sizes.pop(path, None)
+
+    def _load_sizes(self) -> Dict[str, int]:
+        if self._sizes is None:
+            self._sizes = {}
+            for root, _, files in os.walk(self.cache_folder):
+                for name in files:
+                    if name.endswith(_CACHE_FILE_SUFFIX):
+                        path = os.path.join(root, name)
+                        self._sizes[path] = os.path.getsize(path)
+        return self._sizes
+
+    def _evict(self, sizes: Dict[str, int]) -> None:
+        # down to 90% of the cap, so that not every write triggers a scan
+        target = self.max_bytes * 0.9
+        total = sum(sizes.values())
+
+        def _mtime(p: str) -> float:
+            try:
+                return os.path.getmtime(p)
+            except OSError:
+                return 0.0
+
+        for path in sorted(sizes, key=_mtime):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= sizes.pop(path)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = sum(self._sizes.values()) if self._sizes is not None else None
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'bytes': size,
+        }
+
+
+class CachingTransport(Transport):
+    """
+    Serve GET requests from a ResponseCache, the other requests and stream() go straight to `inner`.
+    """
+
+    def __init__(self, inner: Transport, cache: ResponseCache) -> None:
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+
+    def _before(self, method: str, url: str,
+                headers: Optional[Dict[str, Any]]) -> Tuple[Optional[TransportResponse], bool, Dict[str, Any]]:
+        """
+        :return: (cached response, whether it can be served as is, headers to send otherwise)
+        """
+        request_headers = dict(headers or {})
+        if method.upper() != 'GET':
+            return None, False, request_headers
+
+        request_directives = parse_cache_control(CaseInsensitiveDict(request_headers).get('Cache-Control'))
+        if 'no-store' in request_directives:
+            return None, False, request_headers
+        cached, fresh = self.cache.lookup(url, headers)
+        if cached is None:
+            self.cache.misses += 1
+            return None, False, request_headers
+        if fresh and 'no-cache' not in request_directives:
+            self.cache.hits += 1
+            return cached, True, request_headers
+
+        etag = cached.headers.get('ETag')
+        last_modified = cached.headers.get('Last-Modified')
+        if etag:
+            request_headers['If-None-Match'] = etag
+        if last_modified:
+            request_headers['If-Modified-Since'] = last_modified
+        if not etag and not last_modified:
+            # expired and can't be revalidated
+            self.cache.misses += 1
+            return None, False, request_headers
+        return cached, False, request_headers
+
+    def _after(self, method: str, url: str, headers: Optional[Dict[str, Any]],
+               cached: Optional[TransportResponse], response: TransportResponse) -> TransportResponse:
+        if method.upper() != 'GET':
+            return response
+        if 'no-store' in parse_cache_control(CaseInsensitiveDict(headers or {}).get('Cache-Control')):
+            return response
+        if cached is not None and response.status == 304:
+            self.cache.refresh(url, headers)
+            self.cache.revalidated += 1
+            return cached
+        if cached is not None:
+            # changed on server side
+            self.cache.misses += 1
+        self.cache.store(url, response, headers)
+        return response
+
+    async def fetch(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                    data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        cached, fresh, request_headers = self._before(method, url, headers)
+        if fresh:
+            return cached  # type: ignore[return-value]
+        response = await self.inner.fetch(method, url, headers=request_headers, data=data, timeout=timeout)
+        return self._after(method, url, headers, cached, response)
+
+    def fetch_sync(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                   data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        cached, fresh, request_headers = self._before(method, url, headers)
+        if fresh:
+            return cached  # type: ignore[return-value]
+        response = self.inner.fetch_sync(method, url, headers=request_headers, data=data, timeout=timeout)
+        return self._after(method, url, headers, cached, response)
+
+    def stream(self, url: str, *, headers: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None) -> Any:
+        return self.inner.stream(url, headers=headers, timeout=timeout)
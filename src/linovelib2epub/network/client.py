@@ -0,0 +1,301 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Dict, Optional, Set, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from .. import settings
+from ..logger import Logger
+from .cache import CachingTransport, ResponseCache
+from .hedging import MirrorTracker
+from .rate_limiter import RateLimiterRegistry
+from .retry import RetryEngine, RetryJob, RetryPolicy, error_for_status
+from .singleflight import SingleFlight
+from .transport import (AIOHTTP, RECORD, REPLAY, REQUESTS, AiohttpTransport, RecordReplayTransport, RequestsTransport,
+                        Transport, TransportResponse)
+
+T = TypeVar('T')
+
+
+class HttpClientManager:
+    """
+    One run (one book) shares one HttpClientManager, so all crawl phases reuse the same connection pools:
+
+    - an aiohttp session with keep-alive, DNS cache and per-host connection limit, used by all asyncio code.
+    - a requests session with a sized connection pool, used by all blocking code.
+
+    aiohttp sessions are bound to an event loop, that is why the manager owns a long-lived event loop in a background
+    thread. Spiders call ``run(coro)`` instead of ``asyncio.run(coro)``, otherwise each phase would get a new loop and
+    a cold pool again.
+
+    Spiders send plain HTTP requests through ``transport``(asyncio code) and ``sync_transport``(blocking code), or the
+    retrying helpers get_text()/post_text()/get_sync() built on them. The backend is chosen by the `http_transport`
+    setting, see transport.py. GET responses of pages and scripts are cached on disk unless `http_cache` is off, see
+    cache.py.
+    """
+
+    def __init__(self, client_settings: Dict[str, Any]) -> None:
+        self.client_settings = client_settings
+        self.logger = Logger(logger_name=type(self).__name__,
+                             logger_level=self.client_settings["log_level"],
+                             log_filename=self.client_settings["log_filename"]).get_logger()
+
+        self._pool_size: int = self.client_settings.get('http_pool_size') or settings.HTTP_POOL_SIZE
+        self._pool_size_per_host: int = self.client_settings.get('http_pool_size_per_host') or \
+            settings.HTTP_POOL_SIZE_PER_HOST
+        self._dns_cache_ttl: int = self.client_settings.get('http_dns_cache_ttl') or settings.HTTP_DNS_CACHE_TTL
+
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._aiohttp_session: Optional[aiohttp.ClientSession] = None
+        self._requests_session: Optional[requests.Session] = None
+
+        # origins(scheme://host) found during the crawl, e.g. image hosts. see remember_host()
+        self._known_origins: Set[str] = set()
+
+        self.transport_mode: str = self.client_settings.get('http_transport') or settings.HTTP_TRANSPORT
+
+        # adaptive concurrency and request rate per host, shared by all spiders/phases of this run.
+        # replayed responses don't hit any host, so there is nothing to limit.
+        self.rate_limiters = RateLimiterRegistry(logger=self.logger, enabled=self.transport_mode.upper() != REPLAY)
+
+        # backoff, retry budget and circuit breakers shared by all spiders/phases of this run
+        http_retries = self.client_settings.get('http_retries', settings.HTTP_RETRIES)
+        self.retry_engine = RetryEngine(RetryPolicy(max_attempts=http_retries + 1), logger=self.logger)
+
+        # concurrent identical requests of this run share one fetch
+        self.single_flight = SingleFlight(logger=self.logger)
+
+        # latency of interchangeable hosts(e.g. image CDNs) seen in this run, see hedging.race()
+        self.mirrors = MirrorTracker(logger=self.logger)
+
+        self.response_cache: Optional[ResponseCache] = None
+        self.transport, self.sync_transport = self._build_transports()
+
+    def _build_transports(self) -> Tuple[Transport, Transport]:
+        """
+        :return: (transport for asyncio code, transport for blocking code)
+        """
+        mode = self.transport_mode.upper()
+        cassette_folder = self.client_settings.get('http_cassette_folder') or settings.HTTP_CASSETTE_FOLDER
+        if mode == REPLAY:
+            replay = RecordReplayTransport(cassette_folder)
+            return replay, replay
+
+        http_timeout = self.client_settings.get('http_timeout') or settings.HTTP_TIMEOUT
+        requests_transport = RequestsTransport(lambda: self.requests_session, default_timeout=http_timeout)
+        # AIOHTTP(default) and RECORD: aiohttp for asyncio code, requests for blocking code
+        aiohttp_transport = AiohttpTransport(self.aiohttp_session, self.run)
+        if mode == RECORD:
+            # recording must see the real responses, so no cache here
+            return (RecordReplayTransport(cassette_folder, inner=aiohttp_transport),
+                    RecordReplayTransport(cassette_folder, inner=requests_transport))
+        if mode == REQUESTS:
+            transports: Tuple[Transport, Transport] = (requests_transport, requests_transport)
+        else:
+            if mode != AIOHTTP:
+                self.logger.warning(f'Unknown http_transport {self.transport_mode}, fallback to {AIOHTTP}.')
+            transports = (aiohttp_transport, requests_transport)
+
+        if not self.client_settings.get('http_cache', settings.HTTP_CACHE):
+            return transports
+        # 0 is a valid ttl: always revalidate
+        cache_ttl = self.client_settings.get('http_cache_ttl')
+        self.response_cache = ResponseCache(
+            cache_folder=self.client_settings.get('http_cache_folder') or settings.HTTP_CACHE_FOLDER,
+            default_ttl=settings.HTTP_CACHE_TTL if cache_ttl is None else cache_ttl,
+            max_bytes=self.client_settings.get('http_cache_max_size') or settings.HTTP_CACHE_MAX_SIZE,
+            logger=self.logger)
+        return CachingTransport(transports[0], self.response_cache), CachingTransport(transports[1], self.response_cache)
+
+    async def get_text(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                       job: Optional[RetryJob] = None) -> Optional[str]:
+        """
+        GET with retries. Concurrent calls for the same url share one request.
+
+        :return: response text, or None if 404 or it still fails after retries.
+        """
+        async def _get() -> Optional[str]:
+            resp = await self.transport.fetch('GET', url, headers=headers, timeout=timeout)
+            if resp.status == 200:
+                return resp.text
+            elif resp.status == 404:
+                return None
+            raise error_for_status(resp.status, url)
+
+        async def _get_with_retry() -> Optional[str]:
+            try:
+                return await (job or self.retry_engine.job(url)).run(url, _get)
+            except (Exception,):
+                return None
+
+        return await self.single_flight.do(f'GET {url}', _get_with_retry, resource=url)
+
+    async def post_text(self, url: str, data: Any, headers: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None, job: Optional[RetryJob] = None) -> Optional[str]:
+        """
+        POST with retries.
+
+        :return: response text, or None if it still fails after retries.
+        """
+        async def _post() -> Optional[str]:
+            resp = await self.transport.fetch('POST', url, headers=headers, data=data, timeout=timeout)
+            if resp.status == 200:
+                return resp.text
+            raise error_for_status(resp.status, url)
+
+        try:
+            return await (job or self.retry_engine.job(url)).run(url, _post)
+        except (Exception,):
+            return None
+
+    def get_sync(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                 job: Optional[RetryJob] = None) -> Optional[TransportResponse]:
+        """
+        Blocking GET with retries. Concurrent calls for the same url share one request.
+
+        :return: response, or None if it still fails after retries.
+        """
+        def _get() -> TransportResponse:
+            resp = self.sync_transport.fetch_sync('GET', url, headers=headers, timeout=timeout)
+            if resp:
+                return resp
+            # status >= 400
+            raise error_for_status(resp.status, url)
+
+        def _get_with_retry() -> Optional[TransportResponse]:
+            try:
+                return (job or self.retry_engine.job(url)).run_sync(url, _get)
+            except (Exception,):
+                return None
+
+        return self.single_flight.do_sync(f'GET {url}', _get_with_retry, resource=url)
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                                     name='http-client-loop',
+                                                     daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """
+        Drop-in replacement of ``asyncio.run()``: block until the coroutine is done on the shared event loop.
+        """
+        if threading.current_thread() is self._loop_thread:
+            raise RuntimeError('HttpClientManager.run() can not be called inside its own event loop, use await.')
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> 'Future[T]':
+        """
+        Schedule the coroutine on the shared event loop without waiting for it.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def aiohttp_session(self) -> aiohttp.ClientSession:
+        """
+        The shared aiohttp session. Must be called inside the shared event loop(i.e. in a coroutine passed to run()).
+        """
+        if self._aiohttp_session is None or self._aiohttp_session.closed:
+            # see issue https://github.com/lightnovel-center/linovelib2epub/issues/34 for ssl=False
+            connector = aiohttp.TCPConnector(ssl=False,
+                                             limit=self._pool_size,
+                                             limit_per_host=self._pool_size_per_host,
+                                             use_dns_cache=True,
+                                             ttl_dns_cache=self._dns_cache_ttl,
+                                             enable_cleanup_closed=True)
+            trust_env = False if self.client_settings.get("disable_proxy", settings.DISABLE_PROXY) else True
+            timeout = aiohttp.ClientTimeout(total=30, connect=15)
+            self._aiohttp_session = aiohttp.ClientSession(connector=connector,
+                                                          trust_env=trust_env,
+                                                          timeout=timeout,
+                                                          cookie_jar=aiohttp.CookieJar(unsafe=True))
+        return self._aiohttp_session
+
+    @property
+    def requests_session(self) -> requests.Session:
+        with self._lock:
+            if self._requests_session is None:
+                session = requests.Session()
+                # pool_connections: how many host pools to keep; pool_maxsize: connections kept for one host.
+                adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size_per_host)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                if self.client_settings.get("disable_proxy", settings.DISABLE_PROXY):
+                    session.trust_env = False
+                self._requests_session = session
+            return self._requests_session
+
+    def remember_host(self, url: str) -> None:
+        """
+        Record the host of an url found during the crawl(e.g. an image url in chapter content) and warm a connection
+        to it in background, so the TLS handshake is already done when the image download phase starts.
+        """
+        origin = self._origin_of(url)
+        if not origin or self.transport_mode.upper() == REPLAY:
+            return
+
+        with self._lock:
+            if origin in self._known_origins:
+                return
+            self._known_origins.add(origin)
+
+        self.submit(self._warm_up_origin(origin))
+
+    async def _warm_up_origin(self, origin: str) -> None:
+        session = await self.aiohttp_session()
+        try:
+            # the response is released at the end of `async with`, and the connection goes back to the pool.
+            async with session.head(origin, allow_redirects=False, timeout=aiohttp.ClientTimeout(total=10)):
+                pass
+            self.logger.debug(f'Warm up connection to {origin} ok.')
+        except (Exception,) as e:
+            # warm-up is only an optimization
+            self.logger.debug(f'Warm up connection to {origin} failed: {e.__class__.__name__}.')
+
+    @staticmethod
+    def _origin_of(url: str) -> str:
+        if not url:
+            return ''
+        if url.startswith('//'):
+            url = f'https:{url}'
+        u = urlsplit(url)
+        if u.scheme not in ('http', 'https') or not u.hostname:
+            return ''
+        return f'{u.scheme}://{u.netloc}'
+
+    def close(self) -> None:
+        self.single_flight.log_stats()
+        self.mirrors.log_snapshot()
+        if self.response_cache is not None:
+            self.logger.info(f'[ResponseCache] {self.response_cache.stats()}')
+
+        if self._loop is not None and not self._loop.is_closed():
+            self.run(self._shutdown())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._loop_thread is not None:
+                self._loop_thread.join()
+            self._loop.close()
+
+        if self._requests_session is not None:
+            self._requests_session.close()
+            self._requests_session = None
+
+    async def _shutdown(self) -> None:
+        # e.g. warm-up tasks still waiting for a slow host
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        if self._aiohttp_session is not None and not self._aiohttp_session.closed:
+            await self._aiohttp_session.close()
@@ -0,0 +1,200 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from logging import Logger as LoggerAlias
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+T = TypeVar('T')
+
+# attempt(url, claim) of race(). claim() must be called before any side effect(e.g. writing a file), it returns False
+# if another candidate already won, then the attempt should return at once.
+Attempt = Callable[[str, Callable[[], bool]], Awaitable[Optional[T]]]
+
+
+class MirrorTracker:
+    """
+    Groups of interchangeable hosts(the same path is served by every host of a group) and an EWMA of the time to first
+    byte of every host seen in this run, so the fastest mirror is tried first and a failing one sinks to the end.
+    """
+
+    def __init__(self, alpha: float = 0.3, default_latency: float = 1.0, failure_penalty: float = 10.0,
+                 logger: Optional[LoggerAlias] = None) -> None:
+        self.alpha = alpha
+        # assumed latency of a host never tried
+        self.default_latency = default_latency
+        # latency recorded for a failed attempt
+        self.failure_penalty = failure_penalty
+        self.logger = logger
+
+        self._groups: Dict[str, List[str]] = {}
+        self._ewma: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_group(self, hosts: Iterable[str]) -> None:
+        group = list(dict.fromkeys(hosts))
+        with self._lock:
+            for host in group:
+                self._groups[host] = group
+
+    def candidates(self, url: str) -> List[str]:
+        """
+        :return: the url on every mirror of its host, the fastest first. Only [url] if the host has no mirror.
+        """
+        u = urlsplit(url)
+        with self._lock:
+            group = self._groups.get(u.hostname or '')
+            if not group:
+                return [url]
+            # the original host wins ties
+            hosts = sorted(group, key=lambda h: (self._ewma.get(h, self.default_latency), h != u.hostname))
+        netloc_suffix = f':{u.port}' if u.port else ''
+        return [u._replace(netloc=f'{host}{netloc_suffix}').geturl() for host in hosts]
+
+    def record_success(self, url: str, latency: float) -> None:
+        self._update(urlsplit(url).hostname or '', latency)
+
+    def record_failure(self, url: str) -> None:
+        self._update(urlsplit(url).hostname or '', self.failure_penalty)
+
+    def _update(self, host: str, latency: float) -> None:
+        with self._lock:
+            old = self._ewma.get(host)
+            self._ewma[host] = latency if old is None else self.alpha * latency + (1 - self.alpha) * old
+
+    def hedge_delay(self, url: str, max_delay: float) -> float:
+        """
+        How long to wait for `url` before racing the next mirror: twice its usual latency, at most `max_delay`.
+        """
+        with self._lock:
+            ewma = self._ewma.get(urlsplit(url).hostname or '')
+        if ewma is None:
+            return max_delay
+        return min(max_delay, max(0.1, 2 * ewma))
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {host: round(latency, 3) for host, latency in self._ewma.items()}
+
+    def log_snapshot(self) -> None:
+        if self.logger and self._ewma:
+            self.logger.info(f'[MirrorTracker] ewma latency(s): {self.snapshot()}')
+
+
+class _Race:
+    """
+    State of one race() call.
+    """
+
+    def __init__(self, candidates: List[str], attempt: Attempt, tracker: Optional[MirrorTracker]) -> None:
+        self.waiting: Deque[str] = deque(candidates)
+        self.attempt = attempt
+        self.tracker = tracker
+        self.tasks: Dict['asyncio.Task[Any]', str] = {}
+        self.started_at: Dict[str, float] = {}
+        self.winner: Optional[str] = None
+        self.last_error: Optional[BaseException] = None
+
+    def launch(self) -> None:
+        url = self.waiting.popleft()
+        self.started_at[url] = time.monotonic()
+        self.tasks[asyncio.ensure_future(self.attempt(url, functools.partial(self.claim, url)))] = url
+
+    def launch_next(self) -> None:
+        if self.winner is None and self.waiting:
+            self.launch()
+
+    def claim(self, url: str) -> bool:
+        if self.winner is not None:
+            return self.winner == url
+        self.winner = url
+        self.record_latency(url)
+        self.cancel_others(url)
+        return True
+
+    def record_latency(self, url: str) -> None:
+        started_at = self.started_at.pop(url, None)
+        if self.tracker and started_at is not None:
+            self.tracker.record_success(url, time.monotonic() - started_at)
+
+    def cancel_others(self, url: str) -> None:
+        for task, task_url in self.tasks.items():
+            if task_url != url:
+                task.cancel()
+
+    def running(self) -> List['asyncio.Task[Any]']:
+        return [task for task in self.tasks if not task.done()]
+
+    def settle(self, task: 'asyncio.Task[Any]') -> bool:
+        """
+        :return: True if the race is decided by this finished task.
+        """
+        url = self.tasks[task]
+        if task.cancelled():
+            return False
+
+        error = task.exception()
+        if error is not None:
+            self.started_at.pop(url, None)
+            if self.tracker:
+                self.tracker.record_failure(url)
+            if url == self.winner:
+                raise error
+            self.last_error = error
+            # fail over at once
+            self.launch_next()
+            return False
+
+        if task.result() is not None or url == self.winner:
+            self.record_latency(url)
+            self.cancel_others(url)
+            return True
+
+        # no result here, e.g. 404 on this mirror
+        self.started_at.pop(url, None)
+        self.launch_next()
+        return False
+
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+async def race(candidates: List[str],
+               attempt: Attempt,
+               hedge_delay: float = 0.0,
+               tracker: Optional[MirrorTracker] = None) -> Any:
+    """
+    Hedged request over equivalent urls: start with the first candidate, start the next one when the running ones
+    are slower than `hedge_delay`(0: all at once) or one of them failed. The first attempt returning a result(or
+    claiming) wins and the others are cancelled.
+
+    :return: the result of the winner, or None if every attempt returned None(e.g. 404 on every mirror).
+    :raise: the error of the winner, or the last error if no attempt won.
+    """
+    state = _Race(candidates, attempt, tracker)
+    state.launch()
+    while hedge_delay <= 0 and state.waiting:
+        state.launch()
+
+    try:
+        while running := state.running():
+            timeout = hedge_delay if state.waiting and state.winner is None else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # the running ones are slow, hedge with the next mirror
+                state.launch()
+                continue
+
+            for task in done:
+                if state.settle(task):
+                    return task.result()
+    finally:
+        await state.close()
+
+    if state.last_error is not None:
+        raise state.last_error
+    return None
@@ -0,0 +1,271 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from logging import Logger as LoggerAlias
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+# Page markers of a throttled response. Some sites answer 200 with a "slow down" page instead of 429.
+# - masiro: <h3>访问频繁，歇会吧您内。</h3>
+# - linovelib: You are being rate limited
+THROTTLE_MARKERS = ('访问频繁', 'You are being rate limited')
+
+# 429 Too Many Requests, 503 Service Unavailable
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def is_throttled_response(status: Optional[int], body: Optional[str] = None) -> bool:
+    if status in THROTTLE_STATUS_CODES:
+        return True
+    if body:
+        return any(marker in body for marker in THROTTLE_MARKERS)
+    return False
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After is either delay-seconds (e.g. "120") or a HTTP-date (e.g. "Wed, 21 Oct 2015 07:28:00 GMT").
+
+    :return: seconds to wait, or None if header is absent or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+@dataclass
+class RateLimitPolicy:
+    """
+    Start values and bounds of one host limiter.
+
+    concurrency(requests in flight) and rate(requests per second, token bucket) both follow AIMD:
+    additive increase after `increase_after` healthy responses in a row, multiplicative decrease on throttling.
+    """
+    initial_concurrency: int = 2
+    min_concurrency: int = 1
+    max_concurrency: int = 8
+
+    initial_rate: float = 2.0
+    min_rate: float = 0.2
+    max_rate: float = 20.0
+    rate_step: float = 0.5
+
+    increase_after: int = 10
+    decrease_factor: float = 0.5
+
+    # pause of the whole host after throttling if the server doesn't send Retry-After
+    throttle_cooldown: float = 5.0
+
+    # the politeness delay of acquire(delay) is randomized by +/- this fraction, e.g. 0.3 => 0.7 ~ 1.3 times
+    delay_jitter: float = 0.0
+
+
+class HostRateLimiter:
+    """
+    Adaptive limiter of one host. It's thread safe, so both asyncio code(`acquire`) and blocking code running in
+    threads(`acquire_blocking`) can share one limiter.
+
+    A politeness delay(crawl delay) only gates the next request to this host: the caller waits until `delay` seconds
+    passed since the last request to the host started or finished, so the time spent meanwhile on parsing or on other
+    hosts counts as waiting.
+
+    Usage::
+
+        await limiter.acquire(delay=2.0)
+        try:
+            ...
+        finally:
+            limiter.release(status, body, retry_after)
+    """
+
+    # how often a waiter re-checks when the host is at its concurrency limit
+    _POLL_INTERVAL = 0.05
+
+    def __init__(self, host: str, policy: RateLimitPolicy, logger: Optional[LoggerAlias] = None,
+                 enabled: bool = True) -> None:
+        self.host = host
+        self.policy = policy
+        self.logger = logger
+        # a disabled limiter only counts requests, e.g. when responses are replayed from disk
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self.concurrency: int = policy.initial_concurrency
+        self.rate: float = policy.initial_rate
+        self._tokens: float = 1.0
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._healthy_streak = 0
+        # the last time a request to the host started or finished, politeness delays count from it
+        self._last_activity = -math.inf
+
+        self.in_flight = 0
+        self.total_requests = 0
+        self.throttled_count = 0
+
+    def _try_acquire(self, delay: float = 0.0) -> float:
+        """
+        :param delay: politeness delay of this request, already jittered.
+        :return: 0 if a slot is taken, else seconds to wait before the next try.
+        """
+        with self._lock:
+            if not self.enabled:
+                self.in_flight += 1
+                self.total_requests += 1
+                return 0.0
+
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if now < self._last_activity + delay:
+                return self._last_activity + delay - now
+
+            capacity = max(1.0, self.rate)
+            self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            if self.in_flight >= self.concurrency:
+                return self._POLL_INTERVAL
+            if self._tokens < 1.0:
+                return (1.0 - self._tokens) / self.rate
+
+            self._tokens -= 1.0
+            self.in_flight += 1
+            self.total_requests += 1
+            self._last_activity = now
+            return 0.0
+
+    def _jittered(self, delay: float) -> float:
+        if delay <= 0:
+            return 0.0
+        jitter = self.policy.delay_jitter
+        return delay * random.uniform(1.0 - jitter, 1.0 + jitter)
+
+    async def acquire(self, delay: float = 0.0) -> None:
+        """
+        :param delay: politeness delay(seconds) since the last request to this host, see delay_jitter.
+        """
+        delay = self._jittered(delay)
+        while (wait := self._try_acquire(delay)) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self, delay: float = 0.0) -> None:
+        delay = self._jittered(delay)
+        while (wait := self._try_acquire(delay)) > 0:
+            time.sleep(wait)
+
+    def release(self, status: Optional[int] = None, body: Optional[str] = None,
+                retry_after: Optional[str] = None) -> None:
+        """
+        Give the slot back and adapt the limits by the response.
+
+        :param status: http status code. None means no response at all(network error), limits are kept as is.
+        :param body: response text, used to detect throttle markers of 200 pages.
+        :param retry_after: raw value of Retry-After header.
+        """
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._last_activity = max(self._last_activity, time.monotonic())
+
+            if is_throttled_response(status, body):
+                self._on_throttled(status, parse_retry_after(retry_after))
+            elif status is not None and status < 500:
+                self._on_healthy()
+            else:
+                self._healthy_streak = 0
+
+    def _on_healthy(self) -> None:
+        policy = self.policy
+        self._healthy_streak += 1
+        if self._healthy_streak < policy.increase_after:
+            return
+        self._healthy_streak = 0
+
+        old_concurrency, old_rate = self.concurrency, self.rate
+        self.concurrency = min(policy.max_concurrency, self.concurrency + 1)
+        self.rate = min(policy.max_rate, self.rate + policy.rate_step)
+        if (old_concurrency, old_rate) != (self.concurrency, self.rate) and self.logger:
+            self.logger.debug(f'[RateLimiter] {self.host} healthy: concurrency {old_concurrency} -> '
+                              f'{self.concurrency}, rate {old_rate:.2f} -> {self.rate:.2f} req/s')
+
+    def _on_throttled(self, status: Optional[int], retry_after: Optional[float]) -> None:
+        policy = self.policy
+        self._healthy_streak = 0
+        self.throttled_count += 1
+
+        old_concurrency, old_rate = self.concurrency, self.rate
+        self.concurrency = max(policy.min_concurrency, math.floor(self.concurrency * policy.decrease_factor))
+        self.rate = max(policy.min_rate, self.rate * policy.decrease_factor)
+
+        pause = retry_after if retry_after is not None else policy.throttle_cooldown
+        self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+        self._tokens = 0.0
+
+        if self.logger:
+            self.logger.warning(f'[RateLimiter] {self.host} throttled(status={status}): concurrency '
+                                f'{old_concurrency} -> {self.concurrency}, rate {old_rate:.2f} -> {self.rate:.2f} '
+                                f'req/s, pause {pause:.1f}s')
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'concurrency': self.concurrency,
+                'rate': round(self.rate, 2),
+                'in_flight': self.in_flight,
+                'total_requests': self.total_requests,
+                'throttled_count': self.throttled_count,
+                'paused_for': round(max(0.0, self._blocked_until - time.monotonic()), 1),
+            }
+
+
+class RateLimiterRegistry:
+    """
+    One HostRateLimiter per hostname, created on first use. Spiders configure the policy of their own site, other
+    hosts use `default_policy`.
+    """
+
+    def __init__(self, default_policy: Optional[RateLimitPolicy] = None, logger: Optional[LoggerAlias] = None,
+                 enabled: bool = True) -> None:
+        self.default_policy = default_policy or RateLimitPolicy()
+        self.logger = logger
+        self.enabled = enabled
+        self._policies: Dict[str, RateLimitPolicy] = {}
+        self._limiters: Dict[str, HostRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host: str, policy: RateLimitPolicy) -> None:
+        with self._lock:
+            self._policies[host] = policy
+            # not used yet, just replace it
+            self._limiters.pop(host, None)
+
+    def for_url(self, url: str) -> HostRateLimiter:
+        host = urlsplit(url).hostname or url
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                policy = self._policies.get(host, self.default_policy)
+                limiter = self._limiters[host] = HostRateLimiter(host, policy, self.logger, self.enabled)
+            return limiter
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.host: limiter.snapshot() for limiter in limiters}
+
+    def log_snapshot(self) -> None:
+        if not self.logger:
+            return
+        for host, state in self.snapshot().items():
+            self.logger.info(f'[RateLimiter] {host}: {state}')
@@ -0,0 +1,390 @@
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from logging import Logger as LoggerAlias
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+
+from ..exceptions import (CircuitOpenException, FatalHttpException, LinovelibException,
+                          PageContentIllegalException, RetryableHttpException, ThrottledException)
+
+T = TypeVar('T')
+
+# errors that retrying can't fix, checked before RETRIABLE_EXCEPTIONS because some of them are OSError too
+FATAL_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    FatalHttpException,
+    requests.exceptions.InvalidURL,
+    requests.exceptions.MissingSchema,
+    requests.exceptions.InvalidSchema,
+    aiohttp.InvalidURL,
+)
+
+RETRIABLE_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    RetryableHttpException,
+    PageContentIllegalException,
+    asyncio.TimeoutError,
+    aiohttp.ClientError,
+    # requests.RequestException, ConnectionError, and IOError raised by check_image_integrity()
+    OSError,
+)
+
+
+def error_for_status(status: int, url: str) -> LinovelibException:
+    """
+    Map a bad http status to the exception type the retry engine understands.
+    """
+    if status == 429:
+        return ThrottledException(f'{url} failed with status {status}.')
+    # 408 Request Timeout, 425 Too Early, 5xx server errors
+    if status in (408, 425) or status >= 500:
+        return RetryableHttpException(f'{url} failed with status {status}.')
+    return FatalHttpException(f'{url} failed with status {status}.')
+
+
+def is_retriable(error: BaseException, extra_retriable: Tuple[Type[BaseException], ...] = ()) -> bool:
+    if isinstance(error, FATAL_EXCEPTIONS):
+        return False
+    return isinstance(error, RETRIABLE_EXCEPTIONS + extra_retriable)
+
+
+@dataclass
+class RetryPolicy:
+    # total attempts of one request = 1 + retries
+    max_attempts: int = 6
+
+    base_delay: float = 1.0
+    max_delay: float = 10.0
+    jitter: float = 1.0
+
+    def backoff(self, attempt: int) -> float:
+        """
+        :param attempt: the number of failed attempts so far, starts from 1.
+        """
+        # 指数退避参考 https://cloud.google.com/memorystore/docs/redis/exponential-backoff?hl=zh-cn#example_algorithm
+        # 具体逻辑：
+        # 1.向服务器特定API发出请求。
+        # 2.如果请求失败，请等待 1 + random_number_milliseconds 秒后再重试请求。
+        # 3.如果请求失败，请等待 2 + random_number_milliseconds 秒后再重试请求。
+        # 4.如果请求失败，请等待 4 + random_number_milliseconds 秒后再重试请求。
+        # 5.依此类推，等待时间上限为 maximum_backoff。
+        # 等待时间达到上限后，您可以继续等待并重试，直到达到重试次数上限（但接下来的重试操作不会增加各次重试之间的等待时间）。
+
+        # 等待时间为 min(((2^n)+random_number_seconds), maximum_backoff)，其中，n 会在每次迭代（请求）后增加 1。
+        # 其中：
+        # - random_number_seconds 是小于1的秒数（随机值）。
+        # - maximum_backoff 设置为一个较大的容忍值，这里设置为10s。这是基于经验的估计。
+        delay = self.base_delay * (2 ** (attempt - 1)) + random.uniform(0, self.jitter)
+        return round(min(delay, self.max_delay), 2)
+
+
+class RetryBudget:
+    """
+    Retries allowed for a job: `min_retries` + `ratio` * calls. When a host is down, most of the calls fail and the
+    budget runs out fast, so the job fails fast instead of multiplying the load on the host by max_attempts.
+
+    Throttling(ThrottledException) is normal in a long crawl and is not counted, the rate limiter slows down for it.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10) -> None:
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.calls = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.retries >= self.min_retries + self.ratio * self.calls:
+                return False
+            self.retries += 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    closed -> open: after `failure_threshold` retriable failures in a row.
+    open -> half-open: after `reset_timeout` seconds, one trial request is let through.
+    half-open -> closed on success, -> open again on failure, stays half-open if the trial is cancelled.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 logger: Optional[LoggerAlias] = None) -> None:
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.logger = logger
+
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        # the call holding the trial, see on_cancel()
+        self._trial_token: Optional[object] = None
+        self._lock = threading.Lock()
+
+    def before_call(self, token: Optional[object] = None) -> float:
+        """
+        :param token: identifies the call, in case it becomes the trial and is cancelled.
+        :return: 0 if the call can go, else seconds until the breaker half-opens.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+
+            if self._trial_in_flight:
+                # someone is probing the host right now
+                return 1.0
+
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = True
+            self._trial_token = token
+            return 0.0
+
+    def on_cancel(self, token: Optional[object] = None) -> None:
+        """
+        The call ended without an answer of the host, e.g. a CancelledError of a race loser or of the shutdown. If it
+        was the trial, let the next call be the trial.
+        """
+        with self._lock:
+            if self._trial_in_flight and self._trial_token is token:
+                self._trial_in_flight = False
+                self._trial_token = None
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED and self.logger:
+                self.logger.info(f'[CircuitBreaker] {self.host} recovered, circuit closed.')
+            self.state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+            self._trial_token = None
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            was_half_open = self.state == self.HALF_OPEN
+            self._trial_in_flight = False
+            self._trial_token = None
+
+            if was_half_open or self._consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN and self.logger:
+                    self.logger.warning(f'[CircuitBreaker] {self.host} failed {self._consecutive_failures} times '
+                                        f'in a row, circuit open for {self.reset_timeout}s.')
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+@dataclass
+class FailureRecord:
+    url: str
+    attempts: int
+    error: str
+
+
+@dataclass
+class RetryJob:
+    """
+    A group of requests sharing one retry budget, e.g. all the pages of a book or all the images of a book.
+    """
+    name: str
+    engine: 'RetryEngine'
+    budget: Optional[RetryBudget] = None
+    # exceptions of third-party libraries which are retriable for this job, e.g. selenium WebDriverException
+    extra_retriable: Tuple[Type[BaseException], ...] = ()
+    # overrides max_attempts of the engine policy, e.g. 1 for a speculative request
+    max_attempts: Optional[int] = None
+    # False for speculative requests: their retriable failures don't open the circuit of the host
+    count_in_breaker: bool = True
+
+    succeeded: int = 0
+    retries: int = 0
+    failures: List[FailureRecord] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    async def run(self, url: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Call `func` until it succeeds, a fatal error happens, or attempts/budget are used up.
+        The last error is re-raised after being recorded in `failures`.
+        """
+        if self.budget:
+            self.budget.record_call()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            token = object()
+            try:
+                self._check_circuit(url, token)
+                result = await func()
+            except Exception as e:
+                delay = self._after_failure(url, attempt, e, token)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            except BaseException:
+                # CancelledError: neither a success nor a failure of the host
+                self.engine.breaker_for(url).on_cancel(token)
+                raise
+            else:
+                self._after_success(url)
+                return result
+
+    def run_sync(self, url: str, func: Callable[[], T]) -> T:
+        """
+        Blocking version of run(), for requests/selenium code.
+        """
+        if self.budget:
+            self.budget.record_call()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            token = object()
+            try:
+                self._check_circuit(url, token)
+                result = func()
+            except Exception as e:
+                delay = self._after_failure(url, attempt, e, token)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            except BaseException:
+                # e.g. KeyboardInterrupt
+                self.engine.breaker_for(url).on_cancel(token)
+                raise
+            else:
+                self._after_success(url)
+                return result
+
+    def _check_circuit(self, url: str, token: Optional[object] = None) -> None:
+        wait = self.engine.breaker_for(url).before_call(token)
+        if wait:
+            raise CircuitOpenException(f'circuit of {urlsplit(url).hostname} is open.', retry_in=wait)
+
+    def _after_success(self, url: str) -> None:
+        self.engine.breaker_for(url).on_success()
+        with self._lock:
+            self.succeeded += 1
+
+    def _after_failure(self, url: str, attempt: int, error: Exception,
+                       token: Optional[object] = None) -> Optional[float]:
+        """
+        :return: seconds to wait before the next attempt, or None if the error should be raised now.
+        """
+        logger = self.engine.logger
+        max_attempts = self.max_attempts or self.engine.policy.max_attempts
+        short_circuited = isinstance(error, CircuitOpenException)
+        retriable = short_circuited or is_retriable(error, self.extra_retriable)
+        if not retriable:
+            # e.g. 404: the host did answer, so it is alive.
+            self.engine.breaker_for(url).on_success()
+        elif not short_circuited and self.count_in_breaker:
+            self.engine.breaker_for(url).on_failure()
+        elif not short_circuited:
+            # not counted, but release the trial if this call was it
+            self.engine.breaker_for(url).on_cancel(token)
+
+        if not retriable:
+            reason = 'fatal error'
+        elif attempt >= max_attempts:
+            reason = f'gave up after {attempt} attempts'
+        elif self.budget and not isinstance(error, ThrottledException) and not self.budget.try_spend():
+            reason = f'retry budget of job "{self.name}" is exhausted'
+        else:
+            with self._lock:
+                self.retries += 1
+            if short_circuited:
+                delay = round(error.retry_in, 2)  # type: ignore[attr-defined]
+            else:
+                delay = self.engine.policy.backoff(attempt)
+            if logger:
+                logger.warning(f'{url} failed({error.__class__.__name__}: {error}); '
+                               f'retry {attempt}/{max_attempts - 1} in {delay}(s).')
+            return delay
+
+        if logger:
+            logger.error(f'{url} failed({error.__class__.__name__}: {error}); {reason}.')
+        self._record_failure(url, attempt, error)
+        return None
+
+    def _record_failure(self, url: str, attempts: int, error: Exception) -> None:
+        with self._lock:
+            self.failures.append(FailureRecord(url, attempts, f'{error.__class__.__name__}: {error}'))
+
+    def report(self) -> None:
+        """
+        Log a summary of the job, including every url that failed finally.
+        """
+        logger = self.engine.logger
+        if not logger:
+            return
+
+        summary = (f'[RetryReport] job "{self.name}": {self.succeeded} succeeded, {len(self.failures)} failed, '
+                   f'{self.retries} retries.')
+        if not self.failures:
+            logger.info(summary)
+            return
+
+        logger.warning(summary)
+        for failure in self.failures:
+            logger.warning(f'[RetryReport]  - {failure.url} ({failure.attempts} attempts) {failure.error}')
+
+
+class RetryEngine:
+    """
+    The retry logic shared by all spiders: error classification, jittered exponential backoff, per-job retry budget
+    and per-host circuit breaker.
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, logger: Optional[LoggerAlias] = None,
+                 breaker_failure_threshold: int = 5, breaker_reset_timeout: float = 30.0) -> None:
+        self.policy = policy or RetryPolicy()
+        self.logger = logger
+        self._breaker_failure_threshold = breaker_failure_threshold
+        self._breaker_reset_timeout = breaker_reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def job(self, name: str, budget: Optional[RetryBudget] = None,
+            extra_retriable: Tuple[Type[BaseException], ...] = (), max_attempts: Optional[int] = None,
+            count_in_breaker: bool = True) -> RetryJob:
+        return RetryJob(name=name, engine=self, budget=budget, extra_retriable=extra_retriable,
+                        max_attempts=max_attempts, count_in_breaker=count_in_breaker)
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).hostname or url
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(host,
+                                                                self._breaker_failure_threshold,
+                                                                self._breaker_reset_timeout,
+                                                                self.logger)
+            return breaker
+
+    async def call(self, url: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Retry a single request which doesn't belong to a bigger job. No budget, only max_attempts.
+        """
+        return await self.job(url).run(url, func)
+
+    def call_sync(self, url: str, func: Callable[[], T]) -> T:
+        return self.job(url).run_sync(url, func)
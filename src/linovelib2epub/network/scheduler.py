@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import time
+from collections import defaultdict, deque
+from enum import IntEnum
+from logging import Logger as LoggerAlias
+from typing import Any, Awaitable, Callable, Deque, Dict, Generic, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+T = TypeVar('T')
+
+
+class ImagePriority(IntEnum):
+    """
+    Priority lanes of the image download scheduler, a smaller value goes first.
+    """
+    BOOK_COVER = 0
+    VOLUME_COVER = 1
+    CONTENT = 2
+
+
+# (priority, seq, url, item). seq keeps the insertion(reading) order inside one lane.
+_QueueEntry = Tuple[int, int, str, Any]
+
+# sorts after every real entry, so workers finish the queue before they stop
+_STOP_ENTRY: _QueueEntry = (len(ImagePriority) + 1, 0, '', None)
+
+
+class DownloadScheduler(Generic[T]):
+    """
+    Download items with a bounded worker pool:
+
+    - at most `workers` downloads in flight.
+    - at most `per_host` downloads in flight for one host. An item of a busy host is parked and goes back to the
+      queue when a download of that host finishes, so the workers keep serving other hosts meanwhile.
+    - items are taken by (priority, insertion order).
+
+    Usage::
+
+        scheduler = DownloadScheduler(download, workers=16, per_host=4, logger=logger)
+        for image in images:
+            scheduler.add(image.download_url, image, ImagePriority.CONTENT)
+        await scheduler.run()
+
+    `download(item)` owns retrying. An exception raised by it is counted as a failure and doesn't stop the others.
+    """
+
+    def __init__(self,
+                 download: Callable[[T], Awaitable[Any]],
+                 workers: int = 16,
+                 per_host: int = 4,
+                 logger: Optional[LoggerAlias] = None,
+                 stats_interval: float = 10.0) -> None:
+        self._download = download
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.logger = logger
+        self.stats_interval = stats_interval
+
+        self._entries: list = []
+        self._seq = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._active: Dict[str, int] = defaultdict(int)
+        self._parked: Dict[str, Deque[_QueueEntry]] = defaultdict(deque)
+
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self._started_at = 0.0
+
+    def add(self, url: str, item: T, priority: int = ImagePriority.CONTENT) -> None:
+        """
+        Must be called before run().
+        """
+        self._entries.append((int(priority), next(self._seq), url, item))
+        self.total += 1
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        :return: the final stats, see stats().
+        """
+        self._queue = asyncio.PriorityQueue()
+        for entry in self._entries:
+            self._queue.put_nowait(entry)
+        self._entries = []
+        self.max_queue_depth = self._queue.qsize()
+        self._started_at = time.monotonic()
+
+        workers = [asyncio.create_task(self._worker(), name=f'download-worker-{i}') for i in range(self.workers)]
+        reporter = asyncio.create_task(self._report_periodically())
+        try:
+            await self._queue.join()
+        finally:
+            for _ in workers:
+                self._queue.put_nowait(_STOP_ENTRY)
+            await asyncio.gather(*workers, return_exceptions=True)
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+
+        stats = self.stats()
+        if self.logger:
+            self.logger.info(f'[DownloadScheduler] finished: {stats}')
+        return stats
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            entry = await queue.get()
+            if entry is _STOP_ENTRY:
+                queue.task_done()
+                return
+
+            host = self._host_of(entry[2])
+            if self._active[host] >= self.per_host:
+                # a download of this host is in flight, it will put the entry back when it's done.
+                self._parked[host].append(entry)
+                queue.task_done()
+                continue
+
+            self._active[host] += 1
+            try:
+                await self._download(entry[3])
+                self.succeeded += 1
+            except (Exception,):
+                self.failed += 1
+            finally:
+                self._active[host] -= 1
+                if self._parked[host]:
+                    # before task_done(), otherwise join() may see an empty queue
+                    queue.put_nowait(self._parked[host].popleft())
+                queue.task_done()
+
+    async def _report_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            if self.logger:
+                self.logger.info(f'[DownloadScheduler] {self.stats()}')
+
+    def queue_depth(self) -> int:
+        queued = self._queue.qsize() if self._queue else len(self._entries)
+        return queued + sum(len(parked) for parked in self._parked.values())
+
+    def stats(self) -> Dict[str, Any]:
+        depth = self.queue_depth()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        done = self.succeeded + self.failed
+        return {
+            'total': self.total,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'in_flight': sum(self._active.values()),
+            'queue_depth': depth,
+            'max_queue_depth': self.max_queue_depth,
+            'throughput': round(done / elapsed, 2) if elapsed else 0.0,  # items per second
+            'elapsed': round(elapsed, 1),
+        }
+
+    @staticmethod
+    def _host_of(url: str) -> str:
+        return urlsplit(url).hostname or ''
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future, wait
+from logging import Logger as LoggerAlias
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one call, every caller gets its result(or its exception).
+
+    Usage::
+
+        text = await single_flight.do(f'GET {url}', lambda: fetch(url))
+        resp = single_flight.do_sync(f'GET {url}', lambda: session.get(url))
+
+    Only calls in flight at the same time are collapsed, a later call runs again(caching is up to ResponseCache).
+    Such repeats are counted per `resource`, so the log tells which urls the spiders fetch more than once.
+
+    A cancelled call(CancelledError, KeyboardInterrupt) is not passed on to the callers waiting for it, one of them
+    runs `func` again in its place.
+    """
+
+    def __init__(self, logger: Optional[LoggerAlias] = None) -> None:
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        # asyncio code runs on one loop(HttpClientManager.loop), blocking code on any thread
+        self._async_calls: Dict[str, 'asyncio.Future[Any]'] = {}
+        self._sync_calls: Dict[str, 'Future[Any]'] = {}
+        self._executions: Counter = Counter()
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def _record(self, resource: str) -> None:
+        with self._lock:
+            self._executions[resource] += 1
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]], resource: Optional[str] = None) -> T:
+        """
+        :param resource: what is counted for repeats, defaults to `key`. e.g. the url of a page fetched both by
+          requests and by the browser.
+        """
+        with self._lock:
+            self.calls += 1
+        while True:
+            with self._lock:
+                in_flight = self._async_calls.get(key)
+                if in_flight is not None and in_flight.cancelled():
+                    # the cancelled leader didn't clean up yet
+                    in_flight = None
+                if in_flight is not None:
+                    self.coalesced += 1
+                else:
+                    future: 'asyncio.Future[T]' = asyncio.get_running_loop().create_future()
+                    self._async_calls[key] = future
+            if in_flight is None:
+                break
+            # wait() but not shield(): a cancelled follower must not cancel the call of the others, and the
+            # cancellation of the call is not raised in the follower
+            await asyncio.wait({in_flight})
+            if not in_flight.cancelled():
+                return in_flight.result()
+
+        self._record(resource or key)
+        try:
+            result = await func()
+        except Exception as e:
+            future.set_exception(e)
+            # mark it retrieved, there may be no follower at all
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._async_calls.get(key) is future:
+                    del self._async_calls[key]
+
+    def do_sync(self, key: str, func: Callable[[], T], resource: Optional[str] = None) -> T:
+        with self._lock:
+            self.calls += 1
+        while True:
+            with self._lock:
+                in_flight = self._sync_calls.get(key)
+                if in_flight is not None and in_flight.cancelled():
+                    # the cancelled leader didn't clean up yet
+                    in_flight = None
+                if in_flight is not None:
+                    self.coalesced += 1
+                else:
+                    future: 'Future[T]' = Future()
+                    self._sync_calls[key] = future
+            if in_flight is None:
+                break
+            wait([in_flight])
+            if not in_flight.cancelled():
+                return in_flight.result()
+
+        self._record(resource or key)
+        try:
+            result = func()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._sync_calls.get(key) is future:
+                    del self._sync_calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            repeated = {resource: n - 1 for resource, n in self._executions.items() if n > 1}
+            return {
+                'calls': self.calls,
+                'executed': sum(self._executions.values()),
+                'coalesced': self.coalesced,
+                'repeated': sum(repeated.values()),
+                'repeated_resources': len(repeated),
+            }
+
+    def log_stats(self, top: int = 5) -> None:
+        if not self.logger or not self.calls:
+            return
+        self.logger.info(f'[SingleFlight] {self.stats()}')
+        with self._lock:
+            most_repeated = [(r, n) for r, n in self._executions.most_common(top) if n > 1]
+        for resource, n in most_repeated:
+            self.logger.info(f'[SingleFlight]  - fetched {n} times: {resource}')
@@ -0,0 +1,283 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Dict, Optional, TypeVar
+from urllib.parse import urlencode, urlsplit
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from ..exceptions import FatalHttpException
+
+T = TypeVar('T')
+
+# HTTP_TRANSPORT
+AIOHTTP = 'AIOHTTP'
+REQUESTS = 'REQUESTS'
+RECORD = 'RECORD'
+REPLAY = 'REPLAY'
+
+
+@dataclass
+class TransportResponse:
+    """
+    A fully read response, the same shape whatever the backend is.
+    """
+    url: str
+    status: int
+    headers: CaseInsensitiveDict = field(default_factory=CaseInsensitiveDict)
+    content: bytes = b''
+    encoding: Optional[str] = None
+
+    @property
+    def status_code(self) -> int:
+        # requests style alias
+        return self.status
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    def __bool__(self) -> bool:
+        # like requests.Response: falsy if status >= 400
+        return self.ok
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+
+class TransportStream(ABC):
+    """
+    A response whose body is read chunk by chunk, see Transport.stream().
+    """
+    status: int
+    headers: CaseInsensitiveDict
+
+    @abstractmethod
+    def iter_chunks(self, chunk_size: int) -> AsyncIterator[bytes]:
+        raise NotImplementedError()
+
+
+class Transport(ABC):
+    """
+    The way spiders talk HTTP. Each backend implements both the asyncio and the blocking flavour, so a spider is
+    written once and can run over aiohttp, requests, or recorded responses(offline benchmark, regression tests).
+
+    Transports make exactly one attempt, retrying is up to RetryEngine.
+    """
+    name = ''
+
+    @abstractmethod
+    async def fetch(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                    data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def fetch_sync(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                   data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def stream(self, url: str, *, headers: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None) -> Any:
+        """
+        GET without reading the body. Usage::
+
+            async with transport.stream(url) as resp:
+                async for chunk in resp.iter_chunks(64 * 1024):
+                    ...
+        """
+        raise NotImplementedError()
+
+
+class _AiohttpStream(TransportStream):
+    def __init__(self, resp: aiohttp.ClientResponse) -> None:
+        self._resp = resp
+        self.status = resp.status
+        self.headers = CaseInsensitiveDict(resp.headers)
+
+    async def iter_chunks(self, chunk_size: int) -> AsyncIterator[bytes]:
+        async for chunk in self._resp.content.iter_chunked(chunk_size):
+            yield chunk
+
+
+class AiohttpTransport(Transport):
+    name = AIOHTTP
+
+    def __init__(self,
+                 session_factory: Callable[[], Awaitable[aiohttp.ClientSession]],
+                 run: Callable[[Coroutine[Any, Any, TransportResponse]], TransportResponse]) -> None:
+        """
+        :param session_factory: returns the shared session, see HttpClientManager.aiohttp_session()
+        :param run: runs a coroutine to the end from blocking code, see HttpClientManager.run()
+        """
+        self._session_factory = session_factory
+        self._run = run
+
+    @staticmethod
+    def _request_kwargs(headers: Optional[Dict[str, Any]], timeout: Optional[float]) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {'headers': headers or {}}
+        if timeout:
+            # else the session default
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        return kwargs
+
+    async def fetch(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                    data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        session = await self._session_factory()
+        async with session.request(method, url, data=data, **self._request_kwargs(headers, timeout)) as resp:
+            content = await resp.read()
+            try:
+                encoding = resp.get_encoding()
+            except (Exception,):
+                encoding = None
+            return TransportResponse(url=str(resp.url), status=resp.status, headers=CaseInsensitiveDict(resp.headers),
+                                     content=content, encoding=encoding)
+
+    def fetch_sync(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                   data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        return self._run(self.fetch(method, url, headers=headers, data=data, timeout=timeout))
+
+    @asynccontextmanager
+    async def stream(self, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None) -> AsyncIterator[TransportStream]:
+        session = await self._session_factory()
+        async with session.get(url, **self._request_kwargs(headers, timeout)) as resp:
+            yield _AiohttpStream(resp)
+
+
+class _RequestsStream(TransportStream):
+    def __init__(self, resp: requests.Response) -> None:
+        self._resp = resp
+        self.status = resp.status_code
+        self.headers = CaseInsensitiveDict(resp.headers)
+
+    async def iter_chunks(self, chunk_size: int) -> AsyncIterator[bytes]:
+        chunks = self._resp.iter_content(chunk_size=chunk_size)
+        while chunk := await asyncio.to_thread(next, chunks, b''):
+            yield chunk
+
+
+class RequestsTransport(Transport):
+    name = REQUESTS
+
+    def __init__(self, session_factory: Callable[[], requests.Session], default_timeout: float = 10) -> None:
+        """
+        :param session_factory: returns the shared session, see HttpClientManager.requests_session
+        """
+        self._session_factory = session_factory
+        self.default_timeout = default_timeout
+
+    def fetch_sync(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                   data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        resp = self._session_factory().request(method, url, headers=headers, data=data,
+                                               timeout=timeout or self.default_timeout)
+        return TransportResponse(url=resp.url, status=resp.status_code, headers=CaseInsensitiveDict(resp.headers),
+                                 content=resp.content, encoding=resp.encoding or resp.apparent_encoding)
+
+    async def fetch(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                    data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        return await asyncio.to_thread(self.fetch_sync, method, url, headers=headers, data=data, timeout=timeout)
+
+    @asynccontextmanager
+    async def stream(self, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None) -> AsyncIterator[TransportStream]:
+        resp = await asyncio.to_thread(self._session_factory().get, url, headers=headers,
+                                       timeout=timeout or self.default_timeout, stream=True)
+        try:
+            yield _RequestsStream(resp)
+        finally:
+            resp.close()
+
+
+class _BytesStream(TransportStream):
+    def __init__(self, response: TransportResponse) -> None:
+        self.status = response.status
+        self.headers = response.headers
+        self._content = response.content
+
+    async def iter_chunks(self, chunk_size: int) -> AsyncIterator[bytes]:
+        for start in range(0, len(self._content), chunk_size):
+            yield self._content[start:start + chunk_size]
+
+
+class RecordReplayTransport(Transport):
+    """
+    Store responses on disk(one json file per request) and play them back without network.
+
+    - record mode: `inner` does the real request, the response is saved.
+    - replay mode(`inner` is None): only saved responses are served. A request never recorded fails with
+      FatalHttpException, which is the same as a 404 for the retry engine.
+
+    The cassette folder can also be seeded from local html files, see save() and playground/benchmark.
+    """
+    name = REPLAY
+
+    def __init__(self, cassette_folder: str, inner: Optional[Transport] = None) -> None:
+        self.cassette_folder = cassette_folder
+        self.inner = inner
+        if inner is not None:
+            self.name = RECORD
+
+    def cassette_path(self, method: str, url: str, data: Any = None) -> str:
+        body = urlencode(sorted(data.items())) if isinstance(data, dict) else str(data or '')
+        key = hashlib.sha1(f'{method.upper()} {url} {body}'.encode('utf-8')).hexdigest()
+        host = urlsplit(url).hostname or 'unknown'
+        return os.path.join(self.cassette_folder, host, f'{key}.json')
+
+    def save(self, response: TransportResponse, method: str = 'GET', data: Any = None) -> None:
+        path = self.cassette_path(method, response.url, data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {
+            'method': method.upper(),
+            'url': response.url,
+            'status': response.status,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+            'body': base64.b64encode(response.content).decode('ascii'),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+
+    def load(self, method: str, url: str, data: Any = None) -> TransportResponse:
+        path = self.cassette_path(method, url, data)
+        if not os.path.exists(path):
+            raise FatalHttpException(f'{method.upper()} {url} is not recorded in {self.cassette_folder}.')
+        with open(path, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        return TransportResponse(url=record['url'], status=record['status'],
+                                 headers=CaseInsensitiveDict(record['headers']),
+                                 content=base64.b64decode(record['body']), encoding=record['encoding'])
+
+    async def fetch(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                    data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        if self.inner is None:
+            return self.load(method, url, data)
+        response = await self.inner.fetch(method, url, headers=headers, data=data, timeout=timeout)
+        # the key is the requested url, not the url after redirects
+        self.save(TransportResponse(url, response.status, response.headers, response.content, response.encoding),
+                  method, data)
+        return response
+
+    def fetch_sync(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                   data: Any = None, timeout: Optional[float] = None) -> TransportResponse:
+        if self.inner is None:
+            return self.load(method, url, data)
+        response = self.inner.fetch_sync(method, url, headers=headers, data=data, timeout=timeout)
+        self.save(TransportResponse(url, response.status, response.headers, response.content, response.encoding),
+                  method, data)
+        return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None) -> AsyncIterator[TransportStream]:
+        # responses are recorded as a whole
+        response = await self.fetch('GET', url, headers=headers, timeout=timeout)
+        yield _BytesStream(response)
@@ -41,4 +41,87 @@ CLEAN_ARTIFACTS = True
 # disable http requests proxy
 DISABLE_PROXY = True
 
+# 整个运行期间共享的HTTP连接池：所有主机的最大连接数。
+HTTP_POOL_SIZE = 64
+
+# 整个运行期间共享的HTTP连接池：单个主机的最大连接数。
+HTTP_POOL_SIZE_PER_HOST = 8
+
+# DNS 解析结果的缓存时间(秒)。
+HTTP_DNS_CACHE_TTL = 600
+
+# HTTP 传输层："AIOHTTP"(默认)、"REQUESTS"、"RECORD"(请求并录制响应)、"REPLAY"(只回放已录制的响应，不联网)。
+HTTP_TRANSPORT = 'AIOHTTP'
+
+# RECORD/REPLAY 模式下保存响应的文件夹。
+HTTP_CASSETTE_FOLDER = 'cassettes'
+
+# 是否把 HTML/JS 响应缓存到磁盘。崩溃后重跑、或改设置重新生成时大部分页面可直接从磁盘读取。
+# 遵循响应的 Cache-Control(no-store/private/no-cache/max-age)。书籍信息页、目录页和反混淆 js 每次都向服务器确认是否变化。
+HTTP_CACHE = True
+
+# 磁盘缓存的文件夹。
+HTTP_CACHE_FOLDER = 'http_cache'
+
+# 缓存的默认有效期(秒)，过期后用 ETag/Last-Modified 向服务器确认。各站点可在爬虫中覆盖(RESPONSE_CACHE_TTL)。
+HTTP_CACHE_TTL = 24 * 3600
+
+# 磁盘缓存的大小上限(字节)，超过后删除最久未使用的条目。
+HTTP_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# 爬取章节的并发数(linovelib)。每个并发使用一个浏览器实例，1 表示逐页爬取。
+CRAWL_CONCURRENCY = 1
+
+# chapter_crawl_delay/page_crawl_delay 的随机抖动比例，例如 0.3 表示实际延迟为设置值的 0.7~1.3 倍。
+# 延迟从上一次请求该站点算起，等待期间解析等工作照常进行(linovelib)。
+CRAWL_DELAY_JITTER = 0.3
+
+# 浏览器池：一个浏览器实例最多加载的页面数，超过后重建，避免浏览器内存持续增长。
+BROWSER_MAX_PAGES_PER_DRIVER = 200
+
+# 浏览器池：页面 JS 堆内存超过此值(字节)时重建浏览器实例。
+BROWSER_MAX_JS_HEAP = 512 * 1024 * 1024
+
+# 浏览器的持久化用户数据(profile)文件夹。设置后 cookie、缓存和通过的检测在多次运行之间保留，省去每次冷启动浏览器的时间。
+# None 表示每次使用临时 profile。
+BROWSER_PROFILE_FOLDER = None
+
+# 常驻浏览器的远程调试地址，例如 '127.0.0.1:9222'。设置后每次运行都连接到这个浏览器，本机地址上没有浏览器时会启动一个，
+# 运行结束后它继续运行供下次使用。None 表示每次运行启动新的浏览器。
+BROWSER_DEBUGGER_ADDRESS = None
+
+# 精简加载模式(linovelib)：浏览器不加载图片、字体、媒体和广告统计脚本，页面 DOMContentLoaded 后只等待标题和正文节点出现就读取。
+# 提取的文本不变，页面耗时和流量大幅减少。
+BROWSER_LEAN_MODE = True
+
+# 在浏览器中提取页面(linovelib)：执行脚本只返回标题、正文节点的 HTML 和 ReadParams，而不是整个页面源码，
+# 减少 WebDriver 传输的数据和 Python 端的解析。
+BROWSER_IN_PAGE_EXTRACTION = True
+
+# linovelib 反混淆规则的磁盘缓存文件，以 js 的哈希为键。
+RULES_CACHE_FILE = 'rules_cache/linovelib_mobile.json'
+
+# 反混淆规则缓存的有效期(秒)。过期后仍先使用缓存，同时在后台重新获取 js，规则变化时立即切换。
+RULES_CACHE_TTL = 6 * 3600
+
+# 浏览器通过"抱歉，章节内容不支持该浏览器显示"检测后，把它的 cookie 和 UA 交给 HTTP 客户端，之后的页面直接用 HTTP 请求，
+# 只有再次遇到检测页面时才回退到浏览器(linovelib)。
+BROWSER_COOKIE_HANDOFF = True
+
+# 连续多少次 HTTP 请求遇到检测页面后，放弃 cookie 交接，剩余页面全部用浏览器爬取。
+BROWSER_HANDOFF_MAX_FAILURES = 3
+
+# 图片下载(ASYNCIO)：同时下载的图片数上限。
+IMAGE_DOWNLOAD_WORKERS = 16
+
+# 图片下载(ASYNCIO)：单个主机同时下载的图片数上限。
+IMAGE_DOWNLOAD_PER_HOST = 4
+
+# 图片下载时流式写入磁盘的分块大小(字节)。
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 图片有多个镜像主机时，当前主机超过这个时间(秒)仍未响应，就同时向下一个镜像发起请求，先响应者胜出。
+# 实际等待时间会根据各镜像的历史延迟自动缩短。
+IMAGE_MIRROR_HEDGE_DELAY = 1.5
+
 # ----------------------------------------------
\ No newline at end of file
@@ -1,26 +1,30 @@
 import asyncio
+import functools
+import hashlib
 import os
 import pickle
-import re
+import threading
 import time
 from abc import ABC, abstractmethod
-from multiprocessing import Pool
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Iterable, Optional, Callable, Awaitable, Union, Dict, Any, List
+from urllib.parse import urlsplit
 
 import aiofiles
-import aiohttp as aiohttp
-import requests
-from aiohttp import ClientSession
-from bs4 import BeautifulSoup
-from requests.exceptions import ProxyError
 
-from ..exceptions import LinovelibException
+from .html_processing import rewrite_images_in_html
+from .. import settings
+from ..exceptions import LinovelibException, RetryableHttpException, ThrottledException
 from ..logger import Logger
 from ..models import LightNovel, LightNovelImage, LightNovelVolume, LightNovelChapter, CatalogMasiroVolume, \
     CatalogBaseVolume
+from ..network import (DownloadScheduler, HttpClientManager, ImagePriority, RateLimitPolicy, RetryBudget,
+                       error_for_status, is_throttled_response, race)
 from ..utils import (check_image_integrity, create_folder_if_not_exists,
-                     is_async, is_valid_image_url)
+                     is_async, is_valid_image_url, parse_content_range_total, sha256_of_file,
+                     transcode_image_to_jpeg, transcoded_image_path)
 
 # IMAGE_DOWNLOAD_STRATEGY
 MULTIPROCESSING = 'MULTIPROCESSING'
@@ -29,17 +33,33 @@ ASYNCIO = 'ASYNCIO'
 
 
 class BaseNovelWebsiteSpider(ABC):
-
-    def __init__(self, spider_settings: Dict[str, Any]) -> None:
+    # start values and bounds of the adaptive rate limiter of the target site. Subclass can override it.
+    RATE_LIMIT_POLICY = RateLimitPolicy()
+    # seconds a cached page of the target site is served without asking the site, None means `http_cache_ttl`.
+    RESPONSE_CACHE_TTL: Optional[float] = None
+    # hosts serving the same images under the same paths, raced by _download_image(). Subclass can override it.
+    IMAGE_MIRROR_HOSTS: tuple = ()
+
+    def __init__(self, spider_settings: Dict[str, Any], http_client: Optional[HttpClientManager] = None) -> None:
         self.spider_settings = spider_settings
         self.logger = Logger(logger_name=type(self).__name__,
                              logger_level=self.spider_settings["log_level"],
                              log_filename=self.spider_settings["log_filename"]).get_logger()
 
+        # normally the client is owned by Linovelib2Epub and shared by all phases of a run.
+        self.http_client = http_client or HttpClientManager(client_settings=self.spider_settings)
+
         # in base class, http session is bare
-        self.session = requests.session()
+        self.session = self.http_client.requests_session
 
-        self.FETCH_CHAPTER_CONCURRENCY_LEVEL = 2
+        # the concurrency of page fetching is adapted by the limiter of the target host, see download_pages()
+        site_host = urlsplit(self.spider_settings['base_url']).hostname
+        if site_host:
+            self.http_client.rate_limiters.configure(site_host, self.RATE_LIMIT_POLICY)
+            if self.http_client.response_cache is not None and self.RESPONSE_CACHE_TTL is not None:
+                self.http_client.response_cache.configure(site_host, self.RESPONSE_CACHE_TTL)
+        if self.IMAGE_MIRROR_HOSTS:
+            self.http_client.mirrors.add_group(self.IMAGE_MIRROR_HOSTS)
 
     @abstractmethod
     def fetch(self) -> LightNovel:
@@ -52,30 +72,71 @@ class BaseNovelWebsiteSpider(ABC):
         """
         return {}
 
-    def download_images_by_multiprocessing(self, light_novel_images: List[LightNovelImage]) -> None:
+    async def download_images_by_multiprocessing(self, light_novel_images: List[LightNovelImage]) -> None:
+        """
+        Network I/O stays in asyncio(same scheduler as ASYNCIO), while a process pool decodes, validates and re-encodes
+        every downloaded image to JPEG in the meantime. EpubWriter then embeds the pre-transcoded files directly.
+        """
+        self.logger.info(f'len of light_novel_images = {len(light_novel_images)}')
+
+        images_folder = self.spider_settings['image_download_folder']
+        loop = asyncio.get_running_loop()
+        transcode_futures: List[asyncio.Future] = []
+
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 4) as process_pool:
+            def _transcode(image: LightNovelImage) -> None:
+                image_path = f'{images_folder}/{image.local_relative_path}'
+                output_path = transcoded_image_path(images_folder, image.local_relative_path)
+                if os.path.exists(image_path) and not os.path.exists(output_path):
+                    future = loop.run_in_executor(process_pool, transcode_image_to_jpeg, image_path, output_path)
+                    transcode_futures.append(future)
 
+            await self.download_images_by_asyncio(light_novel_images, on_downloaded=_transcode)
+
+            results = await asyncio.gather(*transcode_futures, return_exceptions=True)
+
+        failed_count = sum(1 for result in results if result is not True)
+        self.logger.info(f'Transcoded {len(results) - failed_count} images to JPEG, {failed_count} failed.')
+
+    def download_images_by_multithreading(self, light_novel_images: List[LightNovelImage]) -> None:
+        """
+        A fallback of ASYNCIO for environments where aiohttp doesn't work well(e.g. SSL issues, see
+        playground/issue-aiohttp-certificate-error). Blocking requests over the shared pooled requests session.
+        """
         self.logger.info(f'len of light_novel_images = {len(light_novel_images)}')
 
-        download_url_to_image: Dict[str, LightNovelImage] = {
-            image.download_url: image for image in light_novel_images
-        }
-        params = [(image.download_url, image.local_relative_path) for image in light_novel_images]
+        workers = self.spider_settings.get('image_download_workers', settings.IMAGE_DOWNLOAD_WORKERS)
+        per_host = self.spider_settings.get('image_download_per_host', settings.IMAGE_DOWNLOAD_PER_HOST)
+        host_semaphores: Dict[str, threading.BoundedSemaphore] = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        job = self.http_client.retry_engine.job('images', budget=RetryBudget())
 
-        with Pool(processes=os.cpu_count() or 4) as process_pool:
-            error_links = process_pool.starmap(self._download_image_legacy, params)
+        def _attempt(image: LightNovelImage) -> str | None:
+            # the slot of the host is held by one attempt, not through the backoff before the next one
+            with host_semaphores[urlsplit(image.download_url).hostname or '']:
+                return self._download_image_by_requests(image.download_url, image.local_relative_path)
 
-            while sorted_error_links := list(filter(None, error_links)):
-                self.logger.info('Some errors occurred when download images. Retry those links that failed to request.')
-                self.logger.info(f'Retry image links: {sorted_error_links}')
-                params = [(url, download_url_to_image[url].local_relative_path) for url in sorted_error_links]
-                error_links = process_pool.starmap(self._download_image_legacy, params)
+        def _download(image: LightNovelImage) -> None:
+            job.run_sync(image.download_url, functools.partial(_attempt, image))
 
-    def _download_image_legacy(self, download_url: str, local_relative_path: str) -> Optional[str]:
+        # the pool takes tasks in submission order: covers first, then the illustrations in reading order.
+        # create all the semaphores before the threads start.
+        images = sorted(light_novel_images, key=self._image_priority)
+        for image in images:
+            _ = host_semaphores[urlsplit(image.download_url).hostname or '']
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-download') as executor:
+            futures = [executor.submit(_download, image) for image in images]
+            # exceptions are recorded by the job
+            wait(futures)
+
+        # a missing image is not fatal: the epub is still generated without it.
+        job.report()
+
+    def _download_image_by_requests(self, download_url: str, local_relative_path: str) -> str | None:
         """
-        If a image url download failed, return its url(for retry). else return None.
+        Blocking version of _download_image(): stream into `<save_path>.part`, resume with Range, rename when complete.
 
-        :param download_url: single url string
-        :return: original url if failed, or None if succeeded.
+        :return: sha256 hex digest of the image, or None if it's skipped.
         """
         if not is_valid_image_url(download_url):
             return None
@@ -85,78 +146,114 @@ class BaseNovelWebsiteSpider(ABC):
 
         filename_path = Path(save_path)
         if filename_path.exists():
+            self.logger.info(f"The image to download is already downloaded at {filename_path}.skip.")
             return None
 
-        # url is valid and never downloaded
-        try:
-            resp = self.session.get(download_url, headers=self.request_headers(),
-                                    timeout=self.spider_settings['http_timeout'], verify=False)
-
-            expected_length = resp.headers and resp.headers.get('Content-Length')
-            actual_length = resp.raw.tell()
-            check_image_integrity(expected_length, actual_length)
-        except (Exception, ProxyError,) as e:
-            # SAD PATH
-            return download_url
-        else:
-            try:
-                with open(save_path, "wb") as f:
-                    f.write(resp.content)
-                # HAPPY PATH
+        # the same image may be queued twice, e.g. by the illustration chapter of linovelib. One download is enough.
+        return self.http_client.single_flight.do_sync(f'IMAGE {save_path}',
+                                                      functools.partial(self._stream_image_by_requests,
+                                                                        download_url, save_path),
+                                                      resource=download_url)
+
+    def _stream_image_by_requests(self, download_url: str, save_path: str) -> str | None:
+        part_path = f'{save_path}.part'
+        headers = dict(self.request_headers())
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+
+        with self.session.get(download_url, headers=headers, timeout=self.spider_settings['http_timeout'],
+                              verify=False, stream=True) as resp:
+            if resp.status_code == 416:
+                # the .part file doesn't match the remote image any more, start over
+                os.remove(part_path)
+                raise RetryableHttpException(f'image {download_url} range {offset}- is not satisfiable.')
+            elif resp.status_code == 404:
+                self.logger.error(f'image {download_url} 404 => skip it.')
                 return None
-            except (Exception,):
-                # SAD PATH
-                return download_url
-
-    async def download_images_by_asyncio(self, light_novel_images: List[LightNovelImage]) -> None:
+            elif resp.status_code >= 400:
+                # 5xx, 429 etc. will be retried, other status codes are fatal.
+                raise error_for_status(resp.status_code, download_url)
+
+            if resp.status_code == 206:
+                self.logger.debug(f'image {download_url} resumes from {offset} bytes.')
+                expected_length = parse_content_range_total(resp.headers.get('Content-Range'))
+                sha256 = sha256_of_file(part_path)
+                mode = 'ab'
+            else:
+                # 200: no .part file, or the server ignores Range
+                expected_length = resp.headers.get('Content-Length')
+                sha256 = hashlib.sha256()
+                offset = 0
+                mode = 'wb'
+
+            actual_length = offset
+            with open(part_path, mode) as fp:
+                for chunk in resp.iter_content(chunk_size=settings.IMAGE_DOWNLOAD_CHUNK_SIZE):
+                    sha256.update(chunk)
+                    fp.write(chunk)
+                    actual_length += len(chunk)
+
+        # check image integrity here, if get partial, MUST raise error. The .part file is kept for resuming.
+        self.logger.debug(f'check_image_integrity: expected_get:{expected_length} vs actual_get: {actual_length}')
+        check_image_integrity(expected_length, actual_length)
+
+        os.replace(part_path, save_path)
+        digest = sha256.hexdigest()
+        self.logger.info(f'image url {download_url} => local relative path {save_path} ok. sha256: {digest}')
+        return digest
+
+    async def download_images_by_asyncio(self,
+                                         light_novel_images: List[LightNovelImage],
+                                         on_downloaded: Optional[Callable[[LightNovelImage], None]] = None) -> None:
+        """
+        :param on_downloaded: called in the event loop after an image is downloaded(or found on disk), must not block.
+        """
         self.logger.info(f'len of light_novel_images= {len(light_novel_images)}')
 
-        download_url_to_image: Dict[str, LightNovelImage] = {
-            image.download_url: image for image in light_novel_images
-        }
+        # shared pool: connections to image hosts may be already warmed during the text crawl
+        job = self.http_client.retry_engine.job('images', budget=RetryBudget())
+
+        async def _download(image: LightNovelImage) -> None:
+            await job.run(image.download_url, functools.partial(self._download_image,
+                                                                image.download_url,
+                                                                image.local_relative_path))
+            if on_downloaded:
+                on_downloaded(image)
+
+        scheduler: DownloadScheduler[LightNovelImage] = DownloadScheduler(
+            _download,
+            workers=self.spider_settings.get('image_download_workers', settings.IMAGE_DOWNLOAD_WORKERS),
+            per_host=self.spider_settings.get('image_download_per_host', settings.IMAGE_DOWNLOAD_PER_HOST),
+            logger=self.logger)
+        # covers first, then the illustrations in reading order
+        for image in light_novel_images:
+            scheduler.add(image.download_url, image, self._image_priority(image))
+        await scheduler.run()
+
+        # a missing image is not fatal: the epub is still generated without it.
+        job.report()
+
+    @staticmethod
+    def _image_priority(image: LightNovelImage) -> ImagePriority:
+        if image.is_book_cover:
+            return ImagePriority.BOOK_COVER
+        if image.is_volume_cover:
+            return ImagePriority.VOLUME_COVER
+        return ImagePriority.CONTENT
+
+    async def _download_image(self, download_url: str, local_relative_path: str) -> str | None:
+        """
+        Stream the image into `<save_path>.part` and rename it into place when it's complete, so an existing image file
+        is always a whole one. An interrupted download keeps its .part file and resumes with a Range request.
 
-        # see issue https://github.com/lightnovel-center/linovelib2epub/issues/34
-        tcp_connector = aiohttp.TCPConnector(ssl=False)
-        async with aiohttp.ClientSession(connector=tcp_connector) as session:
-            tasks = {asyncio.create_task(self._download_image(session,
-                                                              image.download_url,
-                                                              image.local_relative_path),
-                                         name=image.download_url)
-                     for image in light_novel_images}
-            pending: set = tasks
-            succeed_count = 0
-
-            while pending:
-                done, pending = await asyncio.wait(pending, return_when=asyncio.ALL_COMPLETED)
-                # Note: This does not raise TimeoutError! Futures that aren't done when the timeout occurs
-                # are returned in the second set
-
-                # 1. succeed => normal result in done(# HAPPY CASE)
-                # 2. Timeout => No TimeoutError, put timeout tasks in pending(SAD CASE(need retry))
-                # 3  Other Exception before timeout => (SAD CASE(need retry)
-
-                for done_task in done:
-                    exception = done_task.exception()
-                    task_url = done_task.get_name()
-
-                    if exception is None:
-                        # result = done_task.result()
-                        succeed_count += 1
-                    else:
-                        # [TEST]make connect=.1 to reach this branch, should retry all the urls that entered this case
-                        self.logger.error(
-                            f'Exception: {exception.__class__.__name__} | FAIL: {task_url}; should retry.')
-                        pending.add(asyncio.create_task(
-                            self._download_image(session, task_url,
-                                                 download_url_to_image[task_url].local_relative_path),
-                            name=task_url))
-
-                self.logger.info(f'SUCCEED_COUNT: {succeed_count}')
-                self.logger.info(f'[NEXT TURN]Pending task count: {len(pending)}')
-
-    async def _download_image(self, session: ClientSession, download_url: str, local_relative_path: str) -> None:
+        If the image host has mirrors(IMAGE_MIRROR_HOSTS), they are raced: the fastest known mirror goes first, the
+        next one joins when it's slow or fails, the first to answer writes the file.
+
+        :return: sha256 hex digest of the image, or None if it's skipped.
+        """
         if not is_valid_image_url(download_url):
-            return
+            return None
 
         save_path = f"{self.spider_settings['image_download_folder']}/{local_relative_path}"
         create_folder_if_not_exists(os.path.dirname(save_path))
@@ -164,26 +261,80 @@ class BaseNovelWebsiteSpider(ABC):
         filename_path = Path(save_path)
         if filename_path.exists():
             self.logger.info(f"The image to download is already downloaded at {filename_path}.skip.")
-            return
-
-        timeout = aiohttp.ClientTimeout(total=30, connect=15)  # per request timeout
-        async with session.get(download_url, headers=self.request_headers(), timeout=timeout) as resp:
-            if resp.status < 400:
-                image = await resp.read()
-
-                # check image integrity here, if get partial, MUST raise error
-                expected_get = resp.headers.get('Content-Length')
-                actual_get = len(image)
-                self.logger.debug(f'check_image_integrity: expected_get:{expected_get} vs actual_get: {actual_get}')
-                check_image_integrity(expected_get, actual_get)
-
-                # write file, maybe raise IO error
-                async with aiofiles.open(save_path, mode='wb') as afp:
-                    await afp.write(image)
-                    self.logger.info(f'image url {download_url} => local relative path {save_path} ok.')
+            return None
+
+        async def _download() -> str | None:
+            mirrors = self.http_client.mirrors
+            candidates = mirrors.candidates(download_url)
+            hedge_delay = mirrors.hedge_delay(candidates[0], settings.IMAGE_MIRROR_HEDGE_DELAY)
+            digest = await race(candidates,
+                                functools.partial(self._stream_image, save_path=save_path),
+                                hedge_delay=hedge_delay,
+                                tracker=mirrors)
+            if digest is None:
+                self.logger.error(f'image {download_url} 404 => skip it.')
+            return digest
+
+        # the same image may be queued twice, e.g. by the illustration chapter of linovelib. One download is enough.
+        return await self.http_client.single_flight.do(f'IMAGE {save_path}', _download, resource=download_url)
+
+    async def _stream_image(self, download_url: str, claim: Callable[[], bool], save_path: str) -> str | None:
+        """
+        One attempt of _download_image() on one mirror.
+
+        :param claim: see network.hedging.race(). Nothing is written to disk before it returns True.
+        :return: sha256 hex digest, or None if 404 or another mirror won.
+        """
+        part_path = f'{save_path}.part'
+        headers = dict(self.request_headers())
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+
+        # per request timeout
+        async with self.http_client.transport.stream(download_url, headers=headers, timeout=30) as resp:
+            if resp.status == 404:
+                return None
+            elif resp.status >= 400 and resp.status != 416:
+                # 5xx, 429 etc. will be retried, other status codes are fatal.
+                raise error_for_status(resp.status, download_url)
+
+            if not claim():
+                return None
+
+            if resp.status == 416:
+                # the .part file doesn't match the remote image any more, start over
+                os.remove(part_path)
+                raise RetryableHttpException(f'image {download_url} range {offset}- is not satisfiable.')
+
+            if resp.status == 206:
+                self.logger.debug(f'image {download_url} resumes from {offset} bytes.')
+                expected_length = parse_content_range_total(resp.headers.get('Content-Range'))
+                sha256 = sha256_of_file(part_path)
+                mode = 'ab'
             else:
-                # maybe 404 etc. Now ignore it, don't raise error to avoid retry dead loop
-                pass
+                # 200: no .part file, or the server ignores Range
+                expected_length = resp.headers.get('Content-Length')
+                sha256 = hashlib.sha256()
+                offset = 0
+                mode = 'wb'
+
+            # the checksum is computed on the fly, the file is never read back
+            actual_length = offset
+            async with aiofiles.open(part_path, mode=mode) as afp:
+                async for chunk in resp.iter_chunks(settings.IMAGE_DOWNLOAD_CHUNK_SIZE):
+                    sha256.update(chunk)
+                    await afp.write(chunk)
+                    actual_length += len(chunk)
+
+        # check image integrity here, if get partial, MUST raise error. The .part file is kept for resuming.
+        self.logger.debug(f'check_image_integrity: expected_get:{expected_length} vs actual_get: {actual_length}')
+        check_image_integrity(expected_length, actual_length)
+
+        os.replace(part_path, save_path)
+        digest = sha256.hexdigest()
+        self.logger.info(f'image url {download_url} => local relative path {save_path} ok. sha256: {digest}')
+        return digest
 
     def post_fetch(self, novel: LightNovel) -> None:
         self._save_novel_pickle(novel)
@@ -197,6 +348,7 @@ class BaseNovelWebsiteSpider(ABC):
 
         strategy_to_method = {
             MULTIPROCESSING: self.download_images_by_multiprocessing,
+            MULTITHREADING: self.download_images_by_multithreading,
             ASYNCIO: self.download_images_by_asyncio,
             # add more
         }
@@ -207,15 +359,19 @@ class BaseNovelWebsiteSpider(ABC):
         self.logger.info(f"Image download strategy: {self.spider_settings['image_download_strategy']}")
 
         if self.spider_settings['has_illustration']:
-            image_list: List[LightNovelImage] = novel.get_illustrations()
-            image_list.append(novel.book_cover)
+            for volume in novel.volumes:
+                volume_cover = volume.volume_cover
+                if volume_cover:
+                    volume_cover.is_volume_cover = True
+            image_list: List[LightNovelImage] = [novel.book_cover]
+            image_list.extend(novel.get_illustrations())
         else:
             image_list: List[LightNovelImage] = [novel.book_cover]
 
         self.logger.info(f"len of image list: {len(image_list)}")
 
         if is_async(_download_image):
-            asyncio.run(_download_image(image_list))
+            self.http_client.run(_download_image(image_list))
         else:
             _download_image(image_list)
 
@@ -229,75 +385,57 @@ class BaseNovelWebsiteSpider(ABC):
 
         self.logger.info(f'page url set = {len(page_url_set)}')
 
-        url_to_page = {url: 'NOT_DOWNLOAD_READY' for url in page_url_set}
-
-        # use semaphore to control concurrency
-        max_concurrency = self.FETCH_CHAPTER_CONCURRENCY_LEVEL
-        semaphore = asyncio.Semaphore(max_concurrency)
-
-        self.logger.info(f'DOWNLOAD_PAGES concurrency level: {max_concurrency}.')
-
-        async with session:
-            tasks = {asyncio.create_task(self._download_page(session, semaphore, url), name=url) for url in
-                     page_url_set}
-            pending: set = tasks
-            succeed_count = 0
-
-            while pending:
-                done, pending = await asyncio.wait(pending, return_when=asyncio.ALL_COMPLETED)
-                # Note: This does not raise TimeoutError! Futures that aren't done when the timeout occurs
-                # are returned in the second set
-
-                # 1. succeed => normal result in done(# HAPPY CASE)
-                # 2. Timeout => No TimeoutError, put timeout tasks in pending(SAD CASE(need retry))
-                # 3  Other Exception before timeout => (SAD CASE(need retry)
-
-                for done_task in done:
-                    exception = done_task.exception()
-                    task_url = done_task.get_name()
-
-                    if exception is None:
-                        url_to_page[task_url] = done_task.result()
-                        succeed_count += 1
-                    else:
-                        # [TEST]make connect=.1 to reach this branch, should retry all the urls that entered this case
-                        self.logger.error(
-                            f'Exception: {exception.__class__.__name__} | FAIL: {task_url}; should retry.')
-                        pending.add(
-                            asyncio.create_task(self._download_page(session, semaphore, task_url), name=task_url))
-
-                self.logger.info(f'SUCCEED_COUNT: {succeed_count}')
-                self.logger.info(f'[NEXT TURN]Pending task count: {len(pending)}')
-
-        # ASSERTION: make sure data is ok.
-        for page_content in url_to_page.values():
-            if page_content == "NOT_DOWNLOAD_READY":
-                raise LinovelibException(
-                    ' 如果这个断言被触发，那么证明代码逻辑有问题。青春猪头少年不会梦到奇奇怪怪的 BUG。')
-
-        return url_to_page
-
-    async def _download_page(self, session, semaphore, url) -> str | None:
-        async with semaphore:
-            timeout = aiohttp.ClientTimeout(total=30, connect=15)  # per request timeout
-            async with session.get(url, headers=self.request_headers(), timeout=timeout) as resp:
-                if resp.status == 200:
-                    self.logger.info(f'page {url} 200 => ok.')
-                    return await resp.text()
-                elif resp.status == 404:
-                    # maybe 404 etc. Now ignore it, don't raise error to avoid retry dead loop
-                    # 404 is considered as success => don't retry
-                    self.logger.error(f'page {url} 404 => skip it.')
-                    pass
-                else:
-                    # 429 too many requests => should retry
-                    if resp.status == 429:
-                        # 更好的做法：y=2^x 指数退化规避，目前的线性常数 C 退化效果很差
-                        await asyncio.sleep(1)
-                    # 503 Service Unavailable => should retry
-                    # ...... => should retry
-                    self.logger.error(f'page {url} {resp.status} => should retry.')
-                    raise LinovelibException(f'fetch page url {url} failed with error status {resp.status}.')
+        # concurrency is controlled by the adaptive limiter of each host(see RATE_LIMIT_POLICY), not a fixed level.
+        # the session is shared by the whole run, don't close it here.
+        urls = list(page_url_set)
+        job = self.http_client.retry_engine.job('pages', budget=RetryBudget())
+        results = await asyncio.gather(*(job.run(url, functools.partial(self._download_page, session, url))
+                                         for url in urls),
+                                       return_exceptions=True)
+
+        self.http_client.rate_limiters.log_snapshot()
+        job.report()
+
+        if job.failures:
+            raise LinovelibException(f'{len(job.failures)} of {len(urls)} pages failed to download, '
+                                     f'see [RetryReport] in log.')
+
+        return dict(zip(urls, results))
+
+    async def _download_page(self, session: Any, url: str) -> str | None:
+        """
+        :param session: not used here, requests go through the transport of http_client. Subclasses driving a
+          browser(e.g. masiro) get their browser page from it.
+        """
+        limiter = self.http_client.rate_limiters.for_url(url)
+        await limiter.acquire()
+
+        status: Optional[int] = None
+        text: Optional[str] = None
+        retry_after: Optional[str] = None
+        try:
+            # per request timeout
+            resp = await self.http_client.transport.fetch('GET', url, headers=self.request_headers(), timeout=30)
+            status = resp.status
+            retry_after = resp.headers.get('Retry-After')
+            if resp.status == 200:
+                text = resp.text
+
+            if resp.status == 200 and not is_throttled_response(resp.status, text):
+                self.logger.info(f'page {url} 200 => ok.')
+                return text
+            elif resp.status == 404:
+                # 404 is considered as success => don't retry
+                self.logger.error(f'page {url} 404 => skip it.')
+                return None
+            elif resp.status == 200:
+                # throttle page => limiter backs off, retry
+                raise ThrottledException(f'page {url} is a throttle page.')
+            else:
+                # 429 too many requests / 503 Service Unavailable => retry; 403 etc. => fatal
+                raise error_for_status(resp.status, url)
+        finally:
+            limiter.release(status, text, retry_after)
 
     async def fetch_chapters(self, session: Any, catalog_list: List[CatalogBaseVolume], book):
         """
@@ -337,7 +475,6 @@ class BaseNovelWebsiteSpider(ABC):
 
                 linovel_chapter = LightNovelChapter(chapter_id=chapter_id)
                 linovel_chapter.title = chapter_title
-                chapter_illustrations: List[LightNovelImage] = []
 
                 self.logger.info(f'chapter : {chapter_title}')
 
@@ -345,36 +482,28 @@ class BaseNovelWebsiteSpider(ABC):
                 chapter_body = url_to_page[chapter_url]
 
                 # one page per chapter
-                images_soup = BeautifulSoup(chapter_body, 'lxml').find_all('img')
-                for _, image in enumerate(images_soup):
-                    # Images src analysis:
-                    # https://i.ibb.co/1fRfdhs/6f9fbd2762d0f7039cfafb8d0bfa513d2797c5a0.jpg
-                    # https://masiro.moe/data/attachment/forum/202103/07/173827oqkmqhcbylyytty9.jpg => 526 status code
-                    # https://www.masiro.me/images/encode/fy-221114012533-99Qz.jpg
-
-                    # 可能为站内链接，也可能是站外链接。因为 url 没有固定格式
-                    # 这里我们需要自定义一个中间的文件夹名称，用于分割不同的爬虫实例。
-                    # 为了让文件夹名称更加可读和具有语义，这里使用 bookid-volumeid 作为隔离。
-
-                    # 举例，例如 bookid 为 875，volume_id 取本地自增 id(例如 3)，那么 875-3 就是结果。
-                    # 最后，将这个分隔符和图片原来的文件名拼接，得到 875-3/fy-221114012533-99Qz.jpg 这样格式的链接。
-                    # 更加具体地，为 XXXX/masiro.me/875-3/fy-221114012533-99Qz.jpg
-
-                    remote_src = image.get("src")
-                    src_value = re.search('(?<= src=").*?(?=")', str(image))
-
-                    light_novel_image = LightNovelImage(related_page_url=chapter_url,
-                                                        remote_src=remote_src,
-                                                        chapter_id=chapter_id,
-                                                        volume_id=volume_id,
-                                                        book_id=self.spider_settings['book_id'])
-
-                    image_local_src = f'{self.spider_settings["image_download_folder"]}/{light_novel_image.local_relative_path}'
-                    new_image = str(image).replace(str(src_value.group()), image_local_src)
-                    chapter_body = chapter_body.replace(str(image), new_image)
-                    chapter_illustrations.append(light_novel_image)
-
-                    self.logger.info(f'Processing page... {chapter_url}')
+                # Images src analysis:
+                # https://i.ibb.co/1fRfdhs/6f9fbd2762d0f7039cfafb8d0bfa513d2797c5a0.jpg
+                # https://masiro.moe/data/attachment/forum/202103/07/173827oqkmqhcbylyytty9.jpg => 526 status code
+                # https://www.masiro.me/images/encode/fy-221114012533-99Qz.jpg
+
+                # 可能为站内链接，也可能是站外链接。因为 url 没有固定格式
+                # 这里我们需要自定义一个中间的文件夹名称，用于分割不同的爬虫实例。
+                # 为了让文件夹名称更加可读和具有语义，这里使用 bookid-volumeid 作为隔离。
+
+                # 举例，例如 bookid 为 875，volume_id 取本地自增 id(例如 3)，那么 875-3 就是结果。
+                # 最后，将这个分隔符和图片原来的文件名拼接，得到 875-3/fy-221114012533-99Qz.jpg 这样格式的链接。
+                # 更加具体地，为 XXXX/masiro.me/875-3/fy-221114012533-99Qz.jpg
+                chapter_body, chapter_illustrations = rewrite_images_in_html(
+                    chapter_body, self.spider_settings["image_download_folder"],
+                    lambda remote_src: LightNovelImage(related_page_url=chapter_url,
+                                                       remote_src=remote_src,
+                                                       chapter_id=chapter_id,
+                                                       volume_id=volume_id,
+                                                       book_id=self.spider_settings['book_id']))
+                for light_novel_image in chapter_illustrations:
+                    self.http_client.remember_host(light_novel_image.download_url)
+                self.logger.info(f'Processing page... {chapter_url}')
 
                 linovel_chapter.content = chapter_body
                 linovel_chapter.illustrations = chapter_illustrations
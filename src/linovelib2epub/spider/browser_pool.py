@@ -0,0 +1,230 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from logging import Logger as LoggerAlias
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from .. import settings
+from ..network import RateLimiterRegistry
+
+# (future, fn, args)
+_Task = Tuple['Future[Any]', Callable[..., Any], Tuple[Any, ...]]
+
+
+class _Slot:
+    """
+    The driver owned by one worker thread.
+    """
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.driver: Optional[WebDriver] = None
+        self.pages = 0
+
+
+class BrowserDriverPool:
+    """
+    N worker threads, each one owns a browser driver. Tasks go to one shared queue and the first idle worker takes
+    the next one, so a slow page never holds back the others.
+
+    - drivers are created lazily. Only the first one does the full warm-up(get + refresh), the others reuse its
+      cookies. A `persistent` driver(persistent profile or attached browser) still has the cookies of former runs, so
+      it skips the refresh until a driver is discarded.
+    - the warm-up navigations go through the limiter of the host(`rate_limiters`) with `crawl_delay`, like any page.
+    - a driver is recycled(quit, then created again on demand) after `max_pages` pages, when its js heap grows over
+      `max_js_heap`, or when the task calls discard() e.g. after it got a throttle page.
+
+    Usage::
+
+        pool = BrowserDriverPool(4, create_driver, warm_up_url='https://www.bilinovel.com/')   # create_driver(index)
+        future = pool.submit(fetch, url)   # in fetch(), pool.driver() is the driver of the current worker
+        ...
+        pool.close()
+    """
+
+    # check the js heap every n pages, it's a round trip to the browser
+    _HEAP_CHECK_INTERVAL = 20
+
+    def __init__(self,
+                 size: int,
+                 create_driver: Callable[[int], WebDriver],
+                 warm_up_url: str,
+                 max_pages: int = settings.BROWSER_MAX_PAGES_PER_DRIVER,
+                 max_js_heap: int = settings.BROWSER_MAX_JS_HEAP,
+                 persistent: bool = False,
+                 rate_limiters: Optional[RateLimiterRegistry] = None,
+                 crawl_delay: float = 0.0,
+                 logger: Optional[LoggerAlias] = None) -> None:
+        self.size = max(1, size)
+        self._create_driver = create_driver
+        self.warm_up_url = warm_up_url
+        self.max_pages = max_pages
+        self.max_js_heap = max_js_heap
+        self.persistent = persistent
+        self.rate_limiters = rate_limiters
+        self.crawl_delay = crawl_delay
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._queue: 'queue.Queue[Optional[_Task]]' = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._slots: Dict[int, _Slot] = {}
+
+        # cookies of the first warmed-up driver, see _new_driver()
+        self._warm_up_lock = threading.Lock()
+        self._warm_cookies: Optional[List[Dict[str, Any]]] = None
+
+        self.created = 0
+        self.recycled = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> 'Future[Any]':
+        """
+        Run fn(*args) in a worker thread.
+        """
+        future: 'Future[Any]' = Future()
+        with self._lock:
+            if not self._workers:
+                self._start_workers()
+        self._queue.put((future, fn, args))
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        asyncio version of submit(): the event loop(e.g. image downloads) keeps running while the browser works.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _start_workers(self) -> None:
+        for i in range(self.size):
+            worker = threading.Thread(target=self._work, args=(i,), name=f'browser-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self, index: int) -> None:
+        slot = _Slot(index)
+        with self._lock:
+            self._slots[threading.get_ident()] = slot
+        try:
+            while (task := self._queue.get()) is not None:
+                future, fn, args = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            self._quit(slot)
+
+    def driver(self) -> WebDriver:
+        """
+        The driver of the current worker, must be called inside a task. Every call counts as one page.
+        """
+        slot = self._slots[threading.get_ident()]
+        if slot.driver is not None and self._worn_out(slot):
+            self._recycle(slot)
+        if slot.driver is None:
+            slot.driver = self._new_driver(slot.index)
+            slot.pages = 0
+        slot.pages += 1
+        return slot.driver
+
+    def discard(self, reason: str = '') -> None:
+        """
+        Drop the driver of the current worker, the next driver() call gets a fresh one.
+        """
+        slot = self._slots[threading.get_ident()]
+        with self._warm_up_lock:
+            if self.persistent:
+                # the state kept from former runs didn't pass, warm up from scratch from now on
+                self.persistent = False
+                self._warm_cookies = None
+        if slot.driver is not None:
+            if self.logger:
+                self.logger.info(f'[BrowserDriverPool] recycle the driver of {threading.current_thread().name}: '
+                                 f'{reason}')
+            self._recycle(slot)
+
+    def _worn_out(self, slot: _Slot) -> bool:
+        if slot.pages >= self.max_pages:
+            if self.logger:
+                self.logger.info(f'[BrowserDriverPool] recycle a driver after {slot.pages} pages.')
+            return True
+        if slot.pages % self._HEAP_CHECK_INTERVAL:
+            return False
+        try:
+            heap = slot.driver.execute_script('return performance.memory && performance.memory.usedJSHeapSize')
+        except (Exception,):
+            return False
+        if heap and heap > self.max_js_heap:
+            if self.logger:
+                self.logger.info(f'[BrowserDriverPool] recycle a driver using {heap // (1024 * 1024)}MB js heap.')
+            return True
+        return False
+
+    def _new_driver(self, index: int) -> WebDriver:
+        driver = self._create_driver(index)
+        self._navigate(driver.get, self.warm_up_url)
+        with self._warm_up_lock:
+            cookies = self._warm_cookies
+            if cookies is None:
+                # 第一次 get 无法得到正常结果，刷新一次。之后的 driver 直接复用它的 cookie。
+                if not self.persistent:
+                    self._navigate(driver.refresh)
+                self._warm_cookies = driver.get_cookies()
+                cookies = []
+        for cookie in cookies:
+            try:
+                driver.add_cookie(cookie)
+            except (Exception,):
+                # e.g. a cookie of another domain
+                pass
+        with self._lock:
+            self.created += 1
+        if self.logger:
+            self.logger.info(f'[BrowserDriverPool] driver of {threading.current_thread().name} is ready.')
+        return driver
+
+    def _navigate(self, navigate: Callable[..., None], *args: Any) -> None:
+        if self.rate_limiters is None:
+            navigate(*args)
+            return
+        limiter = self.rate_limiters.for_url(self.warm_up_url)
+        limiter.acquire_blocking(self.crawl_delay)
+        try:
+            navigate(*args)
+        finally:
+            # the browser doesn't expose status code, keep limits
+            limiter.release()
+
+    def _recycle(self, slot: _Slot) -> None:
+        self._quit(slot)
+        with self._lock:
+            self.recycled += 1
+
+    @staticmethod
+    def _quit(slot: _Slot) -> None:
+        driver, slot.driver = slot.driver, None
+        if driver is not None:
+            try:
+                driver.quit()
+            except (Exception,):
+                pass
+
+    def close(self) -> None:
+        """
+        Wait for the queued tasks, then quit every driver. The pool can be used again after close().
+        """
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join()
+        with self._lock:
+            self._slots.clear()
+        if workers and self.logger:
+            self.logger.info(f'[BrowserDriverPool] closed: {self.created} drivers created, {self.recycled} recycled.')
@@ -0,0 +1,98 @@
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from logging import Logger as LoggerAlias
+from typing import Optional, Tuple
+
+from selenium import webdriver
+
+from ..exceptions import LinovelibException
+
+# tried in order when browser_path is not set
+_BROWSER_EXECUTABLES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+
+# how long a launched browser may take to open its debugging port
+_LAUNCH_TIMEOUT = 15.0
+
+
+class AttachedChrome(webdriver.Chrome):
+    """
+    A driver attached to a long-lived browser(see ensure_debuggable_browser()). It works in a tab of its own, and
+    quit() only closes that tab and stops chromedriver: the browser keeps running with its cookies, cache and
+    clearance for the next run.
+    """
+
+    def __init__(self, options: webdriver.ChromeOptions) -> None:
+        super().__init__(options=options)
+        self.switch_to.new_window('tab')
+
+    def quit(self) -> None:
+        try:
+            self.close()
+        except (Exception,):
+            pass
+        finally:
+            self.service.stop()
+
+
+def parse_debugger_address(address: str) -> Tuple[str, int]:
+    """
+    '127.0.0.1:9222' or '9222' => ('127.0.0.1', 9222)
+    """
+    host, _, port = address.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise LinovelibException(f'Invalid browser debugger address: {address}, expected host:port.') from None
+
+
+def is_debugger_listening(address: str) -> bool:
+    host, port = parse_debugger_address(address)
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def ensure_debuggable_browser(address: str,
+                              profile_folder: Optional[str] = None,
+                              browser_path: Optional[str] = None,
+                              headless: bool = True,
+                              logger: Optional[LoggerAlias] = None) -> None:
+    """
+    Make sure a browser listens on the remote debugging address. If none does yet, start one in the background. It
+    outlives this run, so the next runs attach to it and skip the cold start.
+
+    Only a local address can be launched. A browser on another host must be started by the user, e.g.
+    `chrome --remote-debugging-port=9222 --user-data-dir=...`.
+    """
+    if is_debugger_listening(address):
+        return
+
+    host, port = parse_debugger_address(address)
+    if host not in ('127.0.0.1', 'localhost'):
+        raise LinovelibException(f'No browser listens on {address}.')
+
+    executable = browser_path or next(filter(None, map(shutil.which, _BROWSER_EXECUTABLES)), None)
+    if not executable:
+        raise LinovelibException(f'No browser listens on {address} and no browser executable is found, '
+                                 f'set browser_path or start one with --remote-debugging-port={port}.')
+
+    profile_folder = profile_folder or tempfile.mkdtemp(prefix='linovelib2epub-browser-')
+    arguments = [executable, f'--remote-debugging-port={port}', f'--user-data-dir={profile_folder}',
+                 '--no-first-run', '--no-default-browser-check']
+    if headless:
+        arguments.append('--headless=new')
+    # a session of its own: the browser is not killed with this process
+    subprocess.Popen(arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    if logger:
+        logger.info(f'Launched a long-lived browser on {address}, profile: {profile_folder}')
+
+    deadline = time.monotonic() + _LAUNCH_TIMEOUT
+    while not is_debugger_listening(address):
+        if time.monotonic() > deadline:
+            raise LinovelibException(f'The browser launched on {address} did not open its debugging port.')
+        time.sleep(0.2)
@@ -0,0 +1,84 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag
+
+from ..models import LightNovelImage
+
+
+class HtmlSanitizer:
+    """
+    Remove the nodes matching any of the css selectors from an already parsed article, then serialize it: one select()
+    and one serialization, no re-parse.
+
+    The article is changed in place, so the caller may keep changing it after clean(), e.g. rewrite_images(). Only the
+    removed nodes are guaranteed to be gone: the output is a new serialization by BeautifulSoup, don't search it for
+    the markup of the original page.
+
+    Usage::
+
+        sanitizer = HtmlSanitizer(['script', '.ca1'])
+        html = sanitizer.sanitize(soup.find(id='acontent'))
+    """
+
+    def __init__(self, remove_selectors: Iterable[str]) -> None:
+        self.remove_selectors = list(remove_selectors)
+        # one combined selector, so the tree is walked once whatever the number of rules
+        self._selector = ', '.join(self.remove_selectors)
+
+    def sanitize(self, node: Optional[Tag]) -> str:
+        if node is None:
+            return ''
+        self.clean(node)
+        return str(node)
+
+    def clean(self, node: Tag) -> None:
+        """
+        Like sanitize(), but no serialization, e.g. when the node is changed further(see rewrite_images()).
+        """
+        if self._selector:
+            for removed in node.select(self._selector):
+                # extract() but not decompose(): the caller may still hold a removed tag, e.g. an <img>
+                removed.extract()
+
+
+def rewrite_images(node: Optional[Tag],
+                   image_folder: str,
+                   make_image: Callable[[str], LightNovelImage]) -> Tuple[str, List[LightNovelImage]]:
+    """
+    One pass over the <img> of the node: the remote url(data-src of a lazy loaded image, else src) becomes a
+    LightNovelImage, and both src and data-src are pointed to its local file. The node is changed in place.
+
+    e.g. <img class="imagecontent lazyload" data-src="https://img1.readpai.com/0/28/109869/146248.jpg"
+    src="/images/photon.svg"/> => <img class="imagecontent lazyload" data-src="{image_folder}/..."
+    src="{image_folder}/..."/>
+
+    :param make_image: remote url => LightNovelImage
+    :return: the rewritten html, the images in document order
+    """
+    if node is None:
+        return '', []
+
+    images: List[LightNovelImage] = []
+    for img in node.find_all('img'):
+        remote_src = img.get('data-src') or img.get('src')
+        if not remote_src:
+            continue
+        image = make_image(remote_src)
+        local_src = f'{image_folder}/{image.local_relative_path}'
+        img['src'] = local_src
+        if img.has_attr('data-src'):
+            img['data-src'] = local_src
+        images.append(image)
+    return str(node), images
+
+
+def rewrite_images_in_html(html: str,
+                           image_folder: str,
+                           make_image: Callable[[str], LightNovelImage]) -> Tuple[str, List[LightNovelImage]]:
+    """
+    rewrite_images() for a serialized html. A html without any <img> is returned as is, without parsing.
+    """
+    if '<img' not in html:
+        return html, []
+    # html.parser: a fragment is kept as is, lxml would wrap it in <html><body>
+    return rewrite_images(BeautifulSoup(html, 'html.parser'), image_folder, make_image)
@@ -1,32 +1,263 @@
 import asyncio
+import functools
+import hashlib
 import json
+import os
 import re
-from typing import Dict, Any
+import threading
+import time
+from logging import Logger as LoggerAlias
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
 
 import aiohttp
 
+from linovelib2epub import settings
+from linovelib2epub.exceptions import LinovelibException
+from linovelib2epub.network import REVALIDATE_HEADERS, HttpClientManager, race
 from linovelib2epub.utils import aiohttp_get_with_retry
 
 
+class AntiObfuscationEngine:
+    """
+    The translation table of one rule version, compiled once. Only text nodes are translated, the markup and the
+    attributes(e.g. image urls) are kept as is.
+
+    Usage::
+
+        engine = AntiObfuscationEngine(mapping_dict)
+        html = engine.translate_html(html)
+        pages = engine.translate_pages(pages)   # batched, one pass over many pages
+    """
+
+    # a comment, or a tag(or a doctype) whose quoted attribute values may contain '>'. The text in between is translated
+    _MARKUP = re.compile(r'(<!--.*?-->|<(?:[^>"\']|"[^"]*"|\'[^\']*\')*>)', re.DOTALL)
+    # joins the pages of a batch, never in a page nor in a table
+    _PAGE_SEPARATOR = '\x00'
+
+    def __init__(self, mapping_dict: Dict[str, str]) -> None:
+        table = str.maketrans(mapping_dict)
+        table.pop(ord(self._PAGE_SEPARATOR), None)
+        # str.translate() is ~2x faster with a list indexed by code point than with a dict. Code points beyond the
+        # list raise IndexError(a LookupError), which keeps the char as is.
+        self._table: List[Any] = [chr(i) for i in range(max(0x10000, max(table, default=0) + 1))]
+        for code, value in table.items():
+            self._table[code] = value
+
+        chars = ''.join(re.escape(chr(c)) for c in table)
+        # most pages of the site(and every page of some books) have nothing to translate
+        self._obfuscated = re.compile(f'[{chars}]') if chars else None
+
+    def translate_html(self, html: str) -> str:
+        if self._obfuscated is None or not self._obfuscated.search(html):
+            return html
+        # a char to translate inside the markup, e.g. “” in an alt attribute or in a comment
+        if not any(self._obfuscated.search(markup) for markup in self._MARKUP.findall(html)):
+            # one pass over the whole html, the markup has nothing to translate
+            return html.translate(self._table)
+        parts = self._MARKUP.split(html)
+        # even: text, odd: markup
+        parts[::2] = [text.translate(self._table) for text in parts[::2]]
+        return ''.join(parts)
+
+    def translate_pages(self, pages: Iterable[str]) -> List[str]:
+        pages = list(pages)
+        if any(self._PAGE_SEPARATOR in page for page in pages):
+            return [self.translate_html(page) for page in pages]
+        return self.translate_html(self._PAGE_SEPARATOR.join(pages)).split(self._PAGE_SEPARATOR)
+
+
 class ParsedRuleResult:
     def __init__(self,
                  mapping_dict: Dict[str, Any],
                  content_id: str,
+                 js_hash: str = '',
+                 version: str = '',
                  ):
         self.mapping_dict = mapping_dict
         self.content_id = content_id
+        # sha256 of the js the rules are parsed from, and its format(v2, v3)
+        self.js_hash = js_hash
+        self.version = version
+        self.engine = AntiObfuscationEngine(mapping_dict)
+
+    def update(self, other: 'ParsedRuleResult') -> None:
+        """
+        Switch to newer rules in place, the spider holding this object sees them at once.
+        """
+        self.mapping_dict = other.mapping_dict
+        self.content_id = other.content_id
+        self.js_hash = other.js_hash
+        self.version = other.version
+        self.engine = other.engine
+
+
+class RuleCache:
+    """
+    The parsed rules on disk, keyed by the sha256 of the js, so a run(or the next book of a batch) starts without
+    fetching and parsing the js again.
 
+    - fresh(checked within `ttl`): used as is.
+    - stale: used at once, the js is fetched again in background. If its hash changed, the new rules are parsed, stored
+      and swapped into the result in place.
+    - a js which can't be fetched or parsed falls back to the last good rules.
+    """
 
-def generate_mapping_result():
-    js_text = _fetch_js_text()
-    result_set = _parse_mapping(js_text)
-    return result_set
+    # keep a few old versions, the site may switch back
+    MAX_VERSIONS = 5
+
+    def __init__(self, cache_file: str = settings.RULES_CACHE_FILE, ttl: float = settings.RULES_CACHE_TTL,
+                 logger: Optional[LoggerAlias] = None) -> None:
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.logger = logger
+        self._lock = threading.Lock()
+
+    def _log(self, message: str) -> None:
+        if self.logger:
+            self.logger.info(f'[RuleCache] {message}')
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if record.get('current') in record.get('rules', {}):
+                return record
+        except (OSError, ValueError):
+            pass
+        return {'current': '', 'checked_at': 0, 'rules': {}}
+
+    def _save(self, record: Dict[str, Any]) -> None:
+        # drop the oldest versions
+        versions = sorted(record['rules'].items(), key=lambda item: item[1]['parsed_at'], reverse=True)
+        record['rules'] = dict(versions[:self.MAX_VERSIONS])
+
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        part_file = f'{self.cache_file}.{threading.get_ident()}.part'
+        with open(part_file, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(part_file, self.cache_file)
+
+    @staticmethod
+    def _to_result(js_hash: str, entry: Dict[str, Any]) -> ParsedRuleResult:
+        return ParsedRuleResult(mapping_dict=entry['mapping_dict'], content_id=entry['content_id'], js_hash=js_hash,
+                                version=entry['version'])
+
+    def cached(self) -> Optional[ParsedRuleResult]:
+        """
+        :return: the last good rules, or None.
+        """
+        record = self.load()
+        if not record['current']:
+            return None
+        return self._to_result(record['current'], record['rules'][record['current']])
+
+    def is_fresh(self) -> bool:
+        record = self.load()
+        return bool(record['current']) and time.time() - record['checked_at'] < self.ttl
+
+    def invalidate(self) -> None:
+        """
+        Mark the current rules stale, e.g. a page has no node of their content id. They are still the last good ones.
+        """
+        with self._lock:
+            record = self.load()
+            if record['current']:
+                record['checked_at'] = 0
+                self._save(record)
+
+    def update(self, js_text: Optional[str]) -> ParsedRuleResult:
+        """
+        :param js_text: the js just fetched, None if it failed
+        :return: the rules of `js_text`, or the last good rules if it can't be parsed.
+        """
+        with self._lock:
+            record = self.load()
+            last_good = self._to_result(record['current'], record['rules'][record['current']]) \
+                if record['current'] else None
+
+            if js_text is None:
+                if last_good is None:
+                    raise LinovelibException('Failed to fetch the anti-obfuscation js.')
+                self._log(f'Failed to fetch the js, use the last good rules {last_good.js_hash[:12]}.')
+                return last_good
+
+            js_hash = hashlib.sha256(js_text.encode('utf-8')).hexdigest()
+            entry = record['rules'].get(js_hash)
+            if entry is None:
+                try:
+                    parsed = _parse_mapping(js_text)
+                except LinovelibException:
+                    if last_good is None:
+                        raise
+                    self._log(f'Failed to parse the js {js_hash[:12]}, use the last good rules '
+                              f'{last_good.js_hash[:12]}.')
+                    return last_good
+                entry = {'version': parsed.version, 'content_id': parsed.content_id,
+                         'mapping_dict': parsed.mapping_dict, 'parsed_at': time.time()}
+                record['rules'][js_hash] = entry
+                self._log(f'New rules {js_hash[:12]}({parsed.version}): {len(parsed.mapping_dict)} mappings.')
+
+            record['current'] = js_hash
+            record['checked_at'] = time.time()
+            self._save(record)
+            return self._to_result(js_hash, entry)
+
+
+def generate_mapping_result(http_client: Optional[HttpClientManager] = None,
+                            rule_cache: Optional[RuleCache] = None) -> ParsedRuleResult:
+    """
+    :param rule_cache: None to always fetch and parse the js.
+    """
+    if rule_cache is None:
+        js_text = _fetch_js_text(http_client)
+        if js_text is None:
+            raise LinovelibException('Failed to fetch the anti-obfuscation js.')
+        return _parse_mapping(js_text)
+
+    cached = rule_cache.cached()
+    if cached is None:
+        return rule_cache.update(_try_fetch_js_text(http_client))
+    if rule_cache.is_fresh():
+        return cached
+    if http_client is None:
+        return rule_cache.update(_try_fetch_js_text(http_client))
+
+    # stale-while-revalidate
+    async def _revalidate() -> None:
+        try:
+            js_text = await _probe_js_encrypted_file(_revalidating_get_text(http_client))
+        except (Exception,):
+            js_text = None
+        latest = await asyncio.get_running_loop().run_in_executor(None, rule_cache.update, js_text)
+        if latest.js_hash != cached.js_hash:
+            cached.update(latest)
+
+    http_client.submit(_revalidate())
+    return cached
+
+
+def refresh_mapping_result(http_client: Optional[HttpClientManager], rule_cache: RuleCache) -> ParsedRuleResult:
+    """
+    Fetch and parse the js again at once, bypassing the stale-while-revalidate of generate_mapping_result().
+    """
+    rule_cache.invalidate()
+    return rule_cache.update(_try_fetch_js_text(http_client))
 
 
 def _parse_mapping(js_text) -> ParsedRuleResult:
-    content_id, replace_rules = _parse_mapping_v2(js_text)
-    parsed_rule_result = ParsedRuleResult(mapping_dict=replace_rules, content_id=content_id)
-    return parsed_rule_result
+    """
+    Detect the format of the js: the first parser giving a content id and rules wins.
+    """
+    js_hash = hashlib.sha256(js_text.encode('utf-8')).hexdigest()
+    for version, parse in (('v2', _parse_mapping_v2), ('v3', _parse_mapping_v3)):
+        try:
+            content_id, replace_rules = parse(js_text)
+        except (AssertionError, IndexError, OverflowError, UnicodeDecodeError, ValueError):
+            continue
+        if content_id and replace_rules:
+            return ParsedRuleResult(mapping_dict=replace_rules, content_id=content_id, js_hash=js_hash,
+                                    version=version)
+    raise LinovelibException('Unknown format of the anti-obfuscation js, please submit this bug to github issue.')
 
 
 def _parse_mapping_v1(js_text) -> tuple:
@@ -113,7 +344,7 @@ def write_rules(rules):
         json.dump(escaped_rules, json_file, ensure_ascii=False, indent=2)
 
 
-async def _probe_js_encrypted_file():
+async def _probe_js_encrypted_file(get_text: Callable[[str], Awaitable[Optional[str]]]):
     # 候选的url请求数组进行竞速，取第一个成功返回的js，天天都在改改改，猜测是随机变更。
     # better implementation: extract candidate urls from current chapter page
     # https://w.linovelib.com/novel/2883/141634.html
@@ -122,19 +353,43 @@ async def _probe_js_encrypted_file():
     url2 = "https://w.linovelib.com/themes/zhmb/js/readtool.js"
     urls = [url1, url2]
 
+    # 同时请求，第一个包含规则的js胜出，其余请求取消。两者并非镜像，只有一个包含规则。
+    async def _get_rules_js(url: str, _claim: Callable[[], bool]) -> Optional[str]:
+        js_text = await get_text(url)
+        return js_text if js_text and _has_rules(js_text) else None
+
+    return await race(urls, _get_rules_js)
+
+
+def _has_rules(js_text: str) -> bool:
+    try:
+        _parse_mapping(js_text)
+    except LinovelibException:
+        return False
+    return True
+
+
+async def _probe_js_encrypted_file_standalone():
     async with aiohttp.ClientSession() as session:
-        tasks = [asyncio.create_task(aiohttp_get_with_retry(session, url)) for url in urls]
-        completed, pending = await asyncio.wait(tasks, return_when=asyncio.ALL_COMPLETED)
+        return await _probe_js_encrypted_file(functools.partial(aiohttp_get_with_retry, session))
+
 
-        # 获取第一个成功返回的任务结果
-        for task in completed:
-            text = task.result()
-            if text:
-                return text
+def _try_fetch_js_text(http_client: Optional[HttpClientManager] = None) -> Optional[str]:
+    try:
+        return _fetch_js_text(http_client)
+    except (Exception,):
+        return None
 
-    return None
 
+def _fetch_js_text(http_client: Optional[HttpClientManager] = None):
+    if http_client is None:
+        # e.g. used by scripts in playground
+        return asyncio.run(_probe_js_encrypted_file_standalone())
 
-def _fetch_js_text():
-    js_file_text = asyncio.run(_probe_js_encrypted_file())
+    js_file_text = http_client.run(_probe_js_encrypted_file(_revalidating_get_text(http_client)))
     return js_file_text
+
+
+def _revalidating_get_text(http_client: HttpClientManager) -> Callable[[str], Awaitable[Optional[str]]]:
+    # the js changes daily, a copy in the http cache must be revalidated. RuleCache is the cache of the rules.
+    return functools.partial(http_client.get_text, headers=REVALIDATE_HEADERS)
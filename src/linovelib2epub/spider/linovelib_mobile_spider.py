@@ -1,39 +1,174 @@
-import random
+import dataclasses
+import functools
+import os
 import re
+import threading
 import time
-from typing import Dict, List, Optional
-from urllib.parse import urljoin
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urljoin, urlsplit
 
 import demjson3
 import inquirer
 import requests
-from bs4 import (BeautifulSoup)
+from bs4 import BeautifulSoup, Tag
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.wait import WebDriverWait
 
 from . import BaseNovelWebsiteSpider
-from .linovelib_mobile_rules import generate_mapping_result
-from ..exceptions import LinovelibException, PageContentIllegalException
+from .browser_pool import BrowserDriverPool
+from .browser_profile import AttachedChrome, ensure_debuggable_browser
+from .html_processing import HtmlSanitizer, rewrite_images
+from .linovelib_mobile_rules import RuleCache, generate_mapping_result, refresh_mapping_result
+from ..exceptions import LinovelibException, PageContentIllegalException, ThrottledException
 from ..models import LightNovel, LightNovelChapter, LightNovelVolume, LightNovelImage, CatalogLinovelibMobileChapter, \
-    CatalogLinovelibMobileVolume
-from ..utils import (cookiedict_from_str, create_folder_if_not_exists,
-                     requests_get_with_retry)
+    CatalogLinovelibMobileVolume, VolumeImageIndex
+from .. import settings
+from ..network import BYPASS_HEADERS, REVALIDATE_HEADERS, HttpClientManager, RateLimitPolicy, RetryBudget, RetryJob, \
+    error_for_status, is_throttled_response
+from ..utils import cookiedict_from_str, create_folder_if_not_exists
+
+# <img class="imagecontent" src="{image_folder}/..."/>, as serialized by rewrite_images()
+_IMG_TAG = re.compile(r'<img\b[^>]*?\ssrc="([^"]*)"[^>]*/>')
+
+# https://www.bilinovel.com/novel/2356/83547_2.html, the second page of a chapter
+_PAGINATED_PAGE_LINK = re.compile(r'_\d+\.html$')
+
+# shown instead of the content to a client which didn't pass the check of the site
+_BROWSER_CHECK_MARKER = '抱歉，章节内容不支持该浏览器显示'
+
+# shown instead of the content when the client goes too fast
+_THROTTLE_MARKER = 'You are being rate limited'
+
+# lean mode(see _make_lean()): never loaded by the browser. The images are downloaded later over HTTP anyway.
+_LEAN_BLOCKED_URLS = [
+    # images
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+    # fonts
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    # media
+    '*.mp4', '*.webm', '*.mp3', '*.m3u8',
+    # ads and analytics
+    '*googletagmanager.com*', '*google-analytics.com*', '*googlesyndication.com*', '*doubleclick.net*',
+    '*adservice.google.*', '*hm.baidu.com*', '*cnzz.com*', '*51.la*',
+]
+
+# lean mode: the page is read as soon as the title and the content are in the DOM, or it's a page to retry
+_CONTENT_READY_SCRIPT = '''
+return !!(document.getElementById('atitle') && document.getElementById(arguments[0]))
+    || /You are being rate limited|抱歉，章节内容不支持该浏览器显示/.test(document.body ? document.body.innerText : '');
+'''
+
+# a page without the content node fetches the rules again at most this often(seconds), see _on_rules_miss()
+_RULES_RECHECK_INTERVAL = 60.0
+
+# pages to retry, searched in the page source
+_FAILED_PAGE_MARKERS = [_THROTTLE_MARKER, _BROWSER_CHECK_MARKER]
+
+# in-browser extraction(see _ExtractedPage): arguments are the content id and _FAILED_PAGE_MARKERS
+_EXTRACT_PAGE_SCRIPT = '''
+var source = document.documentElement.outerHTML;
+var title = document.getElementById('atitle');
+var content = document.getElementById(arguments[0]);
+return {
+    marker: arguments[1].find(function (m) { return source.indexOf(m) !== -1; }) || null,
+    title: title ? title.textContent : null,
+    content: content ? content.outerHTML : null,
+    url_next: window.ReadParams ? window.ReadParams.url_next : null
+};
+'''
+
+
+@dataclass
+class _ExtractedPage:
+    """
+    The parts of a page read in the browser by _EXTRACT_PAGE_SCRIPT, instead of the whole page source.
+    """
+    title: Optional[str]
+    # outerHTML of the content node, the only markup parsed in Python
+    content: Optional[str]
+    # ReadParams.url_next as is, e.g. /novel/2356/83547_2.html
+    url_next: Optional[str]
+
+
+@dataclass
+class _CrawledPage:
+    # title shown on the page, may carry the pagination e.g. 第二章 可爱如花的女孩（2/3）
+    title: str
+    article: str
+    # ReadParams.url_next: the next page of this chapter(xxx_2.html), or the next chapter
+    url_next: str
+    illustrations: List[LightNovelImage] = field(default_factory=list)
 
 
 class LinovelibMobileSpider(BaseNovelWebsiteSpider):
-
-    def __init__(self, spider_settings: Optional[Dict] = None):
-        super().__init__(spider_settings)
+    # one browser driver => one page at a time. Only the request rate adapts here, unless crawl_concurrency > 1.
+    RATE_LIMIT_POLICY = RateLimitPolicy(initial_concurrency=1, max_concurrency=1,
+                                        initial_rate=1.0, min_rate=0.1, max_rate=4.0, rate_step=0.25,
+                                        throttle_cooldown=10.0)
+    # same image under the same path, see LinovelibMobileImageDuplicateCheckingStrategy
+    IMAGE_MIRROR_HOSTS = ('img1.readpai.com', 'img3.readpai.com', 'linovelib-img.zezefans.com')
+    # removed from the article of every page
+    ARTICLE_REMOVE_SELECTORS = (
+        'script',
+        # <p class="ca1"> 去掉一些公告声明
+        '.ca1',
+    )
+
+    def __init__(self, spider_settings: Optional[Dict] = None, http_client: Optional[HttpClientManager] = None):
+        super().__init__(spider_settings, http_client)
         self._init_http_client()
 
-        # it might be better to refactor to asyncio mode
-        self._mapping_result = generate_mapping_result()
-        self._html_content_id = self._mapping_result.content_id
-        self._mapping_dict = self._mapping_result.mapping_dict
-
-        self.FETCH_CHAPTER_CONCURRENCY_LEVEL = 1
-
-        self._driver = None
+        # crawl workers, each one drives its own browser(see BrowserDriverPool)
+        crawl_concurrency = self.spider_settings.get('crawl_concurrency') or settings.CRAWL_CONCURRENCY
+        self._crawl_concurrency: int = max(1, crawl_concurrency)
+        # the limiter still decides how many of them really load a page at the same time
+        policy = dataclasses.replace(self.RATE_LIMIT_POLICY,
+                                     max_concurrency=self._crawl_concurrency,
+                                     delay_jitter=self.spider_settings.get('crawl_delay_jitter',
+                                                                           settings.CRAWL_DELAY_JITTER))
+        self.http_client.rate_limiters.configure(urlsplit(self.spider_settings['base_url']).hostname, policy)
+
+        # may be swapped in place by a background revalidation, so always read it through _mapping_result
+        self._rule_cache = RuleCache(logger=self.logger)
+        self._mapping_result = generate_mapping_result(self.http_client, self._rule_cache)
+        self._rules_lock = threading.Lock()
+        self._rules_checked_at = 0.0
+
+        self._sanitizer = HtmlSanitizer(self.ARTICLE_REMOVE_SELECTORS)
+
+        # keep cookies, cache and clearance across runs: a profile folder of each worker, or one long-lived browser
+        # every run attaches to
+        self._browser_profile_folder: Optional[str] = self.spider_settings.get('browser_profile_folder',
+                                                                               settings.BROWSER_PROFILE_FOLDER)
+        self._browser_debugger_address: Optional[str] = self.spider_settings.get('browser_debugger_address',
+                                                                                 settings.BROWSER_DEBUGGER_ADDRESS)
+        self._browser_launch_lock = threading.Lock()
+
+        # one browser per crawl worker
+        persistent = bool(self._browser_profile_folder or self._browser_debugger_address)
+        self._browser_pool = BrowserDriverPool(self._crawl_concurrency, self._create_browser_driver,
+                                               warm_up_url='https://www.bilinovel.com/', persistent=persistent,
+                                               rate_limiters=self.http_client.rate_limiters,
+                                               crawl_delay=self.spider_settings.get('page_crawl_delay') or 0,
+                                               logger=self.logger)
+
+        # once a browser passed the check, its cookies and UA are handed off to self.session(see _fetch_page())
+        self._handoff_enabled: bool = self.spider_settings.get('browser_cookie_handoff',
+                                                               settings.BROWSER_COOKIE_HANDOFF)
+        self._handoff_user_agent: Optional[str] = None
+        self._handoff_failures = 0
+        self._handoff_lock = threading.Lock()
+
+        # block assets, don't wait for the load event, read the page once its content is there
+        self._lean_mode: bool = self.spider_settings.get('browser_lean_mode', settings.BROWSER_LEAN_MODE)
+        # read the title, the content and ReadParams in the browser, not the whole page source
+        self._in_page_extraction: bool = self.spider_settings.get('browser_in_page_extraction',
+                                                                  settings.BROWSER_IN_PAGE_EXTRACTION)
 
     def request_headers(self, referer: str = '', random_ua: bool = True):
         default_mobile_ua = 'Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Mobile/15E148 Safari/604.1 Edg/120.0.0.0'
@@ -62,24 +197,19 @@ class LinovelibMobileSpider(BaseNovelWebsiteSpider):
 
         Guideline: Don't move many concrete init logics to super class __init__()
         """
-        self.session = requests.Session()
-
-        if self.spider_settings["disable_proxy"]:
-            self.session.trust_env = False
+        # pooled session shared by the whole run. trust_env is already set by HttpClientManager.
+        self.session = self.http_client.requests_session
 
         # cookie example: PHPSESSID=...; night=0; jieqiUserInfo=...; jieqiVisitInfo=...
         if self.spider_settings["http_cookie"]:
             cookie_dict = cookiedict_from_str(self.spider_settings["http_cookie"])
             cookiejar = requests.utils.cookiejar_from_dict(cookie_dict)
-            self.session.cookies = cookiejar
+            self.session.cookies.update(cookiejar)
 
     def _crawl_book_basic_info(self, url):
-        result = requests_get_with_retry(self.session,
-                                         url,
-                                         headers=self.request_headers(),
-                                         retry_max=self.spider_settings['http_retries'],
-                                         timeout=self.spider_settings["http_timeout"],
-                                         logger=self.logger)
+        # revalidated: an ongoing book changes
+        result = self.http_client.get_sync(url, headers={**self.request_headers(), **REVALIDATE_HEADERS},
+                                           timeout=self.spider_settings["http_timeout"])
 
         if result and result.status_code == 200:
             self.logger.info(f'Succeed to get the novel of book_id: {self.spider_settings["book_id"]}')
@@ -100,44 +230,12 @@ class LinovelibMobileSpider(BaseNovelWebsiteSpider):
         return None
 
     def _crawl_book_content(self, catalog_url):
-        def _anti_js_obfuscation(html):
-            """
-            recover original text of the novel content.
-
-            :param html:
-            :return: html after anti-js obfuscation
-            """
-            table = str.maketrans(self._mapping_dict)
-            res = html.translate(table)
-            return res
-
-        def _sanitize_html(html: BeautifulSoup) -> str:
-            """
-            Strip useless script on body tag by reg or soup library method.
-            e.g. <script>zation();</script>
-
-            And remove all the content not needed.
-
-            :param html:
-            :return:
-            """
-            html_copy = BeautifulSoup(str(html), 'lxml')
-
-            # remove <p class="ca1"> 去掉一些公告声明
-            anouncements = html_copy.select(".ca1")
-            for anouncement in anouncements:
-                anouncement.decompose()
-
-            return re.sub(r'<script.+?</script>', '', str(html_copy), flags=re.DOTALL)
-
         book_catalog_rs = None
         try:
-            book_catalog_rs = requests_get_with_retry(self.session,
-                                                      catalog_url,
-                                                      headers=self.request_headers(),
-                                                      retry_max=self.spider_settings['http_retries'],
-                                                      timeout=self.spider_settings["http_timeout"],
-                                                      logger=self.logger)
+            # revalidated: new chapters of an ongoing book must not be missed
+            book_catalog_rs = self.http_client.get_sync(catalog_url,
+                                                        headers={**self.request_headers(), **REVALIDATE_HEADERS},
+                                                        timeout=self.spider_settings["http_timeout"])
         except (Exception,):
             self.logger.error(f'Failed to get normal response of {catalog_url}. It may be a network issue.')
 
@@ -149,105 +247,24 @@ class LinovelibMobileSpider(BaseNovelWebsiteSpider):
             if self.spider_settings['select_volume_mode']:
                 catalog_list = self._handle_select_volume(catalog_list)
 
-            new_novel = LightNovel()
-            url_next = ''
-
-            volume_id = -1
-            for catalog_volume in catalog_list:
-                volume_id += 1
-
-                new_volume = LightNovelVolume(volume_id=volume_id)
-                new_volume.title = catalog_volume.volume_title
-                self.logger.info(f'volume: {catalog_volume.volume_title}')
-
-                chapter_id = -1
-                chapter_list: List[LightNovelChapter] = []  # store all chapters of one volume
-                for catalog_chapter in catalog_volume.chapters:
-                    self.apply_crawl_delay('chapter_crawl_delay')
-
-                    chapter_content = ''
-                    chapter_title = catalog_chapter.chapter_title
-                    chapter_id += 1
-
-                    light_novel_chapter = LightNovelChapter(chapter_id=chapter_id)
-                    light_novel_chapter.title = chapter_title
-                    chapter_illustrations: List[LightNovelImage] = []
-                    self.logger.info(f'chapter : {chapter_title}')
-
-                    # 这个函数是含有状态的，必须及时覆盖 url_next 变量，否则状态机会失败。
-                    # 注意：由于这里并不关心页面内容是否正常，只收集页面链接，因此这里暂时不需要应用请求间隔延迟。
-                    url_next = self._expand_paginated_chapter_links(catalog_chapter, url_next)
-
-                    # for loop [chapter_index_url]+[all paginated chapters] links of one chapter
-                    for page_link in catalog_chapter.chapter_urls:
-                        self.apply_crawl_delay('page_crawl_delay')
-
-                        # retry until get the correct title
-                        while True:
-                            # use selenium instead of direct requests
-                            try:
-                                page_resp = self._fetch_page(page_link, max_retries=self.spider_settings['http_retries'])
-                                self.logger.debug(f'{page_resp[:100]=}')
-                            except (Exception,):
-                                continue
-
-                            if page_resp:
-                                soup = BeautifulSoup(page_resp, 'lxml')
-                            else:
-                                raise Exception(f'[ERROR]: request {page_link} failed.')
-
-                            new_title = soup.find(id='atitle')
-                            if new_title is not None:
-                                break
-
-                        # 分页判断过滤
-                        if not new_title.text.startswith(light_novel_chapter.title):
-                            # 目录：第二章 可爱如花的 N 孩
-                            # 文章页：第二章 可爱如花的女孩，第二章 可爱如花的女孩（2/3），......
-                            # 目录页部分文字会被隐藏，所以用文章中的标题代替 new_title。由于 new_title 可能带有分页信息，所以不能 ==
-                            self.logger.info(f'chapter : [{light_novel_chapter.title}] New Title= [{new_title.text}]')
-                            light_novel_chapter.title = new_title.text
-
-                        images = soup.find_all('img')
-                        article_soup = soup.find(id=self._html_content_id)
-                        article = _sanitize_html(article_soup)
-                        for _, image in enumerate(images):
-                            # <img class="imagecontent lazyload" data-src="https://img1.readpai.com/0/28/109869/146248.jpg" src="/images/photon.svg"/>
-                            # <img border="0" class="imagecontent" src="https://img1.readpai.com/0/28/109869/146254.jpg"/>
-                            html_image_src = re.search('(?<= src=").*?(?=")', str(image))
-                            image_lazyload_src = image.get("data-src")
-
-                            if image_lazyload_src:
-                                remote_src = re.search('(?<= data-src=").*?(?=")', str(image)).group()
-                            else:
-                                remote_src = image.get("src")
-
-                            light_novel_image = LightNovelImage(related_page_url=page_link, remote_src=remote_src,
-                                                                chapter_id=chapter_id, volume_id=volume_id,
-                                                                book_id=self.spider_settings["book_id"])
-
-                            image_local_src = f'{self.spider_settings["image_download_folder"]}/{light_novel_image.local_relative_path}'
-                            local_image = str(image).replace(str(html_image_src.group()), image_local_src)
-                            article = article.replace(str(image), local_image)
-                            chapter_illustrations.append(light_novel_image)
-
-                        article = _anti_js_obfuscation(article)
-                        chapter_content += article
-
-                        self.logger.info(f'Processing page... {page_link}')
-
-                    light_novel_chapter.content = chapter_content
-                    light_novel_chapter.illustrations = chapter_illustrations
-                    chapter_list.append(light_novel_chapter)
-
-                self._remove_duplicate_images_in_html(chapter_list)
-
-                for chapter in chapter_list:
-                    new_volume.add_chapter(cid=chapter.chapter_id, title=chapter.title, content=chapter.content,
-                                           illustrations=chapter.illustrations)
-
-                new_novel.add_volume(vid=new_volume.volume_id, title=new_volume.title, chapters=new_volume.chapters)
+            # a page without title may be a broken render of the browser, it's worth retrying.
+            crawl_job = self.http_client.retry_engine.job('pages', budget=RetryBudget(),
+                                                          extra_retriable=(WebDriverException,))
+
+            # chapters are walked by a bounded pool, their pages are fetched by the browser pool(one browser per page
+            # worker), then assembled in order.
+            self.logger.info(f'Crawl with {self._crawl_concurrency} worker(s).')
+            try:
+                with ThreadPoolExecutor(max_workers=self._crawl_concurrency,
+                                        thread_name_prefix='linovelib-crawl') as executor:
+                    crawled_pages = self._crawl_all_chapters(catalog_list, crawl_job, executor)
+            finally:
+                self._browser_pool.close()
 
+            new_novel = self._assemble_novel(catalog_list, crawled_pages)
+
+            self.http_client.rate_limiters.log_snapshot()
+            crawl_job.report()
             return new_novel
 
         else:
@@ -255,72 +272,427 @@ class LinovelibMobileSpider(BaseNovelWebsiteSpider):
 
         return None
 
-    def _fetch_page(self, url: str, max_retries: int = 5) -> str | None:
-        if not self._driver:
-            self._init_browser_driver()
+    def _crawl_all_chapters(self, catalog_list: List[CatalogLinovelibMobileVolume], crawl_job: RetryJob,
+                            executor: ThreadPoolExecutor) -> Dict[str, '_CrawledPage']:
+        """
+        Crawl every chapter, in parallel. The page links of every chapter are solved in place.
 
-        driver = self._driver
+        A broken chapter link(e.g. "javascript:cid(0)") is the url_next of the last page of the previous chapter, so
+        only such a chapter waits for the previous one, the others start at once. The first failure stops the crawl:
+        the chapters not started yet never start, the running ones stop after their current page.
 
-        request_count = 0
-        # total requests num = self(1) + max_retries
-        # if max_retries= 5, then total is 1+5=6
+        :return: page url => crawled page
+        """
+        chapters = [(volume_id, chapter_id, chapter)
+                    for volume_id, catalog_volume in enumerate(catalog_list)
+                    for chapter_id, chapter in enumerate(catalog_volume.chapters)]
+        # pages of the chapter, url_next of its last page
+        done: List['Future[Tuple[Dict[str, _CrawledPage], str]]'] = [Future() for _ in chapters]
+        stop = threading.Event()
+
+        def _crawl(index: int, url_next: str) -> None:
+            try:
+                volume_id, chapter_id, chapter = chapters[index]
+                done[index].set_result(self._crawl_chapter(crawl_job, chapter, chapter_id, volume_id, url_next, stop))
+            except Exception as e:
+                done[index].set_exception(e)
 
-        while request_count <= max_retries:
+        def _crawl_after_previous(index: int, previous: 'Future[Tuple[Dict[str, _CrawledPage], str]]') -> None:
             try:
-                driver.get(url)
-                html = driver.page_source
-
-                # Determine whether the content of the page has the following tags:
-                # - You are being rate limited
-                # - 抱歉，章节内容不支持该浏览器显示
-                failed_patterns = ['You are being rate limited', '抱歉，章节内容不支持该浏览器显示']
-                for pattern in failed_patterns:
-                    # 使用正则表达式匹配页面内容
-                    match = re.search(pattern, html)
-                    if match:
-                        raise PageContentIllegalException(f'The page content of {url} is not desired.')
+                if previous.exception() is not None:
+                    raise LinovelibException(f'Can not resolve the broken link of chapter '
+                                             f'{chapters[index][2].chapter_title}.')
+                executor.submit(_crawl, index, previous.result()[1])
+            except Exception as e:
+                # never leave the future pending, wait() below would hang
+                done[index].set_exception(e)
 
+        for index, (_, _, chapter) in enumerate(chapters):
+            if index > 0 and not self._is_valid_chapter_link(chapter.chapter_url):
+                done[index - 1].add_done_callback(functools.partial(_crawl_after_previous, index))
+            else:
+                executor.submit(_crawl, index, '')
+
+        wait(done, return_when=FIRST_EXCEPTION)
+        failed = next((future for future in done if future.done() and future.exception() is not None), None)
+        if failed is not None:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise failed.exception()
+
+        crawled_pages: Dict[str, _CrawledPage] = {}
+        for future in done:
+            crawled_pages.update(future.result()[0])
+        return crawled_pages
+
+    def _crawl_chapter(self, crawl_job: RetryJob, chapter: CatalogLinovelibMobileChapter, chapter_id: int,
+                       volume_id: int, url_next: str, stop: threading.Event) -> Tuple[Dict[str, '_CrawledPage'], str]:
+        """
+        Crawl the pages of one chapter, every page is fetched once: it gives both the content and the link of the next
+        page(ReadParams.url_next).
+
+        The chain of url_next is always followed, but as soon as a title tells the page count, e.g.
+        第二章 可爱如花的女孩（2/3）, the remaining pages are predicted(xxx_3.html, ...) and crawled in parallel. A wrong
+        prediction only costs a wasted page: a predicted page gets a single attempt outside the retry budget, it's
+        retried within the budget only when the chain of url_next reaches it.
+
+        :param url_next: the link of this chapter if its catalog link is broken
+        :param stop: set when another chapter failed, the pages not fetched yet are cancelled
+        :return: page url => crawled page, url_next of the last page(the link of the next chapter)
+        """
+        # fix broken links in place(catalog_list) if exits
+        if not self._is_valid_chapter_link(chapter.chapter_url):
+            chapter.chapter_url = url_next
+
+        futures: Dict[str, 'Future[_CrawledPage]'] = {}
+        predicted: Set[str] = set()
+        prediction_job = self.http_client.retry_engine.job('predicted pages', max_attempts=1,
+                                                           extra_retriable=crawl_job.extra_retriable,
+                                                           count_in_breaker=False)
+
+        def _submit(page_link: str, job: RetryJob = crawl_job) -> 'Future[_CrawledPage]':
+            if page_link not in futures:
+                futures[page_link] = self._browser_pool.submit(self._crawl_page, job, page_link,
+                                                               chapter_id, volume_id)
+            return futures[page_link]
+
+        def _crawled(page_link: str) -> _CrawledPage:
+            try:
+                return _submit(page_link).result()
+            except Exception:
+                if page_link not in predicted:
+                    raise
+            # the single attempt of a predicted page failed, retry it within the budget
+            predicted.discard(page_link)
+            del futures[page_link]
+            return _submit(page_link).result()
+
+        crawled_pages: Dict[str, _CrawledPage] = {}
+        page_link = chapter.chapter_url
+        try:
+            while True:
+                if stop.is_set():
+                    raise LinovelibException(f'Crawl of chapter {chapter.chapter_title} is stopped.')
+                page = _crawled(page_link)
+                crawled_pages[page_link] = page
+                new_links = [link for link in self._predict_sibling_links(page_link, page.title) if link not in futures]
+                predicted.update(new_links)
+                for predicted_link in new_links:
+                    _submit(predicted_link, prediction_job)
+
+                if '_' not in page.url_next:
+                    break
+                page_link = page.url_next
+                chapter.add_expand_paginated_chapter_url(page_link)
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+
+        self._drop_wrong_predictions(futures, crawled_pages)
+        return crawled_pages, page.url_next
+
+    def _drop_wrong_predictions(self, futures: Dict[str, 'Future[_CrawledPage]'],
+                                crawled_pages: Dict[str, '_CrawledPage']) -> None:
+        wasted = [link for link, future in futures.items() if link not in crawled_pages and not future.cancel()]
+        if wasted:
+            self.logger.warning(f'Wrong prediction of page links: {wasted}')
+
+    @staticmethod
+    def _predict_sibling_links(page_link: str, title: str) -> List[str]:
+        """
+        e.g. https://www.bilinovel.com/novel/2356/83547_2.html with title 第二章 可爱如花的女孩（2/4）
+        => [https://www.bilinovel.com/novel/2356/83547_3.html, https://www.bilinovel.com/novel/2356/83547_4.html]
+        """
+        match = re.search(r'[（(](\d+)/(\d+)[）)]\s*$', title)
+        if not match:
+            return []
+        current_page, page_count = int(match.group(1)), int(match.group(2))
+        stem, n = re.subn(r'(_\d+)?\.html$', '', page_link)
+        if not n:
+            return []
+        return [f'{stem}_{i}.html' for i in range(current_page + 1, page_count + 1)]
+
+    def _crawl_page(self, crawl_job: RetryJob, page_link: str, chapter_id: int, volume_id: int) -> '_CrawledPage':
+        # retry until get the correct title, bounded by the retry policy and budget
+        article_soup, title, url_next = crawl_job.run_sync(page_link,
+                                                           functools.partial(self._fetch_page_with_title, page_link))
+
+        self._sanitizer.clean(article_soup)
+        article, illustrations = rewrite_images(
+            article_soup, self.spider_settings["image_download_folder"],
+            lambda remote_src: LightNovelImage(related_page_url=page_link, remote_src=remote_src,
+                                               chapter_id=chapter_id, volume_id=volume_id,
+                                               book_id=self.spider_settings["book_id"]))
+        for light_novel_image in illustrations:
+            self.http_client.remember_host(light_novel_image.download_url)
+
+        article = self._anti_js_obfuscation(article)
+        self.logger.info(f'Processing page... {page_link}')
+        return _CrawledPage(title=title, article=article, url_next=url_next, illustrations=illustrations)
+
+    def _parse_url_next(self, soup: BeautifulSoup, page_link: str) -> str:
+        # <body id="aread"><script>var ReadParams={..., url_next:'/novel/2356/83547_2.html', ...}</script>
+        try:
+            first_script_text = soup.find("body", {"id": "aread"}).find("script").text
+            # alternative: use split(':')[-1] to get read_params_text
+            read_params_text = first_script_text[len('var ReadParams='):]
+            read_params_json = demjson3.decode(read_params_text)
+        except (Exception,):
+            raise PageContentIllegalException(f'The page {page_link} has no ReadParams.')
+        return self._resolve_url_next(read_params_json['url_next'])
+
+    def _resolve_url_next(self, url_next: str) -> str:
+        return urljoin(f'{self.spider_settings["base_url"]}/novel', url_next)
+
+    def _assemble_novel(self, catalog_list: List[CatalogLinovelibMobileVolume],
+                        crawled_pages: Dict[str, '_CrawledPage']) -> LightNovel:
+        new_novel = LightNovel()
+        for volume_id, catalog_volume in enumerate(catalog_list):
+            new_volume = LightNovelVolume(volume_id=volume_id)
+            new_volume.title = catalog_volume.volume_title
+            self.logger.info(f'volume: {catalog_volume.volume_title}')
+
+            chapter_list: List[LightNovelChapter] = []  # store all chapters of one volume
+            for chapter_id, catalog_chapter in enumerate(catalog_volume.chapters):
+                light_novel_chapter = LightNovelChapter(chapter_id=chapter_id)
+                light_novel_chapter.title = catalog_chapter.chapter_title
+                self.logger.info(f'chapter : {catalog_chapter.chapter_title}')
+
+                chapter_content = ''
+                chapter_illustrations: List[LightNovelImage] = []
+                for page_link in catalog_chapter.chapter_urls:
+                    page = crawled_pages[page_link]
+
+                    # 分页判断过滤
+                    if not page.title.startswith(light_novel_chapter.title):
+                        # 目录：第二章 可爱如花的 N 孩
+                        # 文章页：第二章 可爱如花的女孩，第二章 可爱如花的女孩（2/3），......
+                        # 目录页部分文字会被隐藏，所以用文章中的标题代替 new_title。由于 new_title 可能带有分页信息，所以不能 ==
+                        self.logger.info(f'chapter : [{light_novel_chapter.title}] New Title= [{page.title}]')
+                        light_novel_chapter.title = page.title
+
+                    chapter_content += page.article
+                    chapter_illustrations.extend(page.illustrations)
+
+                light_novel_chapter.content = chapter_content
+                light_novel_chapter.illustrations = chapter_illustrations
+                chapter_list.append(light_novel_chapter)
+
+            self._remove_duplicate_images_in_html(chapter_list)
+
+            for chapter in chapter_list:
+                new_volume.add_chapter(cid=chapter.chapter_id, title=chapter.title, content=chapter.content,
+                                       illustrations=chapter.illustrations)
+
+            new_novel.add_volume(vid=new_volume.volume_id, title=new_volume.title, chapters=new_volume.chapters)
+        return new_novel
+
+    def _anti_js_obfuscation(self, html):
+        """
+        recover original text of the novel content.
+
+        :param html:
+        :return: html after anti-js obfuscation
+        """
+        return self._mapping_result.engine.translate_html(html)
+
+    def _on_rules_miss(self, url: str, content_id: str) -> None:
+        """
+        The page has a title but no node of the content id: the rules are out of date, e.g. stale ones served while
+        revalidating. Fetch them again at once and raise, so that the page is retried with the new content id.
+        """
+        with self._rules_lock:
+            # not again if another page already did it with these rules
+            recheck_due = time.monotonic() - self._rules_checked_at > _RULES_RECHECK_INTERVAL
+            if content_id == self._mapping_result.content_id and recheck_due:
+                self._rules_checked_at = time.monotonic()
+                latest = refresh_mapping_result(self.http_client, self._rule_cache)
+                if latest.js_hash != self._mapping_result.js_hash:
+                    self.logger.info(f'Rules changed: content id {content_id} => {latest.content_id}.')
+                    self._mapping_result.update(latest)
+        if self.http_client.response_cache is not None:
+            self.http_client.response_cache.invalidate(url)
+        raise PageContentIllegalException(f'The page {url} has no content node #{content_id}.')
+
+    def _fetch_page_with_title(self, url: str) -> Tuple[Tag, str, str]:
+        """
+        :return: the content node, the title, the absolute url_next
+        """
+        page = self._fetch_page(url)
+        content_id = self._mapping_result.content_id
+        if isinstance(page, _ExtractedPage):
+            if page.title is None:
+                raise PageContentIllegalException(f'The page {url} has no title.')
+            if not page.url_next:
+                raise PageContentIllegalException(f'The page {url} has no ReadParams.')
+            article_soup = BeautifulSoup(page.content, 'lxml').find(id=content_id) if page.content else None
+            if article_soup is None:
+                self._on_rules_miss(url, content_id)
+            return article_soup, page.title, self._resolve_url_next(page.url_next)
+
+        self.logger.debug(f'{page[:100]=}')
+        soup = BeautifulSoup(page, 'lxml')
+        new_title = soup.find(id='atitle')
+        if new_title is None:
+            raise PageContentIllegalException(f'The page {url} has no title.')
+        article_soup = soup.find(id=content_id)
+        if article_soup is None:
+            self._on_rules_miss(url, content_id)
+        return article_soup, new_title.text, self._parse_url_next(soup, url)
+
+    def _fetch_page(self, url: str) -> Union[str, _ExtractedPage]:
+        """
+        One attempt to get the page. Retrying is up to the caller(see RetryJob).
+
+        The first pages go through the browser. Once a browser passed the check of the site, its cookies and UA are
+        handed off to the requests session and the next pages are fetched over plain HTTP, the browser is only used
+        again when the check shows up.
+
+        :return: the page source, or the parts of it read in the browser(see browser_in_page_extraction)
+        """
+        if self._handoff_user_agent is not None:
+            html = self._fetch_page_by_http(url)
+            if html is not None:
                 return html
-            except PageContentIllegalException as e:
-                self.logger.warn(f"{e.message}")
-            except Exception as e:
-                self.logger.warn(f"{url} encountered {e.__class__.__name__}.")
-
-            request_count += 1
-            # 指数退避参考 https://cloud.google.com/memorystore/docs/redis/exponential-backoff?hl=zh-cn#example_algorithm
-            # 具体逻辑：
-            # 1.向服务器特定API发出请求。
-            # 2.如果请求失败，请等待 1 + random_number_milliseconds 秒后再重试请求。
-            # 3.如果请求失败，请等待 2 + random_number_milliseconds 秒后再重试请求。
-            # 4.如果请求失败，请等待 4 + random_number_milliseconds 秒后再重试请求。
-            # 5.依此类推，等待时间上限为 maximum_backoff。
-            # 等待时间达到上限后，您可以继续等待并重试，直到达到重试次数上限（但接下来的重试操作不会增加各次重试之间的等待时间）。
-
-            # 等待时间为 min(((2^n)+random_number_seconds), maximum_backoff)，其中，n 会在每次迭代（请求）后增加 1。
-            # 其中：
-            # - random_number_seconds 是小于1的秒数（随机值）。
-            # - maximum_backoff 设置为一个较大的容忍值，这里设置为10s。这是基于经验的估计。
-            n = request_count
-            random_number_seconds = round(random.uniform(0, 1), 2)  # 0.01-0.99s
-            maximum_backoff = 10
-            retry_interval = min(round(((2 ** (n - 1)) + random_number_seconds), 2), maximum_backoff)
-
-            self.logger.warning(
-                f'Retrying {url}({request_count}/{max_retries})...; retry_interval: {retry_interval}(s)')
-            time.sleep(retry_interval)
 
+        # resource=url: a page fetched both over HTTP and by browser is counted as a repeat
+        return self.http_client.single_flight.do_sync(f'BROWSER {url}', functools.partial(self._fetch_page_by_browser, url),
+                                                      resource=url)
+
+    def _fetch_page_by_browser(self, url: str) -> Union[str, _ExtractedPage]:
+        driver = self._browser_pool.driver()
+
+        limiter = self.http_client.rate_limiters.for_url(url)
+        limiter.acquire_blocking(self._crawl_delay_of(url))
+        # the browser doesn't expose status code: None => keep limits, 200 => healthy.
+        # a throttle page(You are being rate limited) is detected by limiter itself.
+        status = None
+        html = None
+        try:
+            driver.get(url)
+            if self._lean_mode:
+                self._wait_for_content(driver, url)
+
+            # Determine whether the content of the page has the following tags:
+            # - You are being rate limited
+            # - 抱歉，章节内容不支持该浏览器显示
+            if self._in_page_extraction:
+                payload = driver.execute_script(_EXTRACT_PAGE_SCRIPT, self._mapping_result.content_id,
+                                                _FAILED_PAGE_MARKERS)
+                # the limiter only needs the marker
+                html = payload['marker'] or ''
+                page = _ExtractedPage(title=payload['title'], content=payload['content'],
+                                      url_next=payload['url_next'])
+            else:
+                html = page = driver.page_source
+
+            for pattern in _FAILED_PAGE_MARKERS:
+                if pattern in html:
+                    # the retry gets a fresh browser(new session and cookies)
+                    self._browser_pool.discard(f'{pattern} at {url}')
+                    if pattern == _THROTTLE_MARKER:
+                        raise ThrottledException(f'The page {url} is a throttle page.')
+                    raise PageContentIllegalException(f'The page content of {url} is not desired.')
+
+            status = 200
+            self._hand_off_cookies(driver)
+            return page
+        finally:
+            limiter.release(status, html)
+
+    def _fetch_page_by_http(self, url: str) -> Optional[str]:
+        """
+        One request, retrying is up to the caller as for the browser. The http cache is bypassed: a copy cached before
+        the handoff may be the check of the site, and the limiter is only paid for real requests.
+
+        :return: the page, or None if the browser should take over, e.g. the check of the site shows up again.
+        """
+        headers = {**self.request_headers(), 'User-Agent': self._handoff_user_agent, **BYPASS_HEADERS}
+        limiter = self.http_client.rate_limiters.for_url(url)
+        limiter.acquire_blocking(self._crawl_delay_of(url))
+        resp = None
+        try:
+            # a key of its own: not the same request as get_sync() of the same url(headers, retries)
+            resp = self.http_client.single_flight.do_sync(
+                f'HANDOFF GET {url}',
+                functools.partial(self.http_client.sync_transport.fetch_sync, 'GET', url, headers=headers,
+                                  timeout=self.spider_settings["http_timeout"]),
+                resource=url)
+        finally:
+            limiter.release(resp.status if resp is not None else None, resp.text if resp is not None else None)
+
+        if resp.status != 200:
+            raise error_for_status(resp.status, url)
+        if is_throttled_response(resp.status, resp.text):
+            raise ThrottledException(f'The page {url} is a throttle page.')
+        if _BROWSER_CHECK_MARKER not in resp.text:
+            with self._handoff_lock:
+                self._handoff_failures = 0
+            return resp.text
+
+        with self._handoff_lock:
+            self._handoff_failures += 1
+            give_up = self._handoff_failures >= settings.BROWSER_HANDOFF_MAX_FAILURES
+            if give_up:
+                self._handoff_enabled = False
+                self._handoff_user_agent = None
+        if give_up:
+            self.logger.warning(f'The check of the site showed up {self._handoff_failures} times in a row over HTTP, '
+                                f'the rest pages are fetched by browser.')
+        else:
+            self.logger.info(f'The check of the site showed up at {url}, fall back to browser.')
         return None
 
-    def _init_browser_driver(self):
+    def _hand_off_cookies(self, driver: webdriver.Chrome) -> None:
+        """
+        Copy the cookies and UA of a browser which just passed the check into the requests session.
+        """
+        if not self._handoff_enabled:
+            return
+        try:
+            cookies = driver.get_cookies()
+            user_agent = driver.execute_script('return navigator.userAgent')
+        except WebDriverException:
+            return
+
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'],
+                                     domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        with self._handoff_lock:
+            if not self._handoff_enabled:
+                return
+            first_handoff = self._handoff_user_agent is None
+            self._handoff_user_agent = user_agent
+        if first_handoff:
+            self.logger.info(f'Browser cookies are handed off, pages are fetched over HTTP from now on: '
+                             f'{[c["name"] for c in cookies]}')
+
+    def _create_browser_driver(self, index: int) -> webdriver.Chrome:
+        """
+        A new driver without warm-up, which is done by BrowserDriverPool.
+
+        :param index: the crawl worker, each one has its own profile folder(a profile can't be opened twice)
+        """
+        ua = 'Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Mobile/15E148 Safari/604.1'
+        if self._browser_debugger_address:
+            return self._attach_browser_driver(ua)
+
         chrome_options = Options()
         # 无头模式
         if not self.spider_settings["not_headless"]:
             chrome_options.add_argument("--headless")
+        if self._lean_mode:
+            # get() returns at DOMContentLoaded, see _wait_for_content()
+            chrome_options.page_load_strategy = 'eager'
 
         # 添加自定义 User-Agent
-        ua = 'Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Mobile/15E148 Safari/604.1'
         chrome_options.add_argument(f"user-agent={ua}")
 
+        if self._browser_profile_folder:
+            profile = os.path.abspath(os.path.join(self._browser_profile_folder, f'linovelib-{index}'))
+            chrome_options.add_argument(f'--user-data-dir={profile}')
+
         # [ERROR:ssl_client_socket_impl.cc(970)] handshake failed;
         # => these arguments are NOT WORK
         chrome_options.add_argument('--ignore-certificate-errors')
@@ -335,83 +707,94 @@ class LinovelibMobileSpider(BaseNovelWebsiteSpider):
         # page timeout
         timeout = self.spider_settings["http_timeout"] or 10
         driver.set_page_load_timeout(timeout)
-
-        # hardcode one url is ok
-        url = 'https://www.bilinovel.com/'
-        driver.get(url)
-        # 这个刷新只需要初始化一次，是因为第一次 get 无法得到正常结果。后续的请求都不再需要刷新。
-        driver.refresh()
+        if self._lean_mode:
+            self._make_lean(driver)
         self.logger.info(' 初始化 Driver 完毕...')
+        return driver
 
-        self._driver = driver
+    def _attach_browser_driver(self, ua: str) -> webdriver.Chrome:
+        """
+        A driver in a new tab of the long-lived browser, which is launched by the first run.
+        """
+        with self._browser_launch_lock:
+            profile = os.path.join(self._browser_profile_folder, 'shared') if self._browser_profile_folder else None
+            ensure_debuggable_browser(self._browser_debugger_address, os.path.abspath(profile) if profile else None,
+                                      browser_path=self.spider_settings.get('browser_path'),
+                                      headless=not self.spider_settings["not_headless"], logger=self.logger)
 
-    def apply_crawl_delay(self, delay_name):
-        crawl_delay = self.spider_settings.get(delay_name, None)
-        if crawl_delay:
-            time.sleep(crawl_delay)
-            self.logger.debug(f'Apply {delay_name}(s): {crawl_delay}')
+        chrome_options = Options()
+        chrome_options.debugger_address = self._browser_debugger_address
+        if self._lean_mode:
+            chrome_options.page_load_strategy = 'eager'
+        driver = AttachedChrome(options=chrome_options)
+        # the browser is already launched, so the UA is set on the tab
+        driver.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': ua})
+        driver.set_page_load_timeout(self.spider_settings["http_timeout"] or 10)
+        if self._lean_mode:
+            self._make_lean(driver)
+        self.logger.info(f'Attached to the browser on {self._browser_debugger_address}.')
+        return driver
 
-    def _expand_paginated_chapter_links(self, chapter: CatalogLinovelibMobileChapter, url_next):
-        # fix broken links in place(catalog_lis) if exits
-        # - if chapter[1] is valid link, assign it to url_next
-        # - if chapter[1] is not a valid link,e.g. "javascript:cid(0)" etc. use url_next
-        if not self._is_valid_chapter_link(chapter.chapter_url):
-            # now the url_next value is the correct link of of chapter[1].
-            chapter.chapter_url = url_next
-        else:
-            url_next = chapter.chapter_url
-
-        # goal: solve all page links of a certain chapter
-        while True:
-            resp = requests_get_with_retry(self.session, url_next,
-                                           headers=self.request_headers(),
-                                           retry_max=self.spider_settings['http_retries'],
-                                           timeout=self.spider_settings["http_timeout"],
-                                           logger=self.logger)
-            if resp:
-                soup = BeautifulSoup(resp.text, 'lxml')
-            else:
-                raise Exception(f'[ERROR]: request {url_next} failed.')
+    @staticmethod
+    def _make_lean(driver: webdriver.Chrome) -> None:
+        """
+        Block images, fonts, media, ads and analytics in the tab of the driver. It's done over CDP but not by chrome
+        preferences, so a persistent profile or an attached browser is left as is.
+        """
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': _LEAN_BLOCKED_URLS})
 
-            first_script = soup.find("body", {"id": "aread"}).find("script")
-            first_script_text = first_script.text
-            # alternative: use split(':')[-1] to get read_params_text
-            read_params_text = first_script_text[len('var ReadParams='):]
-            read_params_json = demjson3.decode(read_params_text)
-            url_next = urljoin(f'{self.spider_settings["base_url"]}/novel', read_params_json['url_next'])
+    def _wait_for_content(self, driver: webdriver.Chrome, url: str) -> None:
+        """
+        With the eager page load strategy, get() returns before the page is complete: wait until #atitle and the
+        content node are in the DOM. A throttle or check page ends the wait at once, it's detected by the caller.
+        """
+        timeout = self.spider_settings["http_timeout"] or 10
+        content_id = self._mapping_result.content_id
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+                lambda d: d.execute_script(_CONTENT_READY_SCRIPT, content_id))
+        except TimeoutException:
+            # read what is there, _fetch_page_with_title() raises if the title is missing
+            self.logger.debug(f'The content of {url} is not ready after {timeout}s.')
 
-            if '_' in url_next:
-                chapter.add_expand_paginated_chapter_url(url_next)
-            else:
-                break
+    def _crawl_delay_of(self, page_link: str) -> float:
+        """
+        Politeness delay before fetching the page: page_crawl_delay, plus chapter_crawl_delay for the first page of a
+        chapter(e.g. 83547.html but not 83547_2.html).
 
-        return url_next
+        It's waited by the limiter of the host(see HostRateLimiter.acquire_blocking()) and counts from the last request
+        to the site, so it only gates the next request: parsing of the fetched pages goes on meanwhile.
+        """
+        crawl_delay = self.spider_settings.get('page_crawl_delay') or 0
+        if not _PAGINATED_PAGE_LINK.search(page_link):
+            crawl_delay += self.spider_settings.get('chapter_crawl_delay') or 0
+        return crawl_delay
 
-    def _remove_duplicate_images_in_html(self, chapter_list):
+    def _remove_duplicate_images_in_html(self, chapter_list: List[LightNovelChapter]) -> None:
         # removing duplicate images in the first chapter
         # chapter_list[0] 表示这一卷的第 1 个章节，在 bilinovel 中是插图页，这个页面部分插图会重复，会出现在这一卷的后续章节中。
         # chapter_list[1:] 表示这一卷的第 2 个章节开始的所有章节，也就是正文章节。
 
         # 这个函数的作用就是将某一卷的第 1 个章节（插图章节）HTML 的所有重复图片 img 元素，全部去掉。
-
-        def _filter_duplicate_images(match, img_src_list):
-            img = match.group()
-            img_src = re.search('(?<= src=").*?(?=")', img).group()
-            if img_src in img_src_list:
-                self.logger.info(f'Remove duplicate image in the first chapter... {img_src}')
-                return ""
-            else:
-                return img
-
-        img_src_list = []
-
-        for chapter in chapter_list[1:]:
-            img_src_list.extend(
-                [re.search('(?<= src=").*?(?=")', i).group() for i in re.findall('<img.*?/>', chapter.content)]
-            )
-        chapter_list[0].content = re.sub('<img.*?/>',
-                                         lambda match: _filter_duplicate_images(match, img_src_list),
-                                         chapter_list[0].content)
+        if not chapter_list or not chapter_list[0].illustrations:
+            return
+
+        first_chapter = chapter_list[0]
+        image_index = VolumeImageIndex.from_chapters(chapter_list)
+        image_folder = self.spider_settings["image_download_folder"]
+        duplicate_srcs = {f'{image_folder}/{image.local_relative_path}' for image in first_chapter.illustrations
+                          if image_index.chapters_of(image) != [first_chapter.chapter_id]}
+        if not duplicate_srcs:
+            return
+
+        def _filter_duplicate_images(match: re.Match) -> str:
+            if match.group(1) in duplicate_srcs:
+                self.logger.info(f'Remove duplicate image in the first chapter... {match.group(1)}')
+                return ''
+            return match.group()
+
+        first_chapter.content = _IMG_TAG.sub(_filter_duplicate_images, first_chapter.content)
 
     @staticmethod
     def _handle_select_volume(catalog_list: List[CatalogLinovelibMobileVolume]):
@@ -1,10 +1,12 @@
 import asyncio
+import functools
 import json
+import os
 import re
 import sys
 import time
 from dataclasses import dataclass, field
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional
 from urllib.parse import urljoin
 
 import aiohttp
@@ -16,10 +18,12 @@ from lxml import html
 from rich.prompt import Confirm
 
 from linovelib2epub.models import LightNovel, LightNovelImage, CatalogMasiroChapter, CatalogMasiroVolume
+from linovelib2epub.network import HttpClientManager, RateLimitPolicy, RetryBudget, is_throttled_response
 from linovelib2epub.spider import BaseNovelWebsiteSpider
 from linovelib2epub.utils import aiohttp_get_with_retry, aiohttp_post_with_retry, requests_get_with_retry
 from .config import env_settings
-from ..exceptions import LinovelibException
+from .. import settings
+from ..exceptions import LinovelibException, RetryableHttpException
 
 
 @dataclass
@@ -38,9 +42,13 @@ class LoginSessionState:
 
 
 class MasiroSpider(BaseNovelWebsiteSpider):
+    # one browser tab => one page at a time. masiro is strict, start at one page per 3s(the old fixed sleep).
+    RATE_LIMIT_POLICY = RateLimitPolicy(initial_concurrency=1, max_concurrency=1,
+                                        initial_rate=1 / 3, min_rate=0.05, max_rate=1.0, rate_step=0.1,
+                                        throttle_cooldown=10.0)
 
-    def __init__(self, spider_settings: Dict[str, Any]):
-        super().__init__(spider_settings)
+    def __init__(self, spider_settings: Dict[str, Any], http_client: Optional[HttpClientManager] = None):
+        super().__init__(spider_settings, http_client)
 
         # read user secrets
         self._masiro_username = env_settings.get("MASIRO_LOGIN_USERNAME")
@@ -48,10 +56,8 @@ class MasiroSpider(BaseNovelWebsiteSpider):
         if (not self._masiro_username) or (not self._masiro_password):
             raise LinovelibException("Masiro account is not found. About configuration, check the documentation.")
 
-        self.FETCH_CHAPTER_CONCURRENCY_LEVEL = 1
-
     def fetch(self) -> LightNovel:
-        novel = asyncio.run(self._fetch())
+        novel = self.http_client.run(self._fetch())
         return novel
 
     async def _fetch(self) -> LightNovel:
@@ -127,76 +133,36 @@ class MasiroSpider(BaseNovelWebsiteSpider):
                     self.logger.info("用户积分余额足够，但是决定不购买，程序退出。")
                     sys.exit()
 
-    async def download_pages(self, session: WebPage, page_url_set: set) -> Dict[str, str]:
-        self.logger.info(f'page url set = {len(page_url_set)}')
-
-        url_to_page = {url: 'NOT_DOWNLOAD_READY' for url in page_url_set}
-
-        # use semaphore to control concurrency
-        max_concurrency = self.FETCH_CHAPTER_CONCURRENCY_LEVEL
-        semaphore = asyncio.Semaphore(max_concurrency)
-
-        self.logger.info(f'DOWNLOAD_PAGES concurrency level: {max_concurrency}.')
-
-        tasks = {asyncio.create_task(self._download_page(session, semaphore, url), name=url)
-                 for url in page_url_set}
-        pending: set = tasks
-        succeed_count = 0
-
-        while pending:
-            done, pending = await asyncio.wait(pending, return_when=asyncio.ALL_COMPLETED)
-            # Note: This does not raise TimeoutError! Futures that aren't done when the timeout occurs
-            # are returned in the second set
-
-            # 1. succeed => normal result in done(# HAPPY CASE)
-            # 2. Timeout => No TimeoutError, put timeout tasks in pending(SAD CASE(need retry))
-            # 3  Other Exception before timeout => (SAD CASE(need retry)
+    async def _download_page(self, session: WebPage, url) -> str | None:
+        limiter = self.http_client.rate_limiters.for_url(url)
+        await limiter.acquire()
 
-            for done_task in done:
-                exception = done_task.exception()
-                task_url = done_task.get_name()
-
-                if exception is None:
-                    url_to_page[task_url] = done_task.result()
-                    succeed_count += 1
-                else:
-                    # [TEST]make connect=.1 to reach this branch, should retry all the urls that entered this case
-                    self.logger.error(
-                        f'{exception.__class__.__name__}: {task_url} should retry.')
-                    pending.add(
-                        asyncio.create_task(self._download_page(session, semaphore, task_url), name=task_url))
-
-            self.logger.info(f'SUCCEED_COUNT: {succeed_count}')
-            self.logger.info(f'[NEXT TURN]Pending task count: {len(pending)}')
-
-        # ASSERTION: make sure data is ok.
-        for page_content in url_to_page.values():
-            if page_content == "NOT_DOWNLOAD_READY":
-                raise LinovelibException('天啊，发生什么事了。如果这个断言被触发，那么证明代码逻辑有问题。')
-
-        return url_to_page
-
-    async def _download_page(self, session: WebPage, semaphore, url) -> str | None:
-        async with semaphore:
-            is_url_available = session.get(url, headers=self.request_headers(), retry=10, interval=3, timeout=10)
+        html = None
+        try:
+            # retrying is up to the retry engine(see BaseNovelWebsiteSpider.download_pages), not the browser.
+            is_url_available = session.get(url, headers=self.request_headers(), retry=0, timeout=10)
+            if not is_url_available:
+                # session.html would be the previous page
+                raise RetryableHttpException(f'fetch page url {url} failed.')
             loaded = session.wait.doc_loaded()
-            # 多等待，少被ban
-            await asyncio.sleep(3)
 
             html = session.html
             if html:
-                if "访问频繁" in html:
+                if is_throttled_response(None, html):
                     # <title>429 Too Many Requests</title>
                     # <h3 style="font-size: 32px;">
                     # 访问频繁，歇会吧您内。
                     # </h3>
-                    raise LinovelibException(f'429 Too Many Requests when downloading {url}')
+                    raise RetryableHttpException(f'429 Too Many Requests when downloading {url}')
                 self.logger.info(f'page {url} => ok.')
                 return html
             else:
                 # ...... => should retry
                 self.logger.error(f'page {url} => should retry.')
-                raise LinovelibException(f'fetch page url {url} failed with error status ?.')
+                raise RetryableHttpException(f'fetch page url {url} failed with error status ?.')
+        finally:
+            # the browser doesn't expose status code, judge by page content
+            limiter.release(200 if html else None, html)
 
     def _login_by_browser(self) -> LoginSessionState:
         # see https://g1879.gitee.io/drissionpagedocs/get_start/before_start
@@ -226,6 +192,16 @@ class MasiroSpider(BaseNovelWebsiteSpider):
         for argument in arguments:
             co.set_argument(argument)
 
+        # keep the login, cache and cloudflare clearance across runs
+        profile_folder = self.spider_settings.get('browser_profile_folder', settings.BROWSER_PROFILE_FOLDER)
+        if profile_folder:
+            co.set_user_data_path(os.path.abspath(os.path.join(profile_folder, 'masiro')))
+        # attach to the long-lived browser if it's running, else DrissionPage launches one on this address, which
+        # is left running for the next runs
+        debugger_address = self.spider_settings.get('browser_debugger_address', settings.BROWSER_DEBUGGER_ADDRESS)
+        if debugger_address:
+            co.set_address(debugger_address)
+
         page = WebPage(chromium_options=co)
         login_url = MasiroLoginInfo.login_url
         # <input type="hidden" name="_token" value="???">
@@ -354,7 +330,8 @@ class MasiroSpider(BaseNovelWebsiteSpider):
 
         # 2. do login (HTTP POST)
         result = await aiohttp_post_with_retry(session, login_info.login_url, params=login_param,
-                                               headers=login_headers)
+                                               headers=login_headers, logger=self.logger,
+                                               retry_engine=self.http_client.retry_engine)
         # {"code":1,"msg":"\u767b\u5f55\u6210\u529f!","url":"https:\/\/masiro.me"}
 
         # now this session is already logged.
@@ -365,7 +342,8 @@ class MasiroSpider(BaseNovelWebsiteSpider):
                                                         session: aiohttp.ClientSession,
                                                         login_info):
 
-        html_text = await aiohttp_get_with_retry(session, url, self.request_headers())
+        html_text = await aiohttp_get_with_retry(session, url, self.request_headers(), logger=self.logger,
+                                                 retry_engine=self.http_client.retry_engine)
 
         self._check_user_level_limit(html_text, url)
 
@@ -492,44 +470,7 @@ class MasiroSpider(BaseNovelWebsiteSpider):
         max_concurrency = 2
         semaphore = asyncio.Semaphore(max_concurrency)
 
-        tasks = {
-            asyncio.create_task(_pay_chapter_func(session, semaphore, login_info, chapter_id, chapter_cost),
-                                name=chapter_id)
-            for chapter_id, chapter_cost in chapter_to_pay.items()
-        }
-        pending: set = tasks
-        succeed_count = 0
-
-        while pending:
-            done, pending = await asyncio.wait(pending, return_when=asyncio.ALL_COMPLETED)
-            # Note: This does not raise TimeoutError! Futures that aren't done when the timeout occurs
-            # are returned in the second set
-
-            # 1. succeed => normal result in done(# HAPPY CASE)
-            # 2. Timeout => No TimeoutError, put timeout tasks in pending(SAD CASE(need retry))
-            # 3  Other Exception before timeout => (SAD CASE(need retry)
-
-            for done_task in done:
-                exception = done_task.exception()
-                chapter_id = done_task.get_name()
-
-                if exception is None:
-                    # done_task.result()
-                    succeed_count += 1
-                else:
-                    # [TEST]make connect=.1 to reach this branch, should retry all the tasks that entered this case
-                    self.logger.info(f'Exception: {type(exception)}')
-                    self.logger.info(f'FAIL: {chapter_id}; should retry paying this chapter_id.')
-                    pending.add(
-                        asyncio.create_task(
-                            _pay_chapter_func(session, semaphore, login_info, chapter_id, chapter_to_pay[chapter_id]),
-                            name=chapter_id)
-                    )
-
-            self.logger.info(f'SUCCEED_COUNT: {succeed_count}')
-            self.logger.info(f'[NEXT TURN]Pending task count: {len(pending)}')
-
-        self.logger.info(f'All payment of chapters were successful.')
+        await self._run_payments(_pay_chapter_func, session, semaphore, login_info, chapter_to_pay)
 
     async def _pay_chapters(self, session, login_info, chapter_to_pay: Dict[str, int]):
         self.logger.info(f'len of chapter_to_pay = {len(chapter_to_pay)}')
@@ -541,40 +482,20 @@ class MasiroSpider(BaseNovelWebsiteSpider):
         semaphore = asyncio.Semaphore(max_concurrency)
 
         async with session:
-            tasks = {asyncio.create_task(_pay_chapter_func(session, semaphore, login_info, chapter_id, chapter_cost),
-                                         name=chapter_id)
-                     for chapter_id, chapter_cost in chapter_to_pay.items()}
-            pending: set = tasks
-            succeed_count = 0
-
-            while pending:
-                done, pending = await asyncio.wait(pending, return_when=asyncio.ALL_COMPLETED)
-                # Note: This does not raise TimeoutError! Futures that aren't done when the timeout occurs
-                # are returned in the second set
-
-                # 1. succeed => normal result in done(# HAPPY CASE)
-                # 2. Timeout => No TimeoutError, put timeout tasks in pending(SAD CASE(need retry))
-                # 3  Other Exception before timeout => (SAD CASE(need retry)
-
-                for done_task in done:
-                    exception = done_task.exception()
-                    chapter_id = done_task.get_name()
-
-                    if exception is None:
-                        # done_task.result()
-                        succeed_count += 1
-                    else:
-                        # [TEST]make connect=.1 to reach this branch, should retry all the tasks that entered this case
-                        self.logger.info(f'Exception: {type(exception)}')
-                        self.logger.info(f'FAIL: {chapter_id}; should retry paying this chapter_id.')
-                        pending.add(
-                            asyncio.create_task(_pay_chapter_func(session, semaphore, login_info, chapter_id,
-                                                                  chapter_to_pay[chapter_id]),
-                                                name=chapter_id)
-                        )
+            await self._run_payments(_pay_chapter_func, session, semaphore, login_info, chapter_to_pay)
+
+    async def _run_payments(self, _pay_chapter_func, session, semaphore, login_info, chapter_to_pay: Dict[str, int]):
+        pay_url = 'https://masiro.me/admin/pay'
+        job = self.http_client.retry_engine.job('payments', budget=RetryBudget())
+        await asyncio.gather(*(job.run(pay_url, functools.partial(_pay_chapter_func, session, semaphore, login_info,
+                                                                  chapter_id, chapter_cost))
+                               for chapter_id, chapter_cost in chapter_to_pay.items()),
+                             return_exceptions=True)
+        job.report()
 
-                self.logger.info(f'SUCCEED_COUNT: {succeed_count}')
-                self.logger.info(f'[NEXT TURN]Pending task count: {len(pending)}')
+        if job.failures:
+            raise LinovelibException(f'{len(job.failures)} of {len(chapter_to_pay)} chapter payments failed, '
+                                     f'see [RetryReport] in log.')
 
         self.logger.info(f'All payment of chapters were successful.')
 
@@ -594,10 +515,10 @@ class MasiroSpider(BaseNovelWebsiteSpider):
                 else:
                     # resp None or
                     # resp is not None but is not a json string
-                    raise LinovelibException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
+                    raise RetryableHttpException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
             except Exception as e:
                 self.logger.debug(f'chapter payment ({chapter_id}) failed. {e=}')
-                raise LinovelibException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
+                raise RetryableHttpException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
 
     async def _pay_chapter(self, session, semaphore, login_info, chapter_id, chapter_cost):
         async with semaphore:
@@ -605,15 +526,16 @@ class MasiroSpider(BaseNovelWebsiteSpider):
             pay_params = {'type': '2', 'object_id': chapter_id, 'cost': chapter_cost}
             pay_headers = self._build_login_headers(login_info=login_info)
             try:
-                resp = await aiohttp_post_with_retry(session, url=pay_url, params=pay_params, headers=pay_headers)
+                resp = await aiohttp_post_with_retry(session, url=pay_url, params=pay_params, headers=pay_headers,
+                                                     retry_max=0)
                 if resp and json.loads(resp)['code'] == 1:
                     self.logger.info(f'[SUCCESS] pay for chapter {chapter_id} with cost {chapter_cost}.')
                 else:
                     # resp None or
                     # resp is not None but is not a json string
-                    raise LinovelibException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
+                    raise RetryableHttpException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
             except Exception as e:
-                raise LinovelibException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
+                raise RetryableHttpException(f"[FAIL] pay for chapter {chapter_id} with cost {chapter_cost}.")
 
     def _convert_to_catalog_list(self, html_text) -> List[CatalogMasiroVolume]:
         """
@@ -770,7 +692,8 @@ class MasiroSpider(BaseNovelWebsiteSpider):
         }
 
     async def _masiro_get_token(self, login_info: MasiroLoginInfo, session):
-        res = await aiohttp_get_with_retry(session, login_info.login_url, self.request_headers(), logger=self.logger)
+        res = await aiohttp_get_with_retry(session, login_info.login_url, self.request_headers(), logger=self.logger,
+                                           retry_engine=self.http_client.retry_engine)
 
         page_body = html.fromstring(res)
         token = str(page_body.xpath('//input[@class=\'csrf\']/@value')[0])
@@ -1,25 +1,31 @@
-import asyncio
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
-import aiohttp
 import inquirer
 from bs4 import BeautifulSoup
+from lxml import etree, html
 
 from linovelib2epub.logger import Logger
 from linovelib2epub.models import LightNovel, LightNovelImage, CatalogBaseVolume, CatalogBaseChapter
+from linovelib2epub.network import REVALIDATE_HEADERS, HttpClientManager, RateLimitPolicy
 from linovelib2epub.spider import BaseNovelWebsiteSpider
-from linovelib2epub.utils import aiohttp_get_with_retry
 
 WENKU8_SITE_BASE_URL = "https://www.wenku8.net"
 
+# volume(vcss) and chapter(ccss) cells of the catalog table, in document order
+_CATALOG_CELLS = etree.XPath('(//table)[1]//td[contains(concat(" ", normalize-space(@class), " "), " vcss ") '
+                             'or contains(concat(" ", normalize-space(@class), " "), " ccss ")]')
+
 
 class Wenku8Spider(BaseNovelWebsiteSpider):
+    # start like the old fixed level 2, grow while wenku8 stays healthy
+    RATE_LIMIT_POLICY = RateLimitPolicy(initial_concurrency=2, max_concurrency=6, initial_rate=2.0, max_rate=8.0)
+    # finished books are static html
+    RESPONSE_CACHE_TTL = 7 * 24 * 3600
 
-    def __init__(self, spider_settings: Dict[str, Any]):
-        super().__init__(spider_settings)
+    def __init__(self, spider_settings: Dict[str, Any], http_client: Optional[HttpClientManager] = None):
+        super().__init__(spider_settings, http_client)
         self._catalog_url = ""
-        self.FETCH_CHAPTER_CONCURRENCY_LEVEL = 2
 
     def request_headers(self) -> Dict[str, Any]:
         return {
@@ -30,29 +36,24 @@ class Wenku8Spider(BaseNovelWebsiteSpider):
         }
 
     def fetch(self) -> LightNovel:
-        novel = asyncio.run(self._fetch())
+        novel = self.http_client.run(self._fetch())
         return novel
 
     async def _fetch(self) -> LightNovel:
-        jar = aiohttp.CookieJar(unsafe=True)
-        conn = aiohttp.TCPConnector(ssl=False)
-        trust_env = False if self.spider_settings["disable_proxy"] else True
-        timeout = aiohttp.ClientTimeout(total=30, connect=15)
-
-        async with aiohttp.ClientSession(trust_env=trust_env, timeout=timeout, connector=conn,
-                                         cookie_jar=jar) as session:
-            novel, catalog_url = await self._fetch_basic_info(session)
-            self._catalog_url = catalog_url
-            await self._fetch_catalog_content(session, novel)
-            return novel
-
-    async def _fetch_basic_info(self, session) -> tuple[LightNovel, str]:
+        # all requests go through self.http_client, no session of our own
+        novel, catalog_url = await self._fetch_basic_info()
+        self._catalog_url = catalog_url
+        await self._fetch_catalog_content(novel)
+        return novel
+
+    async def _fetch_basic_info(self) -> tuple[LightNovel, str]:
         # index url
         # https://www.wenku8.net/book/2961.htm
         book_id = self.spider_settings["book_id"]
         book_index_url = f"https://www.wenku8.net/book/{book_id}.htm"
-        page_text = await aiohttp_get_with_retry(session, book_index_url, headers=self.request_headers(),
-                                                 logger=self.logger)
+        # the book info and the catalog are revalidated, an ongoing book changes. The chapters are served from cache.
+        page_text = await self.http_client.get_text(book_index_url,
+                                                    headers={**self.request_headers(), **REVALIDATE_HEADERS})
 
         soup = BeautifulSoup(page_text, 'lxml')
         title = soup.select_one("#content table:nth-child(1) span b").text
@@ -82,15 +83,15 @@ class Wenku8Spider(BaseNovelWebsiteSpider):
 
         return new_novel, catalog_url
 
-    async def _fetch_catalog_content(self, session, novel):
-        catalog_html = await aiohttp_get_with_retry(session, self._catalog_url, self.request_headers(),
-                                                    logger=self.logger)
+    async def _fetch_catalog_content(self, novel):
+        catalog_html = await self.http_client.get_text(self._catalog_url,
+                                                       headers={**self.request_headers(), **REVALIDATE_HEADERS})
 
         catalog_list: List[CatalogBaseVolume] = self._convert_to_catalog_list(catalog_html)
         if self.spider_settings['select_volume_mode']:
             catalog_list = self._handle_select_volume(catalog_list)
 
-        await self.fetch_chapters(session, catalog_list, novel)
+        await self.fetch_chapters(None, catalog_list, novel)
 
     def _convert_to_catalog_list(self, catalog_html) -> List[CatalogBaseVolume]:
         # => volume title
@@ -106,54 +107,42 @@ class Wenku8Spider(BaseNovelWebsiteSpider):
         # => volume title
         # <td class="vcss" colspan="4" vid="146004">第二卷</td>
 
-        soup = BeautifulSoup(catalog_html, 'lxml')
-        catalog_items = soup.find('table').find_all('td')
-
+        # one pass over the cells with a compiled XPath, see playground/benchmark/wenku8_catalog.py
         catalog_list: List[CatalogBaseVolume] = []
+        # the 插图 chapters of the current volume, the others
+        illustration_chapters: List[CatalogBaseChapter] = []
+        other_chapters: List[CatalogBaseChapter] = []
+        catalog_url_prefix = self._catalog_url.rsplit("/", 1)[0]
 
-        _current_chapters: List[CatalogBaseChapter] = []
-        _current_volume_title = ""
-        _volume_index = 0
+        def _close_volume() -> None:
+            if catalog_list:
+                # the last 插图 goes first, as the former insert(0, ...) did
+                catalog_list[-1].chapters = illustration_chapters[::-1] + other_chapters
 
-        for idx, catalog_item in enumerate(catalog_items):
-            catalog_item_text = catalog_item.text
-            item_css_class = catalog_item['class']
+        for catalog_item in _CATALOG_CELLS(html.fromstring(catalog_html)):
+            catalog_item_text = catalog_item.text_content()
 
             # is volume title
-            if 'vcss' in item_css_class:
-                _volume_index += 1
-
-                # reset current_* variables
-                _current_volume_title = catalog_item_text
-                _current_chapters: List[CatalogBaseChapter] = []
-
-                new_volume = CatalogBaseVolume(
-                    vid=_volume_index,
-                    volume_title=_current_volume_title,
-                    chapters=_current_chapters
-                )
-
-                catalog_list.append(new_volume)
-            # is chapter
-            elif 'ccss' in item_css_class:
-                # bug case : https://www.wenku8.net/novel/3/3500/index.htm
-                if catalog_item.find("a") and catalog_item.find("a")['href']:
-                    href = catalog_item.find("a")["href"]
-                    # https://www.wenku8.net/novel/2/2961/index.htm + 146006.htm => https://www.wenku8.net/novel/2/2961/146006.htm
-                    chapter_url = f'{self._catalog_url.rsplit("/", 1)[0]}/{href}'
-
-                    new_chapter: CatalogBaseChapter = CatalogBaseChapter(
-                        chapter_title=catalog_item_text,
-                        chapter_url=chapter_url
-                    )
-
-                    if catalog_item_text == '插图':
-                        _current_chapters.insert(0, new_chapter)
-                    else:
-                        _current_chapters.append(new_chapter)
+            if 'vcss' in catalog_item.get('class').split():
+                _close_volume()
+                illustration_chapters, other_chapters = [], []
+                catalog_list.append(CatalogBaseVolume(vid=len(catalog_list) + 1, volume_title=catalog_item_text))
+                continue
+
+            # is chapter. bug case : https://www.wenku8.net/novel/3/3500/index.htm
+            link = catalog_item.find('.//a')
+            href = link.get('href') if link is not None else None
+            # a chapter before the first volume has no volume to go to
+            if not href or not catalog_list:
+                continue
+            # https://www.wenku8.net/novel/2/2961/index.htm + 146006.htm => https://www.wenku8.net/novel/2/2961/146006.htm
+            new_chapter = CatalogBaseChapter(chapter_title=catalog_item_text, chapter_url=f'{catalog_url_prefix}/{href}')
+            if catalog_item_text == '插图':
+                illustration_chapters.append(new_chapter)
             else:
-                pass
+                other_chapters.append(new_chapter)
 
+        _close_volume()
         return catalog_list
 
     @staticmethod
@@ -1,6 +1,6 @@
 import asyncio
+import hashlib
 import os
-import random
 import re
 import time
 from functools import wraps
@@ -9,8 +9,14 @@ from typing import Any, Callable, Dict, NoReturn
 
 import aiohttp
 import pkg_resources
+from PIL import Image
 from fake_useragent import UserAgent
 
+from .network.retry import RetryEngine, RetryPolicy, error_for_status
+
+# sub folder of image_download_folder for pre-transcoded images, see transcode_image_to_jpeg()
+TRANSCODED_IMAGE_FOLDER = 'transcoded'
+
 
 def cookiedict_from_str(cookie_str: str = '') -> Dict[str, str]:
     cookie: SimpleCookie[str] = SimpleCookie()
@@ -28,7 +34,8 @@ def random_useragent() -> str:
 
 def create_folder_if_not_exists(path: str) -> None:
     if not os.path.exists(path):
-        os.makedirs(path)
+        # exist_ok: download workers may create the same folder at the same time
+        os.makedirs(path, exist_ok=True)
 
 
 def requests_get_with_retry(client: Any,
@@ -36,50 +43,29 @@ def requests_get_with_retry(client: Any,
                             headers: Dict[str, Any] | None = None,
                             retry_max: int = 5,
                             timeout: int = 10,
-                            logger: Any = None) -> Any:
+                            logger: Any = None,
+                            retry_engine: RetryEngine | None = None) -> Any:
+    """
+    :param retry_engine: the shared engine of the run(HttpClientManager.retry_engine). If it's None, a standalone
+      engine with `retry_max` retries is used.
+    :return: response, or None if it still fails after retries.
+    """
     if headers is None:
         headers = {}
 
-    current_num_of_request: int = 0
-
-    while current_num_of_request <= retry_max:
-        try:
-            response = client.get(url, headers=headers, timeout=timeout)
-            if response:
-                return response
-            else:
-                if logger:
-                    logger.warning(f'Request {url} succeed but data is empty, retry {current_num_of_request + 1} times')
-        except (Exception,) as e:
-            if logger:
-                logger.error(f'Request {url} failed.', e)
-
-        current_num_of_request += 1
-        # 指数退避参考 https://cloud.google.com/memorystore/docs/redis/exponential-backoff?hl=zh-cn#example_algorithm
-        # 具体逻辑：
-        # 1.向服务器特定API发出请求。
-        # 2.如果请求失败，请等待 1 + random_number_milliseconds 秒后再重试请求。
-        # 3.如果请求失败，请等待 2 + random_number_milliseconds 秒后再重试请求。
-        # 4.如果请求失败，请等待 4 + random_number_milliseconds 秒后再重试请求。
-        # 5.依此类推，等待时间上限为 maximum_backoff。
-        # 等待时间达到上限后，您可以继续等待并重试，直到达到重试次数上限（但接下来的重试操作不会增加各次重试之间的等待时间）。
-
-        # 等待时间为 min(((2^n)+random_number_seconds), maximum_backoff)，其中，n 会在每次迭代（请求）后增加 1。
-        # 其中：
-        # - random_number_seconds 是小于1的秒数（随机值）。
-        # - maximum_backoff 设置为一个较大的容忍值，这里设置为10s。这是基于经验的估计。
-        n = current_num_of_request
-        random_number_seconds = round(random.uniform(0, 1), 2)  # 0.01-0.99s
-        maximum_backoff = 10
-        retry_interval = min(round(((2 ** (n - 1)) + random_number_seconds), 2), maximum_backoff)
-
-        if logger:
-            logger.warning(f'current_num_of_request: {current_num_of_request}; retry_interval: {retry_interval}(s)')
-
-        time.sleep(retry_interval)
-
-    logger.error(f'Request {url} failed after {retry_max} retries.')
-    return None
+    engine = retry_engine or RetryEngine(RetryPolicy(max_attempts=retry_max + 1), logger=logger)
+
+    def _get() -> Any:
+        response = client.get(url, headers=headers, timeout=timeout)
+        if response:
+            return response
+        # status >= 400
+        raise error_for_status(response.status_code, url)
+
+    try:
+        return engine.call_sync(url, _get)
+    except (Exception,):
+        return None
 
 
 async def aiohttp_get_with_retry(client: aiohttp.ClientSession,
@@ -87,33 +73,28 @@ async def aiohttp_get_with_retry(client: aiohttp.ClientSession,
                                  headers: Dict[str, Any] | None = None,
                                  retry_max: int = 5,
                                  timeout: int = 10,
-                                 logger: Any = None) -> Any:
+                                 logger: Any = None,
+                                 retry_engine: RetryEngine | None = None) -> Any:
+    """
+    :return: response text, or None if 404 or it still fails after retries.
+    """
     if headers is None:
         headers = {}
 
-    current_num_of_request: int = 0
-
-    while current_num_of_request <= retry_max:
-        try:
-            async with client.get(url, headers=headers, timeout=timeout) as response:
-                if response.status == 200:
-                    return await response.text()
-                elif response.status == 404:
-                    return None
-                else:
-                    if logger:
-                        logger.warning(f'Request {url} succeed but status code is {response.status}.')
-                    await asyncio.sleep(1)
-        except Exception as e:
-            if logger:
-                logger.error(f'Request {url} failed: {e}')
-            await asyncio.sleep(1)
-
-        current_num_of_request += 1
-        if logger:
-            logger.warning(f'current_num_of_request: {current_num_of_request}')
+    engine = retry_engine or RetryEngine(RetryPolicy(max_attempts=retry_max + 1), logger=logger)
 
-    return None
+    async def _get() -> Any:
+        async with client.get(url, headers=headers, timeout=timeout) as response:
+            if response.status == 200:
+                return await response.text()
+            elif response.status == 404:
+                return None
+            raise error_for_status(response.status, url)
+
+    try:
+        return await engine.call(url, _get)
+    except (Exception,):
+        return None
 
 
 async def aiohttp_post_with_retry(client: aiohttp.ClientSession,
@@ -123,31 +104,23 @@ async def aiohttp_post_with_retry(client: aiohttp.ClientSession,
                                   retry_max: int = 5,
                                   timeout: int = 10,
                                   logger: Any = None,
+                                  retry_engine: RetryEngine | None = None,
                                   ) -> Any:
     if headers is None:
         headers = {}
 
-    current_num_of_request: int = 0
-
-    while current_num_of_request <= retry_max:
-        try:
-            async with client.post(url, data=params, headers=headers, timeout=timeout) as response:
-                if response.status == 200:
-                    return await response.text()
-                else:
-                    if logger:
-                        logger.warning(f'Request {url} succeed but status code is {response.status}.')
-                    await asyncio.sleep(1)
-        except Exception as e:
-            if logger:
-                logger.error(f'Request {url} failed: {e}')
-            await asyncio.sleep(1)
-
-        current_num_of_request += 1
-        if logger:
-            logger.warning(f'current_num_of_request: {current_num_of_request}')
+    engine = retry_engine or RetryEngine(RetryPolicy(max_attempts=retry_max + 1), logger=logger)
 
-    return None
+    async def _post() -> Any:
+        async with client.post(url, data=params, headers=headers, timeout=timeout) as response:
+            if response.status == 200:
+                return await response.text()
+            raise error_for_status(response.status, url)
+
+    try:
+        return await engine.call(url, _post)
+    except (Exception,):
+        return None
 
 
 def is_valid_image_url(url: str) -> bool:
@@ -180,6 +153,57 @@ def check_image_integrity(expected_length: str | int, actual_length: str | int)
     return None
 
 
+def parse_content_range_total(value: str | None) -> int | None:
+    """
+    Content-Range of a 206 response, e.g. "bytes 200-1000/67589" => 67589.
+
+    :return: the complete length, or None if it's absent or unknown("*").
+    """
+    if not value or '/' not in value:
+        return None
+    total = value.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def sha256_of_file(file_path: str, chunk_size: int = 64 * 1024) -> Any:
+    """
+    :return: a hashlib sha256 object, so a resumed download can keep updating it with the new chunks.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+    return sha256
+
+
+def transcoded_image_path(images_folder: str, local_relative_path: str) -> str:
+    """
+    Where the JPEG version of a downloaded image is saved, e.g.
+    novel_images/w.linovelib.com/3211/1/193293.png => novel_images/transcoded/w.linovelib.com/3211/1/193293.jpg
+    """
+    return f'{images_folder}/{TRANSCODED_IMAGE_FOLDER}/{os.path.splitext(local_relative_path)[0]}.jpg'
+
+
+def transcode_image_to_jpeg(image_path: str, output_path: str) -> bool:
+    """
+    Decode the image(which validates it) and re-encode it to JPEG, for better epub reader support.
+    It's CPU bound and runs in worker processes, so it must stay a module level function with picklable arguments.
+
+    :return: True if the JPEG file is written.
+    """
+    try:
+        img = Image.open(image_path)
+        img = img.convert('RGB')
+    except (Exception,):
+        return False
+
+    create_folder_if_not_exists(os.path.dirname(output_path))
+    part_path = f'{output_path}.part'
+    img.save(part_path, 'jpeg')
+    os.replace(part_path, output_path)
+    return True
+
+
 # Replace invalid character for file/folder name
 def sanitize_pathname(pathname: str) -> str:
     # '/ \ : * ? " < > |'
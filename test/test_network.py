@@ -0,0 +1,338 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from linovelib2epub.exceptions import (CircuitOpenException, FatalHttpException, RetryableHttpException,
+                                       ThrottledException)
+from linovelib2epub.network import (CircuitBreaker, DownloadScheduler, ImagePriority, RetryBudget, RetryEngine,
+                                    RetryPolicy, SingleFlight, race)
+
+
+def _engine(**kwargs) -> RetryEngine:
+    # no backoff sleep in tests
+    return RetryEngine(RetryPolicy(max_attempts=4, base_delay=0, max_delay=0, jitter=0), **kwargs)
+
+
+def _failing(errors, result='ok'):
+    """
+    A func raising `errors` one by one, then returning `result`. The number of calls is in func.calls.
+    """
+    errors = list(errors)
+
+    def func():
+        func.calls += 1
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    func.calls = 0
+    return func
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def test_followers_share_the_result_of_one_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'page'
+
+        async def main():
+            return await asyncio.gather(*(single_flight.do('GET u', fetch) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), ['page'] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(single_flight.coalesced, 2)
+
+    def test_followers_get_the_error_of_the_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            raise ValueError('boom')
+
+        async def main():
+            return await asyncio.gather(*(single_flight.do('GET u', fetch) for _ in range(3)),
+                                        return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+    def test_cancelled_leader_is_not_passed_on_to_followers(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        async def main():
+            leader = asyncio.create_task(single_flight.do('GET u', fetch))
+            await asyncio.sleep(0.01)
+            followers = [asyncio.create_task(single_flight.do('GET u', fetch)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await asyncio.gather(*followers)
+
+        # one of the followers runs fetch() again in place of the leader
+        self.assertEqual(asyncio.run(main()), [2, 2])
+        self.assertEqual(single_flight._async_calls, {})
+
+    def test_cancelled_follower_does_not_cancel_the_call(self):
+        single_flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return 'page'
+
+        async def main():
+            leader = asyncio.create_task(single_flight.do('GET u', fetch))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(single_flight.do('GET u', fetch))
+            await asyncio.sleep(0.01)
+            follower.cancel()
+            return await leader
+
+        self.assertEqual(asyncio.run(main()), 'page')
+
+    def test_sync_followers_get_the_error_of_the_call(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        def call():
+            try:
+                single_flight.do_sync('GET u', fetch)
+            except ValueError as e:
+                results.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=call) for _ in range(2)]
+        for follower in followers:
+            follower.start()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 3)
+
+
+class RetryJobTestCase(unittest.TestCase):
+    def test_fatal_error_is_not_retried(self):
+        job = _engine().job('pages')
+        func = _failing([FatalHttpException('404')])
+        with self.assertRaises(FatalHttpException):
+            job.run_sync('https://example.com/a', func)
+        self.assertEqual(func.calls, 1)
+        self.assertEqual(len(job.failures), 1)
+
+    def test_retriable_error_is_retried(self):
+        job = _engine().job('pages')
+        func = _failing([RetryableHttpException('503'), OSError('reset')])
+        self.assertEqual(job.run_sync('https://example.com/a', func), 'ok')
+        self.assertEqual(func.calls, 3)
+        self.assertEqual(job.retries, 2)
+        self.assertEqual(job.failures, [])
+
+    def test_gives_up_after_max_attempts(self):
+        job = _engine().job('pages')
+        func = _failing([RetryableHttpException('503')] * 10)
+        with self.assertRaises(RetryableHttpException):
+            job.run_sync('https://example.com/a', func)
+        self.assertEqual(func.calls, 4)
+
+    def test_retry_budget_is_exhausted(self):
+        budget = RetryBudget(ratio=0, min_retries=1)
+        job = _engine().job('pages', budget=budget)
+        func = _failing([RetryableHttpException('503')] * 10)
+        with self.assertRaises(RetryableHttpException):
+            job.run_sync('https://example.com/a', func)
+        # 1 call + 1 retry
+        self.assertEqual(func.calls, 2)
+        self.assertIn('RetryableHttpException', job.failures[0].error)
+
+    def test_throttled_error_does_not_spend_the_budget(self):
+        budget = RetryBudget(ratio=0, min_retries=0)
+        job = _engine().job('pages', budget=budget)
+        func = _failing([ThrottledException('429'), ThrottledException('429')])
+        self.assertEqual(job.run_sync('https://example.com/a', func), 'ok')
+        self.assertEqual(budget.retries, 0)
+
+    def test_async_run(self):
+        job = _engine().job('pages')
+        func = _failing([RetryableHttpException('503')])
+
+        async def attempt():
+            return func()
+
+        self.assertEqual(asyncio.run(job.run('https://example.com/a', attempt)), 'ok')
+        self.assertEqual(func.calls, 2)
+
+    def test_speculative_failures_are_not_counted_in_breaker(self):
+        engine = _engine(breaker_failure_threshold=2)
+        job = engine.job('predicted pages', max_attempts=1, count_in_breaker=False)
+        for _ in range(3):
+            with self.assertRaises(RetryableHttpException):
+                job.run_sync('https://example.com/a', _failing([RetryableHttpException('503')]))
+        self.assertEqual(engine.breaker_for('https://example.com/a').state, CircuitBreaker.CLOSED)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def _open_breaker(self) -> CircuitBreaker:
+        breaker = CircuitBreaker('example.com', failure_threshold=2, reset_timeout=0.05)
+        breaker.on_failure()
+        breaker.on_failure()
+        return breaker
+
+    def test_opens_after_failures_in_a_row(self):
+        breaker = CircuitBreaker('example.com', failure_threshold=2, reset_timeout=30)
+        breaker.on_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.on_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertGreater(breaker.before_call(), 0)
+
+    def test_half_open_then_closed(self):
+        breaker = self._open_breaker()
+        time.sleep(0.06)
+        self.assertEqual(breaker.before_call(), 0)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # only one trial at a time
+        self.assertGreater(breaker.before_call(), 0)
+        breaker.on_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.before_call(), 0)
+
+    def test_half_open_then_open_again(self):
+        breaker = self._open_breaker()
+        time.sleep(0.06)
+        breaker.before_call()
+        breaker.on_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_cancelled_trial_is_released(self):
+        breaker = self._open_breaker()
+        time.sleep(0.06)
+        token = object()
+        self.assertEqual(breaker.before_call(token), 0)
+        # not the trial: ignored
+        breaker.on_cancel(object())
+        self.assertGreater(breaker.before_call(), 0)
+        breaker.on_cancel(token)
+        self.assertEqual(breaker.before_call(), 0)
+
+    def test_open_circuit_short_circuits_the_job(self):
+        engine = _engine(breaker_failure_threshold=1, breaker_reset_timeout=30)
+        engine.breaker_for('https://example.com/a').on_failure()
+        func = _failing([])
+        job = engine.job('pages', budget=RetryBudget(ratio=0, min_retries=0))
+        with self.assertRaises(CircuitOpenException):
+            job.run_sync('https://example.com/a', func)
+        self.assertEqual(func.calls, 0)
+
+
+class DownloadSchedulerTestCase(unittest.TestCase):
+    def test_lanes_then_insertion_order(self):
+        order = []
+
+        async def download(item):
+            order.append(item)
+
+        scheduler = DownloadScheduler(download, workers=1, per_host=1)
+        scheduler.add('https://a.com/1.jpg', 'content-1', ImagePriority.CONTENT)
+        scheduler.add('https://a.com/2.jpg', 'volume-cover', ImagePriority.VOLUME_COVER)
+        scheduler.add('https://a.com/3.jpg', 'content-2', ImagePriority.CONTENT)
+        scheduler.add('https://a.com/4.jpg', 'book-cover', ImagePriority.BOOK_COVER)
+        stats = asyncio.run(scheduler.run())
+
+        self.assertEqual(order, ['book-cover', 'volume-cover', 'content-1', 'content-2'])
+        self.assertEqual(stats['succeeded'], 4)
+
+    def test_busy_host_is_parked(self):
+        events = []
+
+        async def download(item):
+            events.append(f'start {item}')
+            await asyncio.sleep(0.05)
+            events.append(f'end {item}')
+
+        scheduler = DownloadScheduler(download, workers=2, per_host=1)
+        scheduler.add('https://a.com/1.jpg', 'a1')
+        scheduler.add('https://a.com/2.jpg', 'a2')
+        scheduler.add('https://b.com/1.jpg', 'b1')
+        asyncio.run(scheduler.run())
+
+        # a2 waits for a1, the idle worker serves b1 meanwhile
+        self.assertLess(events.index('end a1'), events.index('start a2'))
+        self.assertLess(events.index('start b1'), events.index('end a1'))
+
+    def test_failure_does_not_stop_the_others(self):
+        async def download(item):
+            if item == 'bad':
+                raise OSError('reset')
+
+        scheduler = DownloadScheduler(download, workers=2, per_host=1)
+        for item in ('ok-1', 'bad', 'ok-2'):
+            scheduler.add(f'https://a.com/{item}.jpg', item)
+        stats = asyncio.run(scheduler.run())
+        self.assertEqual((stats['succeeded'], stats['failed']), (2, 1))
+
+
+class RaceTestCase(unittest.TestCase):
+    def test_first_result_wins_and_others_are_cancelled(self):
+        cancelled = []
+
+        async def attempt(url, claim):
+            try:
+                await asyncio.sleep(0.01 if url == 'fast' else 1)
+            except asyncio.CancelledError:
+                cancelled.append(url)
+                raise
+            return url
+
+        self.assertEqual(asyncio.run(race(['slow', 'fast'], attempt)), 'fast')
+        self.assertEqual(cancelled, ['slow'])
+
+    def test_failed_attempt_fails_over(self):
+        async def attempt(url, claim):
+            if url == 'broken':
+                raise OSError('reset')
+            await asyncio.sleep(0.01)
+            return url
+
+        self.assertEqual(asyncio.run(race(['broken', 'ok'], attempt, hedge_delay=10)), 'ok')
+
+    def test_last_error_is_raised_if_no_attempt_won(self):
+        async def attempt(url, claim):
+            raise OSError(url)
+
+        with self.assertRaises(OSError):
+            asyncio.run(race(['a', 'b'], attempt))
+
+    def test_none_if_every_attempt_has_no_result(self):
+        async def attempt(url, claim):
+            return None
+
+        self.assertIsNone(asyncio.run(race(['a', 'b'], attempt)))
+
+
+if __name__ == '__main__':
+    unittest.main()
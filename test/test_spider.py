@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import tempfile
+import unittest
+
+from linovelib2epub.exceptions import RetryableHttpException
+from linovelib2epub.spider import BaseNovelWebsiteSpider, LinovelibMobileSpider
+from linovelib2epub.spider.linovelib_mobile_rules import AntiObfuscationEngine
+
+
+class _FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.headers = None
+
+    def get(self, url, headers=None, **kwargs):
+        self.headers = headers
+        return self.response
+
+
+class _Spider(BaseNovelWebsiteSpider):
+    def fetch(self):
+        pass
+
+
+def _spider(response) -> _Spider:
+    # no __init__(): no http client nor logger files
+    spider = _Spider.__new__(_Spider)
+    spider.spider_settings = {'http_timeout': 5}
+    spider.logger = logging.getLogger('test')
+    spider.session = _FakeSession(response)
+    return spider
+
+
+class StreamImageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.folder.name, 'a.jpg')
+        self.part_path = f'{self.save_path}.part'
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _write_part(self, data):
+        with open(self.part_path, 'wb') as f:
+            f.write(data)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_download_from_scratch(self):
+        spider = _spider(_FakeResponse(200, b'abcdef', {'Content-Length': '6'}))
+        digest = spider._stream_image_by_requests('https://img.example.com/a.jpg', self.save_path)
+
+        self.assertNotIn('Range', spider.session.headers)
+        self.assertEqual(self._read(self.save_path), b'abcdef')
+        self.assertFalse(os.path.exists(self.part_path))
+        self.assertEqual(digest, hashlib.sha256(b'abcdef').hexdigest())
+
+    def test_resume_from_part_file(self):
+        self._write_part(b'abc')
+        spider = _spider(_FakeResponse(206, b'def', {'Content-Range': 'bytes 3-5/6'}))
+        digest = spider._stream_image_by_requests('https://img.example.com/a.jpg', self.save_path)
+
+        self.assertEqual(spider.session.headers['Range'], 'bytes=3-')
+        self.assertEqual(self._read(self.save_path), b'abcdef')
+        self.assertEqual(digest, hashlib.sha256(b'abcdef').hexdigest())
+
+    def test_range_ignored_by_server_starts_over(self):
+        self._write_part(b'xyz')
+        spider = _spider(_FakeResponse(200, b'abcdef', {'Content-Length': '6'}))
+        spider._stream_image_by_requests('https://img.example.com/a.jpg', self.save_path)
+
+        self.assertEqual(self._read(self.save_path), b'abcdef')
+
+    def test_range_not_satisfiable_drops_part_file(self):
+        self._write_part(b'abc')
+        spider = _spider(_FakeResponse(416))
+        with self.assertRaises(RetryableHttpException):
+            spider._stream_image_by_requests('https://img.example.com/a.jpg', self.save_path)
+
+        self.assertFalse(os.path.exists(self.part_path))
+        self.assertFalse(os.path.exists(self.save_path))
+
+    def test_incomplete_read_keeps_part_file(self):
+        spider = _spider(_FakeResponse(200, b'abc', {'Content-Length': '6'}))
+        with self.assertRaises(IOError):
+            spider._stream_image_by_requests('https://img.example.com/a.jpg', self.save_path)
+
+        self.assertEqual(self._read(self.part_path), b'abc')
+        self.assertFalse(os.path.exists(self.save_path))
+
+
+class AntiObfuscationEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        # \ue000: a private use char of the obfuscated text
+        self.engine = AntiObfuscationEngine({'\ue000': '的', '“': '「'})
+
+    def test_text_is_translated(self):
+        self.assertEqual(self.engine.translate_html('<p>我\ue000“书”</p>'), '<p>我的「书”</p>')
+
+    def test_nothing_to_translate(self):
+        html = '<p>plain</p>'
+        self.assertIs(self.engine.translate_html(html), html)
+
+    def test_attributes_are_kept(self):
+        html = '<img alt="“a > b”" src="https://img.example.com/\ue000.jpg"/>\ue000'
+        self.assertEqual(self.engine.translate_html(html),
+                         '<img alt="“a > b”" src="https://img.example.com/\ue000.jpg"/>的')
+
+    def test_comments_are_kept(self):
+        html = '<!-- a > \ue000 --><p>\ue000</p>'
+        self.assertEqual(self.engine.translate_html(html), '<!-- a > \ue000 --><p>的</p>')
+
+    def test_translate_pages(self):
+        self.assertEqual(self.engine.translate_pages(['<p>\ue000</p>', '<i title="“">“</i>']),
+                         ['<p>的</p>', '<i title="“">「</i>'])
+
+
+class PredictSiblingLinksTestCase(unittest.TestCase):
+    def test_remaining_pages_of_the_chapter(self):
+        self.assertEqual(
+            LinovelibMobileSpider._predict_sibling_links('https://www.bilinovel.com/novel/2356/83547_2.html',
+                                                         '第二章 可爱如花的女孩（2/4）'),
+            ['https://www.bilinovel.com/novel/2356/83547_3.html', 'https://www.bilinovel.com/novel/2356/83547_4.html'])
+
+    def test_first_page(self):
+        self.assertEqual(
+            LinovelibMobileSpider._predict_sibling_links('https://www.bilinovel.com/novel/2356/83547.html',
+                                                         '第二章 (1/2)'),
+            ['https://www.bilinovel.com/novel/2356/83547_2.html'])
+
+    def test_last_page_or_no_page_count(self):
+        link = 'https://www.bilinovel.com/novel/2356/83547_3.html'
+        self.assertEqual(LinovelibMobileSpider._predict_sibling_links(link, '第二章（3/3）'), [])
+        self.assertEqual(LinovelibMobileSpider._predict_sibling_links(link, '第二章'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()